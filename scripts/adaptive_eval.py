@@ -0,0 +1,109 @@
+# Évaluation adaptative : échantillon stratifié évalué par lots, arrêt dès que l'écart est tranché
+#
+# Les lignes du fichier de test sont ordonnées de sorte que chaque préfixe soit un
+# échantillon stratifié (par longueur de question ou par valeur d'un champ). L'évaluation
+# avance lot par lot et s'arrête dès que l'intervalle de confiance bootstrap de l'écart
+# entre le modèle évalué et la référence exclut 0, ou devient assez étroit.
+
+import numpy as np
+from train_test_val import get_field
+
+# Nombre de lignes évaluées entre deux tests d'arrêt
+DEFAULT_BATCH_ROWS = 100
+
+# Nombre de classes de longueur de question (quantiles)
+DEFAULT_LENGTH_BINS = 4
+
+# Métrique dont l'écart décide de l'arrêt
+DEFAULT_METRIC = "bleu"
+
+# Largeur d'intervalle en dessous de laquelle l'écart est jugé négligeable
+DEFAULT_TOLERANCE = 0.02
+
+# Niveau de confiance plus élevé qu'en évaluation complète : le test est répété à chaque lot
+DEFAULT_CONFIDENCE = 0.99
+
+# Rééchantillonnages bootstrap de chaque test d'arrêt
+DEFAULT_STOP_RESAMPLES = 1000
+
+
+def length_strata(questions, num_bins=DEFAULT_LENGTH_BINS):
+    """Classe de longueur (quantiles du nombre de caractères) de chaque question."""
+    lengths = np.array([len(q) for q in questions], dtype=np.int64)
+    if not len(lengths):
+        return lengths
+    edges = np.unique(np.quantile(lengths, np.linspace(0, 1, num_bins + 1))[1:-1])
+    return np.searchsorted(edges, lengths, side="right")
+
+
+def field_strata(lines, field):
+    """Identifiant de strate de chaque ligne selon la valeur d'un champ (chemin pointé, ex. : "topic")."""
+    ids = {}
+    return np.array([ids.setdefault(repr(get_field(line, field)), len(ids)) for line in lines], dtype=np.int64)
+
+
+def stratified_order(strata, seed=0):
+    """Permutation des lignes dont chaque préfixe respecte les proportions des strates.
+
+    Dans chaque strate, les lignes sont mélangées puis placées à la position
+    (rang + U) / taille de la strate : un préfixe de m lignes contient environ
+    m × taille / n lignes de chaque strate (tirage systématique stratifié).
+    """
+    n = len(strata)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n)
+    shuffled = np.asarray(strata)[order]
+    sizes = np.bincount(shuffled) if n else np.zeros(0, dtype=np.int64)
+
+    by_stratum = np.argsort(shuffled, kind="stable")
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_stratum] = np.arange(n) - np.searchsorted(shuffled[by_stratum], shuffled[by_stratum], side="left")
+
+    position = (rank + rng.random(n)) / sizes[shuffled] if n else np.zeros(0)
+    return order[np.argsort(position, kind="stable")]
+
+
+class StoppingRule:
+    """Décide, après chaque lot, si l'évaluation peut s'arrêter.
+
+    L'arrêt a lieu quand, pour chaque modèle comparé à la référence, l'intervalle de
+    confiance bootstrap (apparié) de l'écart sur la métrique exclut 0 ou est plus
+    étroit que tolerance. Appelée avec la table des résultats, retourne la raison de
+    l'arrêt ou None.
+    """
+
+    def __init__(self, reference, metric=DEFAULT_METRIC, tolerance=DEFAULT_TOLERANCE, confidence=DEFAULT_CONFIDENCE,
+                 min_rows=DEFAULT_BATCH_ROWS, num_resamples=DEFAULT_STOP_RESAMPLES, seed=0):
+        self.reference = reference
+        self.metric = metric
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.min_rows = min_rows
+        self.num_resamples = num_resamples
+        self.seed = seed
+        self.history = []
+
+    def __call__(self, table):
+        if self.metric not in table.metrics:
+            raise ValueError(f"Métrique inconnue : {self.metric} (métriques : {', '.join(table.metrics)})")
+        intervals = table.bootstrap(self.reference, self.num_resamples, self.confidence, self.seed)
+        differences = {model: scores[self.metric] for model, scores in intervals["differences"].items()}
+        self.history.append({"rows": intervals["rows"], "differences": differences})
+
+        level = int(round(self.confidence * 100))
+        for model, ci in differences.items():
+            print(f"   [{intervals['rows']} lignes] {model} - {self.reference} ({self.metric}, IC {level} %) : "
+                  f"{ci['mean']:+.4f} [{ci['low']:+.4f} ; {ci['high']:+.4f}]")
+
+        if intervals["rows"] < self.min_rows or not differences:
+            return None
+        verdicts = {}
+        for model, ci in differences.items():
+            if ci["low"] > 0 or ci["high"] < 0:
+                verdicts[model] = "écart significatif"
+            elif ci["high"] - ci["low"] < self.tolerance:
+                verdicts[model] = f"écart inférieur à {self.tolerance}"
+            else:
+                return None
+        return f"{self.metric} après {intervals['rows']} lignes : " + ", ".join(
+            f"{model} {verdict}" for model, verdict in verdicts.items())
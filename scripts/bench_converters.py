@@ -0,0 +1,116 @@
+# Benchmark des convertisseurs JSON/CSV -> JSONL : débit et pic de mémoire (RSS)
+
+import os
+import csv
+import json
+import time
+import random
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from json_to_jsonl import convert_json_to_jsonl
+from cvs_to_jsonl import convert_csv_to_jsonl
+
+# Vocabulaire des exemples synthétiques
+WORDS = (
+    "patient fever cough fatigue headache nausea treatment rest hydration paracetamol antibiotics "
+    "monitoring symptoms improve days consult doctor pain breathing dosage weight age, \"quoted\" été"
+).split()
+
+# Nombre de questions et de réponses distinctes tirées avant d'être combinées
+# (génération rapide de fichiers de plusieurs millions de lignes)
+POOL_SIZE = 4096
+
+
+def sentence_pool(rng, min_words, max_words, end):
+    """Phrases aléatoires de min_words à max_words mots du vocabulaire."""
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) + end
+            for _ in range(POOL_SIZE)]
+
+
+def iter_examples(num_rows, seed=0):
+    """Couples (question, réponse) synthétiques ; le numéro de ligne rend chaque question unique."""
+    rng = random.Random(seed)
+    questions = sentence_pool(rng, 5, 30, " ?")
+    answers = sentence_pool(rng, 20, 120, ".")
+    for i in range(num_rows):
+        yield f"{i} {questions[rng.getrandbits(12)]}", answers[rng.getrandbits(12)]
+
+
+def make_json_file(path, num_rows, seed=0):
+    """Écrit un tableau JSON de num_rows exemples {"question", "answer"} sans le garder en mémoire."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i, (question, answer) in enumerate(iter_examples(num_rows, seed)):
+            entry = {"question": question, "answer": answer}
+            f.write(("  " if i == 0 else ", ") + json.dumps(entry, ensure_ascii=False) + "\n")
+        f.write("]\n")
+
+
+def make_csv_file(path, num_rows, seed=0):
+    """Écrit un CSV de num_rows exemples avec les colonnes "input" et "output"."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["input", "output"])
+        writer.writerows(iter_examples(num_rows, seed))
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant, en Mo."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(func, args, queue, setup=None):
+    # Exécuté dans un processus neuf : le pic de RSS ne mesure que cette étape
+    if setup:
+        args = setup(*args)  # préparation non chronométrée (données en mémoire, client...)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    func(*args)
+    queue.put({"seconds": time.perf_counter() - start, "baseline_rss_mb": baseline, "peak_rss_mb": peak_rss_mb()})
+
+
+def run_isolated(func, *args, setup=None):
+    """Exécute func(*args) dans un processus séparé et retourne sa durée et son pic de RSS.
+
+    Si setup est donné, func reçoit les arguments retournés par setup(*args), calculés
+    dans le même processus mais hors de la mesure du temps.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(func, args, queue, setup))
+    process.start()
+    process.join()  # le résultat est un petit dictionnaire : join() ne peut pas bloquer sur la queue
+    if process.exitcode != 0:
+        raise RuntimeError(f"L'étape {func.__name__} a échoué (code {process.exitcode})")
+    return queue.get(timeout=1)
+
+
+def report(name, num_rows, input_path, result):
+    """Affiche le débit et la mémoire d'une étape."""
+    size_mb = os.path.getsize(input_path) / (1024 * 1024)
+    seconds = result["seconds"]
+    print(
+        f"{name:<5} {num_rows:>10} lignes | {size_mb:8.1f} Mo | {seconds:7.2f}s | "
+        f"{num_rows / seconds:>9.0f} lignes/s | {size_mb / seconds:6.1f} Mo/s | "
+        f"pic RSS {result['peak_rss_mb']:7.1f} Mo (+{result['peak_rss_mb'] - result['baseline_rss_mb']:.1f} Mo)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesurer le débit et le pic mémoire des convertisseurs.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[50_000, 200_000], help="Tailles de fichiers à tester (en lignes)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for num_rows in args.rows:
+            json_name, csv_name = f"bench_{num_rows}.json", f"bench_{num_rows}.csv"
+            make_json_file(os.path.join(workdir, json_name), num_rows)
+            make_csv_file(os.path.join(workdir, csv_name), num_rows)
+
+            # Le pic de RSS doit rester stable quand la taille du fichier augmente
+            result = run_isolated(convert_json_to_jsonl, json_name, workdir, workdir)
+            report("JSON", num_rows, os.path.join(workdir, json_name), result)
+            result = run_isolated(convert_csv_to_jsonl, csv_name, workdir, workdir)
+            report("CSV", num_rows, os.path.join(workdir, csv_name), result)
@@ -0,0 +1,82 @@
+# Mesure du débit du moteur d'inférence contre un client Mistral factice (sans réseau)
+
+import os
+import json
+import time
+import argparse
+import tempfile
+from inference_engine import InferenceEngine
+from mistral_stub import StubMistral, start_server
+from infer import infer_batch
+
+
+def make_requests(num_rows):
+    """Construit deux requêtes (fine-tuné puis base) par ligne, comme evaluate_model."""
+    requests = []
+    for i in range(num_rows):
+        messages = [{"role": "user", "content": f"Question numéro {i} ?"}]
+        requests.append({"model": "ft:open-mistral-7b:stub", "messages": messages})
+        requests.append({"model": "open-mistral-7b", "messages": messages})
+    return requests
+
+
+def bench_sequential(client, requests):
+    """Envoie les requêtes l'une après l'autre (ancienne boucle d'évaluation, sans pause)."""
+    start = time.perf_counter()
+    outputs = [client.chat.complete(**r).choices[0].message.content for r in requests]
+    return outputs, time.perf_counter() - start
+
+
+def bench_engine(client, requests, concurrency, rate_limit):
+    """Envoie les requêtes via le moteur concurrent."""
+    engine = InferenceEngine(client, max_concurrency=concurrency, rate_limit=rate_limit, base_delay=0.05)
+    start = time.perf_counter()
+    outputs = engine.run(requests)
+    return outputs, time.perf_counter() - start, engine
+
+
+def bench_server(num_rows, concurrency, rate_limit, **stub_kwargs):
+    """Mode batch de infer.py contre le serveur HTTP factice (client Mistral réel, requêtes HTTP locales)."""
+    server, url = start_server(StubMistral(**stub_kwargs))
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            prompts_path = os.path.join(workdir, "prompts.jsonl")
+            with open(prompts_path, "w", encoding="utf-8") as f:
+                for i in range(num_rows):
+                    f.write(json.dumps({"id": i, "prompt": f"Question numéro {i} ?"}) + "\n")
+            return infer_batch("stub", prompts_path, output_path=os.path.join(workdir, "answers.jsonl"),
+                               model="ft:open-mistral-7b:stub", concurrency=concurrency, rate_limit=rate_limit,
+                               cache_path=None, server_url=url)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesurer le débit du moteur d'inférence sur un client factice.")
+    parser.add_argument("--rows", type=int, default=200, help="Nombre de lignes de test simulées")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latence simulée d'une requête (secondes)")
+    parser.add_argument("--error_rate", type=float, default=0.02, help="Proportion de réponses 5xx simulées")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.02, help="Proportion de réponses 429 simulées")
+    parser.add_argument("--concurrency", type=int, default=16, help="Nombre maximal de requêtes simultanées")
+    parser.add_argument("--rate_limit", type=float, default=0, help="Requêtes par seconde (0 = illimité)")
+    parser.add_argument("--server", action="store_true", help="Mesurer aussi le mode batch de infer.py via le serveur HTTP factice")
+    args = parser.parse_args()
+
+    requests = make_requests(args.rows)
+
+    # Référence séquentielle sans erreurs simulées (l'ancienne boucle n'a pas de retry)
+    client = StubMistral(latency=args.latency)
+    expected, seq_time = bench_sequential(client, requests)
+    print(f"Séquentiel : {len(requests)} requêtes en {seq_time:.2f}s ({len(requests) / seq_time:.1f} req/s)")
+
+    client = StubMistral(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    outputs, engine_time, engine = bench_engine(client, requests, args.concurrency, args.rate_limit)
+    print(f"Moteur     : {len(requests)} requêtes en {engine_time:.2f}s ({len(requests) / engine_time:.1f} req/s)")
+    print(f"   Concurrence max observée : {client.max_in_flight} | Retries : {engine.retries} | Erreurs simulées : {client.errors}")
+    print(f"   Ordre des réponses conservé : {outputs == expected}")
+    print(f"   Accélération : x{seq_time / engine_time:.1f}")
+
+    if args.server:
+        print("\nMode batch via le serveur HTTP factice :")
+        bench_server(args.rows, args.concurrency, args.rate_limit, latency=args.latency,
+                     error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
@@ -0,0 +1,64 @@
+# Micro-benchmark : calcul des métriques ligne par ligne contre le calcul par lots
+
+import time
+import random
+import argparse
+import numpy as np
+from metrics import METRICS, calculate_metrics, score_batch
+
+# Vocabulaire des réponses synthétiques
+WORDS = (
+    "the patient presents with fever cough fatigue headache and nausea treatment includes rest "
+    "hydration paracetamol antibiotics monitoring symptoms usually improve within days consult a "
+    "doctor if pain persists or breathing becomes difficult dosage depends on weight and age"
+).split()
+
+
+def make_pairs(num_rows, seed=0):
+    """Génère des couples (référence, réponse fine-tunée, réponse de base) synthétiques."""
+    rng = random.Random(seed)
+
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(15, 60))) + "."
+
+    return [(sentence(), sentence(), sentence()) for _ in range(num_rows)]
+
+
+def bench_per_row(rows):
+    """Ancien chemin : deux appels à calculate_metrics par ligne."""
+    start = time.perf_counter()
+    scores = {metric: [] for metric in METRICS}
+    for reference, fine_tuned, base in rows:
+        for candidate in (fine_tuned, base):
+            bleu, rouge, f1 = calculate_metrics(reference, candidate)
+            for metric, value in zip(METRICS, (bleu, rouge["rouge1"].fmeasure, rouge["rouge2"].fmeasure, rouge["rougeL"].fmeasure, f1)):
+                scores[metric].append(value)
+    return {metric: np.array(values, dtype=float) for metric, values in scores.items()}, time.perf_counter() - start
+
+
+def bench_batch(rows, workers):
+    """Nouveau chemin : un seul appel à score_batch pour toutes les réponses."""
+    references = [reference for reference, _, _ in rows for _ in range(2)]
+    candidates = [candidate for _, fine_tuned, base in rows for candidate in (fine_tuned, base)]
+    start = time.perf_counter()
+    scores = score_batch(references, candidates, workers=workers)
+    return scores, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparer le calcul des métriques ligne par ligne et par lots.")
+    parser.add_argument("--rows", type=int, default=2000, help="Nombre de lignes de test synthétiques")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus pour le calcul par lots")
+    args = parser.parse_args()
+
+    rows = make_pairs(args.rows)
+
+    expected, per_row_time = bench_per_row(rows)
+    print(f"Ligne par ligne : {per_row_time:.2f}s ({len(rows) / per_row_time:.0f} lignes/s)")
+
+    scores, batch_time = bench_batch(rows, args.workers)
+    print(f"Par lots        : {batch_time:.2f}s ({len(rows) / batch_time:.0f} lignes/s)")
+
+    identical = all(np.array_equal(expected[metric], scores[metric]) for metric in METRICS)
+    print(f"Scores identiques : {identical}")
+    print(f"Accélération : x{per_row_time / batch_time:.1f}")
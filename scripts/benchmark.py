@@ -0,0 +1,300 @@
+# Suite de benchmarks reproductibles du pipeline : conversion, découpage, métriques, upload, évaluation
+#
+# Chaque étape est exécutée dans un processus neuf (bench_converters.run_isolated) sur des
+# données synthétiques générées avec une graine fixe, et l'upload et l'évaluation utilisent
+# le client Mistral factice (latence et taux d'erreurs configurables). La durée, le débit
+# et le pic de RSS de chaque étape sont comparés à un fichier de référence JSON : le
+# script se termine avec un code non nul si une étape régresse au-delà du seuil.
+
+import os
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from bench_converters import make_csv_file, make_json_file, run_isolated
+from bench_metrics import make_pairs
+from json_to_jsonl import convert_json_to_jsonl
+from cvs_to_jsonl import convert_csv_to_jsonl
+from train_test_val import SPLITS, split_dataset
+from metrics import score_batch
+from upload_to_mistral import upload_files
+from evaluate import EvalOptions, evaluate_model
+from inference_engine import DEFAULT_CONCURRENCY
+from jsonl_index import load_offsets
+from mistral_stub import StubMistral
+
+# Fichier de référence des mesures (spécifique à la machine)
+BASELINE_PATH = "data/benchmarks/baseline.json"
+
+# Étapes mesurées, dans l'ordre du pipeline
+STAGES = ("convert_json", "convert_csv", "split", "metrics", "upload", "evaluate")
+
+# Régression tolérée (débit plus faible ou mémoire de l'étape plus élevée, en proportion de la référence)
+DEFAULT_THRESHOLD = 0.2
+
+# Hausse de mémoire toujours tolérée, en Mo : la mémoire propre d'une étape en flux est de
+# quelques Mo, et varie d'autant d'une exécution à l'autre
+RSS_SLACK_MB = 5.0
+
+# Taille du dataset synthétique (conversion, découpage, upload)
+DEFAULT_ROWS = 100_000
+
+# Lignes de test scorées par l'étape metrics (deux réponses par ligne)
+DEFAULT_METRIC_ROWS = 20_000
+
+# Exécutions de chaque étape : la plus rapide est gardée (mesures moins sensibles à la charge de la machine)
+DEFAULT_REPEAT = 3
+
+# Lignes du fichier de test évaluées par l'étape evaluate (limitées par la latence simulée)
+DEFAULT_EVAL_ROWS = 500
+
+# Latence et taux d'erreurs 503 du client factice
+DEFAULT_LATENCY = 0.01
+DEFAULT_ERROR_RATE = 0.01
+
+# Modèle fine-tuné fictif (absent du registre : les scores n'y sont pas enregistrés)
+BENCH_MODEL = "ft:open-mistral-7b:bench"
+
+
+def dataset_names(num_rows, seed):
+    """Noms des fichiers synthétiques (JSON, CSV) et du JSONL converti."""
+    base = f"bench_{num_rows}_{seed}"
+    return f"{base}.json", f"{base}_csv.csv", f"{base}_formatted.jsonl"
+
+
+def prepare_datasets(workdir, num_rows, seed):
+    """Génère les fichiers JSON et CSV synthétiques, sauf s'ils existent déjà dans workdir."""
+    json_name, csv_name, _ = dataset_names(num_rows, seed)
+    for name, make_file in ((json_name, make_json_file), (csv_name, make_csv_file)):
+        path = os.path.join(workdir, name)
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            make_file(path + ".tmp", num_rows, seed)
+            os.replace(path + ".tmp", path)
+            print(f"Données générées : {path} ({time.perf_counter() - start:.1f}s)")
+
+
+def count_rows(path):
+    """Nombre de lignes d'un fichier JSONL (lu dans son index)."""
+    return len(load_offsets(path)) - 1
+
+
+def metric_inputs(num_rows, seed):
+    """Références et réponses (fine-tunée puis base pour chaque ligne) à scorer."""
+    rows = make_pairs(num_rows, seed)
+    references = [reference for reference, _, _ in rows for _ in range(2)]
+    candidates = [candidate for _, fine_tuned, base in rows for candidate in (fine_tuned, base)]
+    return references, candidates
+
+
+def stub_inputs(latency, error_rate, seed, *args):
+    """Client factice créé dans le processus mesuré, suivi des arguments de l'étape."""
+    random.seed(seed)  # délais aléatoires des retries reproductibles
+    return (StubMistral(latency=latency, error_rate=error_rate, seed=seed), *args)
+
+
+def split_file(jsonl_name, workdir, seed):
+    """Découpage par défaut (90/5/5, empreinte de chaque ligne) d'un JSONL de workdir."""
+    split_dataset(jsonl_name, seed=seed, input_dir=workdir, output_dir=workdir)
+
+
+def upload_dataset(client, paths):
+    """Upload (avec validation) des fichiers, sans manifeste : chaque exécution renvoie les fichiers."""
+    if None in upload_files(client, paths, manifest_path=None, validate=True):
+        raise RuntimeError("Un upload a échoué")
+
+
+def evaluate_dataset(client, test_path, output_path, num_rows, concurrency, seed):
+    """Boucle d'évaluation complète (requêtes, métriques, table et rapport) sur num_rows lignes.
+
+    La sortie (question et réponses de chaque ligne) est écartée : la mesure ne doit pas
+    dépendre de la vitesse du terminal.
+    """
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        options = EvalOptions(concurrency=concurrency, rate_limit=0, cache_path=None, subset=num_rows, seed=seed)
+        evaluate_model("bench", test_path, options, output_path=output_path, client=client, model=BENCH_MODEL)
+
+
+def measure(func, *args, setup=None, repeat=DEFAULT_REPEAT):
+    """Exécute une étape repeat fois dans des processus neufs et garde l'exécution la plus rapide."""
+    runs = [run_isolated(func, *args, setup=setup) for _ in range(repeat)]
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def run_stage(stage, args, workdir):
+    """Mesure une étape ; retourne les paramètres qui la définissent et ses mesures."""
+    json_name, csv_name, jsonl_name = dataset_names(args.rows, args.seed)
+    jsonl_path = os.path.join(workdir, jsonl_name)
+    split_paths = [os.path.join(workdir, f"{os.path.splitext(jsonl_name)[0]}_{split}.jsonl") for split in SPLITS]
+    params = {"rows": args.rows, "seed": args.seed}
+
+    # Les fichiers produits par les étapes précédentes sont créés si elles n'ont pas été mesurées
+    if stage in ("split", "upload", "evaluate") and not os.path.exists(jsonl_path):
+        convert_json_to_jsonl(json_name, workdir, workdir)
+    if stage in ("upload", "evaluate") and not all(os.path.exists(path) for path in split_paths):
+        split_file(jsonl_name, workdir, args.seed)
+
+    if stage == "convert_json":
+        inputs = [os.path.join(workdir, json_name)]
+        result = measure(convert_json_to_jsonl, json_name, workdir, workdir, repeat=args.repeat)
+        rows = args.rows
+    elif stage == "convert_csv":
+        inputs = [os.path.join(workdir, csv_name)]
+        result = measure(convert_csv_to_jsonl, csv_name, workdir, workdir, repeat=args.repeat)
+        rows = args.rows
+    elif stage == "split":
+        inputs = [jsonl_path]
+        result = measure(split_file, jsonl_name, workdir, args.seed, repeat=args.repeat)
+        rows = args.rows
+    elif stage == "metrics":
+        params = {"rows": args.metric_rows, "seed": args.seed}
+        inputs = []
+        result = measure(score_batch, args.metric_rows, args.seed, setup=metric_inputs, repeat=args.repeat)
+        rows = args.metric_rows
+    elif stage == "upload":
+        params.update(latency=args.latency, error_rate=args.error_rate)
+        inputs = split_paths[:2]
+        result = measure(upload_dataset, args.latency, args.error_rate, args.seed, inputs,
+                         setup=stub_inputs, repeat=args.repeat)
+        rows = sum(count_rows(path) for path in inputs)
+    else:
+        rows = min(args.eval_rows, count_rows(split_paths[2]))
+        params.update(eval_rows=rows, latency=args.latency, error_rate=args.error_rate, concurrency=args.concurrency)
+        inputs = []
+        output_path = os.path.join(workdir, "bench_results.jsonl")
+        result = measure(evaluate_dataset, args.latency, args.error_rate, args.seed, split_paths[2], output_path, rows,
+                         args.concurrency, args.seed, setup=stub_inputs, repeat=args.repeat)
+
+    megabytes = sum(os.path.getsize(path) for path in inputs) / (1024 * 1024)
+    return {
+        "params": params,
+        "rows": rows,
+        "megabytes": round(megabytes, 2),
+        "seconds": round(result["seconds"], 4),
+        "rows_per_second": round(rows / result["seconds"], 1),
+        "mb_per_second": round(megabytes / result["seconds"], 2),
+        "peak_rss_mb": round(result["peak_rss_mb"], 1),
+        "rss_delta_mb": round(result["peak_rss_mb"] - result["baseline_rss_mb"], 1),
+    }
+
+
+def stage_key(stage, result):
+    """Clé d'une mesure dans le fichier de référence (une entrée par étape et par taille)."""
+    return f"{stage}:{result['rows']}"
+
+
+def machine_info():
+    """Description de la machine, enregistrée avec la référence (les mesures n'y sont comparables)."""
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Charge le fichier de référence (vide s'il n'existe pas)."""
+    if not os.path.exists(path):
+        return {"machine": None, "stages": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Enregistre les mesures comme nouvelle référence (les autres étapes et tailles sont conservées)."""
+    baseline = load_baseline(path)
+    baseline["machine"] = machine_info()
+    baseline["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    baseline["stages"].update(results)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(tmp_path, path)
+    print(f"Référence enregistrée : {path}")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, rss_slack_mb=RSS_SLACK_MB):
+    """Compare les mesures à la référence ; retourne la liste des régressions (textes).
+
+    La mémoire comparée est celle de l'étape elle-même (rss_delta_mb, hausse du pic de RSS
+    pendant l'étape) : le pic absolu inclut environ 200 Mo d'interpréteur et de modules
+    importés, qui masqueraient une hausse de quelques dizaines de Mo.
+    """
+    if baseline["machine"] and baseline["machine"] != machine_info():
+        print("Attention : la référence a été mesurée sur une autre machine ou une autre version de Python")
+
+    regressions = []
+    for key, result in results.items():
+        reference = baseline["stages"].get(key)
+        if reference is None or reference["params"] != result["params"]:
+            print(f"   {key} : pas de référence avec les mêmes paramètres")
+            continue
+
+        slowdown = reference["rows_per_second"] / result["rows_per_second"] - 1
+        growth = result["rss_delta_mb"] - reference["rss_delta_mb"]
+        print(f"   {key} : débit {-slowdown:+.1%}, mémoire de l'étape {growth:+.1f} Mo")
+        if slowdown > threshold:
+            regressions.append(f"{key} : débit {result['rows_per_second']:.0f} lignes/s "
+                               f"(référence {reference['rows_per_second']:.0f}, -{slowdown:.0%})")
+        if growth > threshold * reference["rss_delta_mb"] + rss_slack_mb:
+            regressions.append(f"{key} : mémoire de l'étape +{result['rss_delta_mb']:.1f} Mo "
+                               f"(référence +{reference['rss_delta_mb']:.1f} Mo)")
+    return regressions
+
+
+def print_result(stage, result):
+    """Affiche les mesures d'une étape."""
+    print(
+        f"{stage:<12} {result['rows']:>10} lignes | {result['seconds']:8.2f}s | {result['rows_per_second']:>10.0f} lignes/s | "
+        f"{result['mb_per_second']:6.1f} Mo/s | pic RSS {result['peak_rss_mb']:7.1f} Mo (+{result['rss_delta_mb']:.1f} Mo)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesurer chaque étape du pipeline et détecter les régressions de performance.")
+    parser.add_argument("--stages", type=str, nargs="+", choices=STAGES, default=list(STAGES), help="Étapes à mesurer")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Lignes du dataset synthétique (10k à 10M)")
+    parser.add_argument("--metric_rows", type=int, default=DEFAULT_METRIC_ROWS, help="Lignes scorées par l'étape metrics")
+    parser.add_argument("--eval_rows", type=int, default=DEFAULT_EVAL_ROWS, help="Lignes évaluées par l'étape evaluate")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Latence simulée d'une requête (secondes)")
+    parser.add_argument("--error_rate", type=float, default=DEFAULT_ERROR_RATE, help="Proportion de réponses 503 simulées")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Requêtes simultanées de l'évaluation")
+    parser.add_argument("--seed", type=int, default=0, help="Graine des données synthétiques et du client factice")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Exécutions de chaque étape (la plus rapide est gardée)")
+    parser.add_argument("--workdir", type=str, help="Dossier des données synthétiques, réutilisées d'une exécution à l'autre "
+                                                    "(par défaut : dossier temporaire)")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH, help="Fichier de référence des mesures")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Régression tolérée (0.2 = 20 %%)")
+    parser.add_argument("--save", action="store_true", help="Enregistrer les mesures comme nouvelle référence")
+    parser.add_argument("--output", type=str, help="Fichier JSON où enregistrer les mesures de cette exécution")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        os.makedirs(workdir, exist_ok=True)
+        prepare_datasets(workdir, args.rows, args.seed)
+
+        results = {}
+        for stage in (stage for stage in STAGES if stage in args.stages):
+            result = run_stage(stage, args, workdir)
+            print_result(stage, result)
+            results[stage_key(stage, result)] = result
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine_info(), "stages": results}, f, indent=2)
+        print(f"Mesures enregistrées : {args.output}")
+
+    if args.save:
+        save_baseline(results, args.baseline)
+    else:
+        print(f"\nComparaison avec la référence {args.baseline} (seuil {args.threshold:.0%}) :")
+        regressions = compare(results, load_baseline(args.baseline), args.threshold)
+        if regressions:
+            print("\nRégressions :")
+            for regression in regressions:
+                print(f"   {regression}")
+            raise SystemExit(1)
+        print("Aucune régression")
@@ -0,0 +1,43 @@
+# Formatage et écriture des exemples au format chat attendu par Mistral
+
+import json
+from telemetry import telemetry
+
+# Taille du tampon d'écriture des fichiers JSONL
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Nombre de lignes accumulées avant chaque écriture
+WRITE_BATCH_LINES = 4096
+
+
+def format_example(user_content, assistant_content):
+    """Retourne la ligne JSONL d'un exemple question/réponse.
+
+    Le résultat est identique à json.dumps({"messages": [...]}) mais évite de
+    construire les dictionnaires intermédiaires pour chaque ligne.
+    """
+    return (
+        '{"messages": [{"role": "user", "content": ' + json.dumps(user_content)
+        + '}, {"role": "assistant", "content": ' + json.dumps(assistant_content) + '}]}\n'
+    )
+
+
+def write_examples(output_path, pairs):
+    """Écrit des couples (question, réponse) en JSONL par lots, sans les garder en mémoire.
+
+    Retourne le nombre de lignes écrites.
+    """
+    count = 0
+    batch = []
+    with open(output_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as jsonl_file:
+        for user_content, assistant_content in pairs:
+            batch.append(format_example(user_content, assistant_content))
+            if len(batch) >= WRITE_BATCH_LINES:
+                with telemetry.span("io.write"):
+                    jsonl_file.writelines(batch)
+                count += len(batch)
+                batch = []
+        with telemetry.span("io.write"):
+            jsonl_file.writelines(batch)
+        count += len(batch)
+    return count
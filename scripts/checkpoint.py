@@ -0,0 +1,72 @@
+# Écriture incrémentale des résultats en JSONL et reprise après interruption
+
+import os
+import json
+import hashlib
+
+
+def content_hash(text):
+    """Empreinte courte du contenu d'une ligne, pour vérifier qu'une ligne reprise n'a pas changé."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(path):
+    """Charge les résultats déjà écrits, indexés par (index, empreinte).
+
+    Une dernière ligne incomplète (interruption pendant l'écriture) est supprimée
+    du fichier afin que les nouveaux résultats puissent y être ajoutés.
+    """
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+
+    valid_end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                key = (record["index"], record["hash"])
+            except (ValueError, KeyError, TypeError):
+                break
+            if not line.endswith(b"\n"):
+                break
+            completed[key] = record
+            valid_end += len(line)
+
+    if valid_end < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_end)
+        print(f"Fin de fichier incomplète ignorée dans {path}")
+
+    return completed
+
+
+class CheckpointWriter:
+    """Ajoute chaque résultat au fichier JSONL dès qu'il est disponible.
+
+    Chaque ligne est vidée sur disque immédiatement, de sorte qu'un arrêt brutal
+    ne fait perdre au plus que la ligne en cours d'écriture.
+    """
+
+    def __init__(self, path, resume=False, fsync=False):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def write(self, record):
+        """Écrit un résultat et le vide sur disque."""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
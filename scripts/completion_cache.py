@@ -0,0 +1,119 @@
+# Cache persistant des complétions Mistral, indexé par (modèle, messages, paramètres)
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Emplacement et taille maximale par défaut du cache
+DEFAULT_CACHE_PATH = "data/cache/completions.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Après une éviction, le cache redescend à cette fraction de sa taille maximale
+EVICTION_TARGET = 0.9
+
+
+def make_key(model, messages, params=None):
+    """Calcule la clé de cache : empreinte SHA-256 du modèle, des messages et des paramètres."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params or {}},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Cache de complétions adressé par contenu, stocké dans une base SQLite.
+
+    Les entrées les moins récemment lues sont supprimées (LRU) dès que la taille
+    totale des réponses dépasse max_bytes. Le cache peut être partagé entre threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_access ON completions(last_access)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    def get(self, model, messages, params=None):
+        """Retourne la réponse en cache, ou None si elle n'a jamais été générée."""
+        key = make_key(model, messages, params)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, model, messages, params, response):
+        """Enregistre une réponse puis évince les entrées les plus anciennes si nécessaire."""
+        key = make_key(model, messages, params)
+        size = len(response.encode("utf-8")) + len(key)
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._size += size - (previous[0] if previous else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment lues jusqu'à repasser sous la cible."""
+        target = self.max_bytes * EVICTION_TARGET
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+
+            removed = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                removed.append((key,))
+                self._size -= size
+
+            self._conn.executemany("DELETE FROM completions WHERE key = ?", removed)
+            self.evictions += len(removed)
+
+    def stats(self):
+        """Retourne les compteurs du cache."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": self._size,
+        }
+
+    def close(self):
+        """Ferme la connexion à la base."""
+        with self._lock:
+            self._conn.close()
@@ -1,60 +1,83 @@
 # ATTENTION : Ce script suppose que les noms des colonnes du fichier csv sont "input" et "output"
 
 import os
-import json
 import pandas as pd
 import argparse
+from chat_format import write_examples
+from telemetry import add_arguments, session, telemetry
 
 # Définir les dossiers d'entrée et de sortie
 INPUT_DIR = "data/raw"
 OUTPUT_DIR = "data/converted"
 
+# Nombre de lignes du CSV lues à la fois
+CSV_CHUNK_ROWS = 10_000
+
 # Vérifier et créer le dossier de sortie s'il n'existe pas
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def convert_csv_to_jsonl(input_filename):
-    """Convertit un fichier CSV en JSONL et le sauvegarde dans le dossier de sortie."""
+def convert_csv_to_jsonl(input_filename, input_dir=INPUT_DIR, output_dir=OUTPUT_DIR, chunk_rows=CSV_CHUNK_ROWS):
+    """Convertit un fichier CSV en JSONL et le sauvegarde dans le dossier de sortie.
+
+    Le CSV est lu par blocs de chunk_rows lignes : la mémoire utilisée ne dépend pas de sa taille.
+    """
     
-    input_path = os.path.join(INPUT_DIR, input_filename)
+    input_path = os.path.join(input_dir, input_filename)
     output_filename = os.path.splitext(input_filename)[0] + "_formatted.jsonl"
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
+    output_path = os.path.join(output_dir, output_filename)
 
     # Vérifier si le fichier existe
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Le fichier {input_path} n'existe pas.")
 
-    # Charger le fichier CSV
+    # Lire uniquement l'en-tête pour vérifier les colonnes
     try:
-        data_f = pd.read_csv(input_path)
+        header = pd.read_csv(input_path, nrows=0)
     except Exception as e:
         raise ValueError(f"Erreur lors de la lecture du fichier CSV : {e}")
 
     # Vérifier si les colonnes nécessaires existent
     required_columns = {"input", "output"}
-    if not required_columns.issubset(data_f.columns):
+    if not required_columns.issubset(header.columns):
         raise ValueError(f"Le fichier CSV doit contenir les colonnes suivantes : {required_columns}")
 
-    # Convertir les données en JSONL formaté
-    jsonl_data = [
-        {
-            "messages": [
-                {"role": "user", "content": row["input"]},
-                {"role": "assistant", "content": row["output"]}
-            ]
-        }
-        for _, row in data_f.iterrows()
-    ]
+    # Parcourir le CSV par blocs, en accédant aux colonnes entières plutôt qu'à chaque ligne.
+    # Les cellules sont lues comme du texte : une valeur numérique ("42", "3.5") est écrite telle
+    # qu'elle figure dans le CSV, en chaîne, et non plus en nombre JSON (Mistral attend du texte).
+    # Seules les cellules vides sont des valeurs manquantes ("NA", "None", "null"... restent du
+    # texte) ; les lignes dont une cellule est vide sont ignorées : elles produiraient un contenu
+    # NaN, rejeté par Mistral à la validation du job.
+    skipped = 0
+
+    def iter_pairs():
+        nonlocal skipped
+        reader = iter(pd.read_csv(input_path, usecols=["input", "output"], dtype=str,
+                                  keep_default_na=False, na_values=[""], chunksize=chunk_rows))
+        while True:
+            with telemetry.span("convert.csv_parse"):
+                chunk = next(reader, None)
+            if chunk is None:
+                return
+            complete = chunk.dropna()
+            skipped += len(chunk) - len(complete)
+            yield from zip(complete["input"].tolist(), complete["output"].tolist())
 
-    # Sauvegarder en JSONL
-    with open(output_path, 'w', encoding='utf-8') as jsonl_file:
-        for entry in jsonl_data:
-            jsonl_file.write(json.dumps(entry) + '\n')
+    try:
+        with telemetry.span("convert.csv"), telemetry.profile("convert_csv"):
+            count = write_examples(output_path, iter_pairs())
+    except pd.errors.ParserError as e:
+        raise ValueError(f"Erreur lors de la lecture du fichier CSV : {e}")
 
-    print(f"Fichier JSONL généré : {output_path}")
+    print(f"Fichier JSONL généré : {output_path} ({count} exemples)")
+    if skipped:
+        print(f"   {skipped} lignes ignorées (cellule input ou output vide)")
+    return output_path
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convertir un fichier CSV en JSONL.")
     parser.add_argument("filename", type=str, help="Nom du fichier CSV à convertir (doit être dans data/raw)")
+    add_arguments(parser)
     args = parser.parse_args()
 
-    convert_csv_to_jsonl(args.filename)
+    with session(args):
+        convert_csv_to_jsonl(args.filename)
@@ -0,0 +1,361 @@
+# Déduplication (exacte et approximative) et détection des fuites entre train et test
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import argparse
+import unicodedata
+import numpy as np
+from telemetry import add_arguments, session, telemetry
+
+# Dossiers des fichiers convertis (déduplication) et des ensembles générés (fuites)
+INPUT_DIR = "data/converted"
+PROCESSED_DIR = "data/processed"
+
+# Paramètres MinHash / LSH : 16 bandes de 8 lignes, soit un seuil de similarité de Jaccard
+# d'environ (1/16)^(1/8) ≈ 0.7 sur les 3-grammes de mots
+NUM_PERM = 128
+NUM_BANDS = 16
+SHINGLE_SIZE = 3
+
+# Nombre de textes signés à la fois
+BLOCK_SIZE = 512
+
+# Nombre maximal de n-grammes hachés ensemble : chaque tableau intermédiaire occupe au plus
+# NUM_PERM × MAX_BLOCK_SHINGLES × 8 octets (16 Mo), quelle que soit la longueur des textes
+MAX_BLOCK_SHINGLES = 1 << 14
+
+_SHIFT = np.uint64(32)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    """Normalise un texte : minuscules, sans ponctuation ni espaces superflus."""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def example_text(line, field):
+    """Texte comparé pour une ligne JSONL : la question seule, ou le couple question/réponse."""
+    messages = json.loads(line)["messages"]
+    question = next((m["content"] for m in messages if m["role"] == "user"), "")
+    if field == "question":
+        return normalize(question)
+    answer = next((m["content"] for m in reversed(messages) if m["role"] == "assistant"), "")
+    return normalize(question) + " \x1f " + normalize(answer)
+
+
+def exact_key(text):
+    """Empreinte 64 bits d'un texte normalisé."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """Calcule des signatures MinHash par lots et les regroupe en bandes LSH.
+
+    Deux textes dont la similarité de Jaccard dépasse environ (1/bandes)^(1/lignes)
+    partagent au moins une bande avec une forte probabilité.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, num_bands=NUM_BANDS, shingle_size=SHINGLE_SIZE, seed=1):
+        if num_perm % num_bands:
+            raise ValueError("Le nombre de permutations doit être un multiple du nombre de bandes.")
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self.shingle_size = shingle_size
+        self.threshold = (1 / num_bands) ** (1 / self.rows)
+        self._a = (rng.randint(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+        self._b = rng.randint(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+        self._band_mult = rng.randint(1, 1 << 62, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+    def shingles(self, text):
+        """Hache les n-grammes de mots d'un texte (au moins un n-gramme, même pour un texte court)."""
+        words = text.split()
+        size = min(self.shingle_size, len(words)) or 1
+        grams = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        return [zlib.crc32(g.encode("utf-8")) for g in grams]
+
+    def _permute(self, values):
+        # Hachage universel multiply-shift ((a*x + b) mod 2^64) >> 32 : une ligne par permutation
+        return (self._a * values + self._b) >> _SHIFT
+
+    def signatures(self, texts):
+        """Retourne les signatures MinHash (textes × permutations) de textes.
+
+        Les textes sont hachés par sous-lots d'au plus MAX_BLOCK_SHINGLES n-grammes ; un texte
+        plus long est haché seul, par tranches, en gardant le minimum courant.
+        """
+        shingles = [self.shingles(text) for text in texts]
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint64)
+        start = 0
+        while start < len(texts):
+            stop, total = start + 1, len(shingles[start])
+            while stop < len(texts) and total + len(shingles[stop]) <= MAX_BLOCK_SHINGLES:
+                total += len(shingles[stop])
+                stop += 1
+
+            if total > MAX_BLOCK_SHINGLES:
+                values = np.array(shingles[start], dtype=np.uint64)
+                signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+                for i in range(0, len(values), MAX_BLOCK_SHINGLES):
+                    signature = np.minimum(signature, self._permute(values[i:i + MAX_BLOCK_SHINGLES]).min(axis=1))
+                signatures[start] = signature
+            else:
+                offsets = np.cumsum([0] + [len(s) for s in shingles[start:stop - 1]])
+                values = np.fromiter((h for s in shingles[start:stop] for h in s), dtype=np.uint64, count=total)
+                signatures[start:stop] = np.minimum.reduceat(self._permute(values), offsets, axis=1).T
+            start = stop
+        return signatures
+
+    def similarity(self, a, b):
+        """Similarité de Jaccard estimée à partir de deux signatures."""
+        return float(np.mean(a == b))
+
+    def band_hashes(self, texts):
+        """Retourne un tableau (textes × bandes) d'empreintes de bandes."""
+        signatures = self.signatures(texts)
+
+        # Une empreinte par bande : combinaison linéaire des lignes de la bande (modulo 2^64)
+        bands = signatures.reshape(len(texts), self.num_bands, self.rows)
+        return (bands * self._band_mult).sum(axis=2, dtype=np.uint64)
+
+
+def file_signatures(path, field, hasher):
+    """Parcourt un fichier JSONL et retourne (empreintes exactes, empreintes de bandes) par ligne."""
+    exact, bands, block = [], [], []
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            text = example_text(line, field)
+            exact.append(exact_key(text))
+            block.append(text)
+            if len(block) >= BLOCK_SIZE:
+                bands.append(hasher.band_hashes(block))
+                block = []
+    if block:
+        bands.append(hasher.band_hashes(block))
+
+    exact = np.array(exact, dtype=np.uint64)
+    bands = np.concatenate(bands) if bands else np.zeros((0, hasher.num_bands), dtype=np.uint64)
+    return exact, bands
+
+
+def line_signatures(path, field, hasher, selected):
+    """Signatures MinHash des lignes non vides dont le masque selected est vrai (dans l'ordre du fichier)."""
+    signatures, block = [], []
+    with open(path, "rb") as f:
+        index = 0
+        for line in f:
+            if index >= len(selected):
+                break
+            if not line.strip():
+                continue
+            if selected[index]:
+                block.append(example_text(line, field))
+                if len(block) >= BLOCK_SIZE:
+                    signatures.append(hasher.signatures(block).astype(np.uint32))
+                    block = []
+            index += 1
+    if block:
+        signatures.append(hasher.signatures(block).astype(np.uint32))
+    return np.concatenate(signatures) if signatures else np.zeros((0, hasher.num_perm), dtype=np.uint32)
+
+
+def connected_groups(band_hashes):
+    """Regroupe les lignes partageant une bande (transitivement) ; retourne l'indice minimal de chaque groupe."""
+    n = len(band_hashes)
+    labels = np.arange(n)
+    orders = [np.argsort(band_hashes[:, k], kind="stable") for k in range(band_hashes.shape[1])]
+
+    # Propager le plus petit indice dans chaque seau jusqu'à stabilisation
+    changed = n > 0
+    while changed:
+        changed = False
+        for k, order in enumerate(orders):
+            keys = band_hashes[order, k]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            current = labels[order]
+            group_min = np.repeat(np.minimum.reduceat(current, starts), np.diff(np.r_[starts, n]))
+            if (group_min < current).any():
+                labels[order] = group_min
+                changed = True
+    return labels
+
+
+def row_mask(rows):
+    """Masque booléen des lignes rows (numéros de lignes non vides), pour line_signatures."""
+    selected = np.zeros(int(rows.max()) + 1 if len(rows) else 0, dtype=bool)
+    selected[rows] = True
+    return selected
+
+
+def candidate_pairs(query_bands, reference_bands):
+    """Couples (ligne de query_bands, ligne de reference_bands) partageant au moins une bande, sans doublon."""
+    pairs = []
+    for k in range(query_bands.shape[1]):
+        order = np.argsort(reference_bands[:, k], kind="stable")
+        keys = reference_bands[order, k]
+        lo = np.searchsorted(keys, query_bands[:, k], side="left")
+        counts = np.searchsorted(keys, query_bands[:, k], side="right") - lo
+
+        # Pour chaque requête, toutes les positions lo..hi-1 de son seau
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        positions = starts + np.arange(int(counts.sum()))
+        pairs.append(np.stack([np.repeat(np.arange(len(query_bands)), counts), order[positions]], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0) if pairs else np.zeros((0, 2), dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def verified_duplicates(path, field, hasher, rows, labels):
+    """Lignes (parmi rows) à supprimer comme quasi-doublons, d'après les groupes LSH labels.
+
+    Les bandes regroupent les lignes transitivement : si A ressemble à B et B à C, C est
+    dans le groupe de A même si A et C diffèrent. Chaque ligne d'un groupe est donc
+    comparée (similarité estimée par les signatures, relues pour les seules lignes
+    groupées) aux lignes déjà conservées de son groupe, dans l'ordre du fichier, et
+    n'est supprimée que si l'une d'elles dépasse le seuil de similarité.
+    """
+    grouped = np.bincount(labels, minlength=len(labels))[labels] > 1
+    candidates = rows[grouped]
+    signatures = line_signatures(path, field, hasher, row_mask(candidates))
+
+    duplicates, representatives = [], {}
+    for row, group, signature in zip(candidates, labels[grouped], signatures):
+        kept = representatives.setdefault(group, [])
+        if any(hasher.similarity(signature, other) >= hasher.threshold for other in kept):
+            duplicates.append(row)
+        else:
+            kept.append(signature)
+    return np.array(duplicates, dtype=np.int64)
+
+
+def write_filtered(input_path, output_path, keep):
+    """Recopie les lignes non vides dont le masque keep est vrai."""
+    tmp_path = output_path + ".tmp"
+    with open(input_path, "rb") as src, open(tmp_path, "wb") as dst:
+        index = 0
+        for line in src:
+            if not line.strip():
+                continue
+            if keep[index]:
+                dst.write(line if line.endswith(b"\n") else line + b"\n")
+            index += 1
+    os.replace(tmp_path, output_path)
+
+
+def deduplicate(input_filename, field="pair", near=True, input_dir=INPUT_DIR, output_dir=INPUT_DIR, hasher=None):
+    """Supprime les doublons exacts puis les quasi-doublons d'un fichier JSONL converti.
+
+    La première occurrence de chaque groupe est conservée. Le résultat est écrit dans
+    <fichier>_dedup.jsonl, à découper ensuite avec train_test_val.py.
+    """
+    input_path = os.path.join(input_dir, input_filename)
+    output_path = os.path.join(output_dir, os.path.splitext(input_filename)[0] + "_dedup.jsonl")
+
+    # Vérifier si le fichier existe
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Le fichier {input_path} n'existe pas.")
+
+    hasher = hasher or MinHasher()
+    exact, bands = file_signatures(input_path, field, hasher)
+
+    # Doublons exacts : première occurrence de chaque empreinte normalisée
+    _, first = np.unique(exact, return_index=True)
+    keep = np.zeros(len(exact), dtype=bool)
+    keep[first] = True
+    exact_dups = len(exact) - int(keep.sum())
+
+    # Quasi-doublons parmi les lignes restantes
+    near_dups = 0
+    if near:
+        kept = np.flatnonzero(keep)
+        labels = connected_groups(bands[kept])
+        duplicates = verified_duplicates(input_path, field, hasher, kept, labels)
+        keep[duplicates] = False
+        near_dups = len(duplicates)
+
+    write_filtered(input_path, output_path, keep)
+    print(f"Doublons exacts supprimés : {exact_dups}")
+    print(f"Quasi-doublons supprimés  : {near_dups}")
+    print(f"Fichier dédupliqué : {output_path} ({int(keep.sum())}/{len(keep)} exemples)")
+    return output_path
+
+
+def find_leaks(train_path, eval_path, hasher=None):
+    """Repère les lignes d'un ensemble d'évaluation dont la question figure (à peu près) dans train.
+
+    Retourne deux masques booléens : fuites exactes et quasi-doublons. Comme pour la
+    déduplication, une bande commune ne fait que désigner un candidat : la ligne n'est un
+    quasi-doublon que si sa similarité avec l'une des lignes de train candidates (estimée
+    par les signatures, relues pour ces seules lignes) atteint le seuil.
+    """
+    hasher = hasher or MinHasher()
+    train_exact, train_bands = file_signatures(train_path, "question", hasher)
+    eval_exact, eval_bands = file_signatures(eval_path, "question", hasher)
+
+    exact = np.isin(eval_exact, train_exact)
+    near = np.zeros(len(eval_exact), dtype=bool)
+
+    queries, references = candidate_pairs(eval_bands, train_bands)
+    queries, references = queries[~exact[queries]], references[~exact[queries]]
+    if len(queries):
+        eval_rows, train_rows = np.unique(queries), np.unique(references)
+        eval_signatures = line_signatures(eval_path, "question", hasher, row_mask(eval_rows))
+        train_signatures = line_signatures(train_path, "question", hasher, row_mask(train_rows))
+        for query, q, r in zip(queries, np.searchsorted(eval_rows, queries), np.searchsorted(train_rows, references)):
+            if not near[query] and hasher.similarity(eval_signatures[q], train_signatures[r]) >= hasher.threshold:
+                near[query] = True
+    return exact, near
+
+
+def check_leakage(train_filename, eval_filenames, drop=False, data_dir=PROCESSED_DIR):
+    """Affiche les fuites de chaque ensemble d'évaluation vers train et les supprime si drop=True."""
+    hasher = MinHasher()
+    train_path = os.path.join(data_dir, train_filename)
+    report = {}
+
+    for eval_filename in eval_filenames:
+        eval_path = os.path.join(data_dir, eval_filename)
+        for path in (train_path, eval_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Le fichier {path} n'existe pas.")
+
+        exact, near = find_leaks(train_path, eval_path, hasher)
+        report[eval_filename] = {"rows": len(exact), "exact": int(exact.sum()), "near": int(near.sum())}
+        print(f"{eval_filename} : {int(exact.sum())} fuites exactes et {int(near.sum())} quasi-doublons de train (sur {len(exact)} lignes)")
+
+        if drop:
+            write_filtered(eval_path, eval_path, ~(exact | near))
+            print(f"   Lignes supprimées de {eval_path} : {int((exact | near).sum())}")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dédupliquer un dataset et détecter les fuites entre ensembles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    dedup_parser = subparsers.add_parser("dedup", help="Supprimer les doublons d'un fichier de data/converted")
+    dedup_parser.add_argument("filename", type=str, help="Nom du fichier JSONL à dédupliquer (doit être dans data/converted)")
+    dedup_parser.add_argument("--field", choices=["pair", "question"], default="pair", help="Texte comparé : couple question/réponse ou question seule")
+    dedup_parser.add_argument("--exact_only", action="store_true", help="Ne supprimer que les doublons exacts")
+
+    leak_parser = subparsers.add_parser("leakage", help="Détecter les questions de validation/test présentes dans train")
+    leak_parser.add_argument("train_file", type=str, help="Fichier d'entraînement (dans data/processed)")
+    leak_parser.add_argument("eval_files", type=str, nargs="+", help="Fichiers de validation/test (dans data/processed)")
+    leak_parser.add_argument("--drop", action="store_true", help="Supprimer les lignes en fuite des fichiers d'évaluation")
+
+    for subparser in (dedup_parser, leak_parser):
+        add_arguments(subparser)
+    args = parser.parse_args()
+
+    with session(args), telemetry.span(f"dedup.{args.command}"), telemetry.profile(args.command):
+        if args.command == "dedup":
+            deduplicate(args.filename, field=args.field, near=not args.exact_only)
+        else:
+            check_leakage(args.train_file, args.eval_files, drop=args.drop)
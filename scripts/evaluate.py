@@ -1,167 +1,286 @@
 import os
 import json
-import time
+import numpy as np
 import argparse
 import getpass
-import matplotlib.pyplot as plt
-import nltk
-from nltk.translate.bleu_score import sentence_bleu
-from rouge_score import rouge_scorer
-from sklearn.metrics import f1_score
 from mistral import Mistral
-
-# Télécharger les ressources nécessaires pour NLTK
-nltk.download("punkt")
-
-def calculate_metrics(reference, candidate):
-    """Calcule BLEU, ROUGE et F1-score entre une réponse attendue et une réponse générée."""
-
-    # BLEU score (1-gram)
-    bleu_score = sentence_bleu([nltk.word_tokenize(reference)], nltk.word_tokenize(candidate), weights=(1, 0, 0, 0))
-
-    # ROUGE scores
-    scorer = rouge_scorer.RougeScorer(["rouge1", "rouge2", "rougeL"], use_stemmer=True)
-    rouge_scores = scorer.score(reference, candidate)
-
-    # F1 score (approximation via la similarité des tokens)
-    ref_tokens = set(nltk.word_tokenize(reference))
-    cand_tokens = set(nltk.word_tokenize(candidate))
-
-    common_tokens = ref_tokens.intersection(cand_tokens)
-    precision = len(common_tokens) / len(cand_tokens) if cand_tokens else 0
-    recall = len(common_tokens) / len(ref_tokens) if ref_tokens else 0
-    f1 = (2 * precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-
-    return bleu_score, rouge_scores, f1
-
-def evaluate_model(api_key, test_file):
-    """Effectue l'inférence sur l'ensemble de test et calcule les métriques."""
+from inference_engine import InferenceEngine, DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT
+from completion_cache import CompletionCache, DEFAULT_CACHE_PATH
+from checkpoint import CheckpointWriter, content_hash, load_checkpoint
+from metrics import score_batch
+from model_registry import ModelRegistry, resolve_model
+from results_table import ResultsTable
+from report import DEFAULT_RESAMPLES, print_differences, write_report
+from jsonl_index import JsonlIndex
+from telemetry import add_arguments, session, telemetry
+from adaptive_eval import (DEFAULT_BATCH_ROWS, DEFAULT_CONFIDENCE, DEFAULT_METRIC, DEFAULT_TOLERANCE,
+                           StoppingRule, field_strata, length_strata, stratified_order)
+
+# Dossier des résultats d'évaluation
+RESULTS_DIR = "data/results"
+
+# Modèle de référence comparé au modèle fine-tuné
+BASE_MODEL = "open-mistral-7b"
+
+def default_output_path(test_file):
+    """Chemin par défaut du fichier de résultats associé à un fichier de test."""
+    base_filename = os.path.splitext(os.path.basename(test_file))[0]
+    return os.path.join(RESULTS_DIR, f"{base_filename}_results.jsonl")
+
+def table_path(output_path):
+    """Chemin de la table de scores (.npz) associée au fichier JSONL des résultats."""
+    return os.path.splitext(output_path)[0] + ".npz"
+
+def sample_params(samples=1, temperature=None):
+    """Paramètres de génération de chaque échantillon.
+
+    Chaque échantillon a sa propre graine (random_seed) : les k réponses d'un même
+    prompt sont distinctes et restent en cache séparément.
+    """
+    if samples == 1 and temperature is None:
+        return [{}]
+    params = []
+    for s in range(samples):
+        p = {} if temperature is None else {"temperature": temperature}
+        if samples > 1:
+            p["random_seed"] = s
+        params.append(p)
+    return params
+
+class EvalOptions:
+    """Options d'exécution d'une évaluation.
+
+    - moteur de requêtes : concurrency, rate_limit ; cache des complétions : cache_path
+      (None pour le désactiver) ;
+    - échantillonnage : samples réponses par prompt à la température temperature, subset
+      lignes tirées au hasard (graine seed) ;
+    - mode adaptatif (adaptive_eval) : adaptive, stratify, batch_rows, metric, tolerance, confidence ;
+    - rapport : num_resamples rééchantillonnages bootstrap.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT, cache_path=DEFAULT_CACHE_PATH,
+                 samples=1, temperature=None, subset=None, seed=0, adaptive=False, stratify="length",
+                 batch_rows=DEFAULT_BATCH_ROWS, metric=DEFAULT_METRIC, tolerance=DEFAULT_TOLERANCE,
+                 confidence=DEFAULT_CONFIDENCE, num_resamples=DEFAULT_RESAMPLES):
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.cache_path = cache_path
+        self.samples = samples
+        self.temperature = temperature
+        self.subset = subset
+        self.seed = seed
+        self.adaptive = adaptive
+        self.stratify = stratify
+        self.batch_rows = batch_rows
+        self.metric = metric
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.num_resamples = num_resamples
+
+    @classmethod
+    def from_args(cls, args):
+        """Options lues sur la ligne de commande de evaluate.py."""
+        return cls(concurrency=args.concurrency, rate_limit=args.rate_limit,
+                   cache_path=None if args.no_cache else args.cache,
+                   samples=args.samples, temperature=args.temperature, subset=args.subset, seed=args.seed,
+                   adaptive=args.adaptive, stratify=args.stratify, batch_rows=args.batch_rows,
+                   metric=args.metric, tolerance=args.tolerance, confidence=args.confidence,
+                   num_resamples=args.resamples)
+
+def evaluate_model(api_key, test_file, options=None, output_path=None, resume=False, client=None,
+                   model=None, tag=None, best=None, models=None):
+    """Effectue l'inférence sur l'ensemble de test et calcule les métriques de plusieurs modèles.
+
+    Par défaut, le modèle fine-tuné (model, ou celui choisi dans le registre local avec
+    tag/best) est comparé au modèle de base ; models permet d'évaluer une liste
+    quelconque de modèles dans la même exécution. Les autres réglages sont regroupés
+    dans options (EvalOptions, valeurs par défaut si None).
+    Avec samples > 1, chaque modèle génère plusieurs réponses par prompt (à la température
+    temperature). Les requêtes de tous les modèles sont envoyées ensemble, et les complétions
+    sont mises en cache dans cache_path (None pour désactiver le cache).
+    Avec subset, seules subset lignes tirées au hasard (graine seed) sont évaluées : le
+    fichier de test est lu par son index (jsonl_index), sans charger les autres lignes.
+    Avec adaptive=True, les lignes sont évaluées par lots de batch_rows dans un ordre
+    stratifié (stratify : "length" pour la longueur des questions, ou un champ) et
+    l'évaluation s'arrête dès que l'intervalle de confiance de l'écart au modèle de
+    référence sur metric exclut 0 ou devient plus étroit que tolerance (adaptive_eval).
+    Chaque ligne évaluée est écrite immédiatement dans output_path ; avec resume=True,
+    les lignes déjà présentes (même index, même contenu et mêmes modèles) ne sont pas réévaluées.
+    À la fin, la table des scores et des réponses est enregistrée en .npz (avec un JSON
+    de métadonnées) et un rapport PNG/HTML avec intervalles de confiance bootstrap
+    est écrit à côté. Retourne la table (ResultsTable) ; les moyennes sont aussi
+    enregistrées dans le registre.
+    """
     
-    # Initialiser le client Mistral
-    client = Mistral(api_key=api_key)
-
-    # Lister les jobs (finetuning)
-    jobs = client.fine_tuning.jobs.list()
-
-    # Dernier modèle fine-tuné
-    job_id = jobs.data[0].id
-
-    # Choisir le job correspondant au modèle souhaité
-    retrieved_jobs = client.fine_tuning.jobs.get(job_id=job_id)
-
-    # Charger le modèle fine-tuné
-    fine_tuned_model = retrieved_jobs.fine_tuned_model
+    # Initialiser le client Mistral (un client factice peut être fourni pour les tests)
+    client = client or Mistral(api_key=api_key)
+    options = options or EvalOptions()
+    samples, subset, seed, batch_rows = options.samples, options.subset, options.seed, options.batch_rows
+
+    # Modèles comparés : fine-tuné (registre local, sans appel à l'API s'il est à jour) et base
+    if not models:
+        models = [model or resolve_model(client, tag=tag, metric=best), BASE_MODEL]
+    params = sample_params(samples, options.temperature)
     
-    # Charger le dataset de test
-    with open(test_file, "r", encoding="utf-8") as f:
-        test_data = [json.loads(line) for line in f]
-
-    base_model = "open-mistral-7b"
-    results = []
-
-    bleu_scores_base, bleu_scores_finetuned = [], []
-    rouge1_base, rouge2_base, rougeL_base = [], [], []
-    rouge1_finetuned, rouge2_finetuned, rougeL_finetuned = [], [], []
-    f1_scores_base, f1_scores_finetuned = [], []
-
-    for i, example in enumerate(test_data):
-        user_input = example["messages"][0]["content"]
-        expected_output = example["messages"][1]["content"]
-
-        # Générer les réponses des modèles
-        chat_response_finetuned = client.chat.complete(model=fine_tuned_model, messages=[{"role": "user", "content": user_input}])
-        chat_response_base = client.chat.complete(model=base_model, messages=[{"role": "user", "content": user_input}])
-
-        fine_tuned_output = chat_response_finetuned.choices[0].message.content
-        base_output = chat_response_base.choices[0].message.content
-
-        # Calculer les métriques
-        bleu_finetuned, rouge_finetuned, f1_finetuned = calculate_metrics(expected_output, fine_tuned_output)
-        bleu_base, rouge_base, f1_base = calculate_metrics(expected_output, base_output)
-
-        # Stocker les métriques
-        bleu_scores_base.append(bleu_base)
-        bleu_scores_finetuned.append(bleu_finetuned)
-
-        rouge1_base.append(rouge_base["rouge1"].fmeasure)
-        rouge2_base.append(rouge_base["rouge2"].fmeasure)
-        rougeL_base.append(rouge_base["rougeL"].fmeasure)
-
-        rouge1_finetuned.append(rouge_finetuned["rouge1"].fmeasure)
-        rouge2_finetuned.append(rouge_finetuned["rouge2"].fmeasure)
-        rougeL_finetuned.append(rouge_finetuned["rougeL"].fmeasure)
-
-        f1_scores_base.append(f1_base)
-        f1_scores_finetuned.append(f1_finetuned)
-
-        # Stocker les résultats
-        results.append({
-            "question": user_input,
-            "expected_answer": expected_output,
-            "generated_answer": {
-                "fine_tuned": fine_tuned_output,
-                "base": base_output
-            },
-            "metrics": {
-                "bleu": {"fine_tuned": bleu_finetuned, "base": bleu_base},
-                "rouge1": {"fine_tuned": rouge_finetuned["rouge1"].fmeasure, "base": rouge_base["rouge1"].fmeasure},
-                "rouge2": {"fine_tuned": rouge_finetuned["rouge2"].fmeasure, "base": rouge_base["rouge2"].fmeasure},
-                "rougeL": {"fine_tuned": rouge_finetuned["rougeL"].fmeasure, "base": rouge_base["rougeL"].fmeasure},
-                "f1": {"fine_tuned": f1_finetuned, "base": f1_base},
-            }
-        })
-
-        # Afficher les résultats en temps réel
-        print(f"🔹 {i+1}/{len(test_data)} - Question: {user_input}")
-        print(f"   Expected: {expected_output}")
-        print(f"   Fine-Tuned Model: {fine_tuned_output}")
-        print(f"   Base Model: {base_output}\n")
-
-        time.sleep(1)  # Pause pour éviter de surcharger l'API
-
-    # Calcul des moyennes des scores
-    avg_bleu_base = sum(bleu_scores_base) / len(bleu_scores_base)
-    avg_bleu_finetuned = sum(bleu_scores_finetuned) / len(bleu_scores_finetuned)
-
-    avg_rouge1_base = sum(rouge1_base) / len(rouge1_base)
-    avg_rouge2_base = sum(rouge2_base) / len(rouge2_base)
-    avg_rougeL_base = sum(rougeL_base) / len(rougeL_base)
-
-    avg_rouge1_finetuned = sum(rouge1_finetuned) / len(rouge1_finetuned)
-    avg_rouge2_finetuned = sum(rouge2_finetuned) / len(rouge2_finetuned)
-    avg_rougeL_finetuned = sum(rougeL_finetuned) / len(rougeL_finetuned)
-
-    avg_f1_base = sum(f1_scores_base) / len(f1_scores_base)
-    avg_f1_finetuned = sum(f1_scores_finetuned) / len(f1_scores_finetuned)
-
-    # Création des graphiques
-    labels_bleu = ["BLEU Base", "BLEU Fine-Tuned"]
-    values_bleu = [avg_bleu_base, avg_bleu_finetuned]
-
-    labels_rouge = ["ROUGE-1 Base", "ROUGE-1 Fine-Tuned", "ROUGE-2 Base", "ROUGE-2 Fine-Tuned", "ROUGE-L Base", "ROUGE-L Fine-Tuned"]
-    values_rouge = [avg_rouge1_base, avg_rouge1_finetuned, avg_rouge2_base, avg_rouge2_finetuned, avg_rougeL_base, avg_rougeL_finetuned]
-
-    labels_f1 = ["F1 Base", "F1 Fine-Tuned"]
-    values_f1 = [avg_f1_base, avg_f1_finetuned]
-
-    fig, axs = plt.subplots(1, 3, figsize=(18, 6))
-
-    axs[0].bar(labels_bleu, values_bleu, color=['blue', 'red'])
-    axs[0].set_title('BLEU Score Comparison')
-
-    axs[1].bar(labels_rouge, values_rouge, color=['blue', 'red', 'blue', 'red', 'blue', 'red'])
-    axs[1].set_title('ROUGE Score Comparison')
-
-    axs[2].bar(labels_f1, values_f1, color=['blue', 'red'])
-    axs[2].set_title('F1 Score Comparison')
-
-    plt.tight_layout()
-    plt.show()
+    # Charger les lignes évaluées du dataset de test (l'empreinte de chaque ligne sert à la reprise)
+    with JsonlIndex(test_file) as index:
+        if options.adaptive:
+            # Ordre stratifié : chaque lot successif est un échantillon représentatif du fichier
+            test_lines = [index.raw(i).decode("utf-8").strip() for i in range(len(index))]
+            if options.stratify == "length":
+                strata = length_strata([json.loads(line)["messages"][0]["content"] for line in test_lines])
+            else:
+                strata = field_strata(test_lines, options.stratify) if options.stratify else np.zeros(len(test_lines), dtype=np.int64)
+            rows = stratified_order(strata, seed)[:subset].tolist()
+            test_lines = [test_lines[i] for i in rows]
+        else:
+            rows = list(range(len(index))) if subset is None else index.sample_indices(subset, seed).tolist()
+            test_lines = [index.raw(i).decode("utf-8").strip() for i in rows]
+    test_data = [json.loads(line) for line in test_lines]
+    row_hashes = [content_hash(line) for line in test_lines]
+    positions = {i: p for p, i in enumerate(rows)}
+    table = ResultsTable(models, len(test_data), samples,
+                         questions=[example["messages"][0]["content"] for example in test_data],
+                         references=[example["messages"][1]["content"] for example in test_data])
+
+    # Reprendre les lignes déjà évaluées (avec les mêmes modèles) lors d'une exécution précédente
+    output_path = output_path or default_output_path(test_file)
+    completed = load_checkpoint(output_path) if resume else {}
+    for (i, h), record in completed.items():
+        p = positions.get(i)
+        try:
+            if p is not None and row_hashes[p] == h:
+                table.set_row_record(p, record["metrics"])
+                table.generations[:, p, :] = [record["generated_answer"][name] for name in models]
+        except (KeyError, ValueError):
+            pass  # ligne évaluée avec d'autres modèles ou un autre nombre d'échantillons
+    pending = np.flatnonzero(~table.completed_rows()).tolist()
+    if resume:
+        print(f"Reprise : {len(test_data) - len(pending)} lignes déjà évaluées, {len(pending)} restantes")
+
+    # Les requêtes de tous les modèles sont envoyées en parallèle, avec un débit limité
+    cache = CompletionCache(options.cache_path) if options.cache_path else None
+    engine = InferenceEngine(client, max_concurrency=options.concurrency, rate_limit=options.rate_limit, cache=cache)
+
+    def iter_requests(batch):
+        for row in batch:
+            messages = [{"role": "user", "content": test_data[row]["messages"][0]["content"]}]
+            for name in models:
+                for p in params:
+                    yield {"model": name, "messages": messages, **p}
+
+    # Évaluation complète en un seul lot ; en mode adaptatif, un test d'arrêt après chaque lot
+    reference = BASE_MODEL if BASE_MODEL in models else models[-1]
+    stop = (StoppingRule(reference, options.metric, options.tolerance, options.confidence, min_rows=batch_rows, seed=seed)
+            if options.adaptive else None)
+    batches = [pending[k:k + batch_rows] for k in range(0, len(pending), batch_rows)] if options.adaptive else [pending]
+    stopped = None
+    writer = CheckpointWriter(output_path, resume=resume)
+
+    # Boucle principale (profilée avec --profile)
+    with telemetry.profile("evaluate"):
+        for batch in batches:
+            # Les réponses arrivent dans l'ordre des requêtes : modèle par modèle, échantillon par échantillon
+            outputs = engine.imap(iter_requests(batch))
+
+            for p in batch:
+                example = test_data[p]
+                user_input = example["messages"][0]["content"]
+                expected_output = example["messages"][1]["content"]
+
+                # Récupérer les réponses des modèles
+                with telemetry.span("evaluate.wait_api"):
+                    generated = [next(outputs)[1] for _ in range(len(models) * samples)]
+
+                # Calculer les métriques de toutes les réponses en un seul lot (la référence n'est tokenisée qu'une fois)
+                table.set_row(p, score_batch([expected_output] * len(generated), generated), generated)
+
+                # Écrire la ligne immédiatement sur disque (avec son numéro dans le fichier de test)
+                record = {
+                    "index": rows[p],
+                    "hash": row_hashes[p],
+                    "question": user_input,
+                    "expected_answer": expected_output,
+                    "generated_answer": {name: generated[m * samples:(m + 1) * samples] for m, name in enumerate(models)},
+                    "metrics": table.row_record(p),
+                }
+                with telemetry.span("io.write"):
+                    writer.write(record)
+
+                # Afficher les résultats en temps réel
+                print(f"🔹 {p+1}/{len(test_data)} - Question: {user_input}")
+                print(f"   Expected: {expected_output}")
+                for m, name in enumerate(models):
+                    print(f"   {name}: {generated[m * samples]}")
+                print()
+
+            if stop is not None:
+                stopped = stop(table)
+                if stopped:
+                    print(f"Arrêt anticipé ({stopped}) : {int(table.completed_rows().sum())}/{len(test_data)} lignes évaluées")
+                    break
+
+    writer.close()
+    print(f"Résultats enregistrés : {output_path}")
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache : {stats['hits']} réponses réutilisées, {stats['misses']} générées ({stats['entries']} entrées)")
+        cache.close()
+
+    # Moyennes par modèle (sur toutes les lignes, reprises et nouvelles, et tous les échantillons)
+    summary = table.summary()
+    for name, scores in summary.items():
+        print(f"{name} : " + " | ".join(f"{metric} {value:.4f}" for metric, value in scores.items()))
+
+    # Enregistrer les scores dans le registre (sélection avec --best bleu, par exemple)
+    registry = ModelRegistry()
+    for name, scores in summary.items():
+        try:
+            registry.set_metrics(name, scores)
+        except ValueError:
+            pass  # modèle absent du registre (modèle de base, ou passé explicitement)
+
+    # Table en colonnes et rapport (graphiques PNG/HTML, intervalles de confiance) sans affichage
+    results_path = table_path(output_path)
+    table.save(results_path, test_file=test_file, temperature=options.temperature,
+               rows=rows if subset is not None or options.adaptive else None, stopped=stopped)
+    print(f"Table des scores enregistrée : {results_path}")
+
+    name = os.path.splitext(os.path.basename(output_path))[0] + "_report"
+    with telemetry.span("evaluate.report"):
+        intervals = write_report(table, os.path.dirname(output_path) or ".", name, reference, options.num_resamples)
+    print_differences(intervals, reference)
+    return table
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Évaluation d'un modèle Mistral fine-tuné.")
     parser.add_argument("test_file", type=str, help="Fichier JSONL du test")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Nombre maximal de requêtes simultanées")
+    parser.add_argument("--rate_limit", type=float, default=DEFAULT_RATE_LIMIT, help="Nombre maximal de requêtes par seconde (0 = illimité)")
+    parser.add_argument("--cache", type=str, default=DEFAULT_CACHE_PATH, help="Fichier SQLite du cache de complétions")
+    parser.add_argument("--no_cache", action="store_true", help="Désactiver le cache de complétions")
+    parser.add_argument("--output", type=str, help="Fichier JSONL des résultats (par défaut dans data/results)")
+    parser.add_argument("--resume", action="store_true", help="Reprendre une évaluation interrompue sans réévaluer les lignes déjà écrites")
+    parser.add_argument("--model", type=str, help="Modèle fine-tuné à évaluer (par défaut : dernier modèle du registre)")
+    parser.add_argument("--tag", type=str, help="Évaluer le modèle du registre portant ce tag")
+    parser.add_argument("--best", type=str, help="Évaluer le meilleur modèle du registre selon cette métrique (ex. : valid_loss)")
+    parser.add_argument("--models", type=str, nargs="+", help="Liste des modèles à comparer (remplace le couple fine-tuné/base)")
+    parser.add_argument("--samples", type=int, default=1, help="Nombre de réponses générées par prompt et par modèle")
+    parser.add_argument("--temperature", type=float, help="Température d'échantillonnage (par défaut : celle de l'API)")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES, help="Nombre de rééchantillonnages bootstrap du rapport")
+    parser.add_argument("--subset", type=int, help="N'évaluer que ce nombre de lignes tirées au hasard")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du tirage des lignes (--subset, --adaptive)")
+    parser.add_argument("--adaptive", action="store_true", help="Évaluer par lots un échantillon stratifié, jusqu'à ce que l'écart au modèle de base soit tranché")
+    parser.add_argument("--stratify", type=str, default="length", help="Strates du mode adaptatif : length (longueur des questions) ou un champ (ex. : topic)")
+    parser.add_argument("--batch_rows", type=int, default=DEFAULT_BATCH_ROWS, help="Lignes évaluées entre deux tests d'arrêt")
+    parser.add_argument("--metric", type=str, default=DEFAULT_METRIC, help="Métrique du test d'arrêt")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Largeur d'intervalle à partir de laquelle l'écart est jugé négligeable")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="Niveau de confiance du test d'arrêt")
+    add_arguments(parser)
     args = parser.parse_args()
 
     api_key = getpass.getpass("Entrez votre clé API Mistral : ")
-    evaluate_model(api_key, args.test_file)
+    with session(args):
+        evaluate_model(api_key, args.test_file, EvalOptions.from_args(args), output_path=args.output, resume=args.resume,
+                       model=args.model, tag=args.tag, best=args.best, models=args.models)
@@ -0,0 +1,39 @@
+# Découpage d'un fichier JSONL en plages d'octets alignées sur les lignes (traitements parallèles)
+
+import os
+
+# Taille minimale d'une plage : en dessous, le coût de lancement d'un processus domine
+MIN_CHUNK_BYTES = 1 << 20
+
+
+def byte_ranges(path, num_chunks, min_chunk_bytes=MIN_CHUNK_BYTES):
+    """Découpe un fichier en au plus num_chunks plages (début, fin) commençant chacune en début de ligne."""
+    size = os.path.getsize(path)
+    num_chunks = max(1, min(num_chunks, size // min_chunk_bytes))
+    boundaries = [0]
+
+    with open(path, "rb") as f:
+        for i in range(1, num_chunks):
+            f.seek(max(size * i // num_chunks, boundaries[-1]))
+            f.readline()  # avancer jusqu'au début de la ligne suivante
+            position = f.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def iter_range_lines(path, start, end):
+    """Parcourt les lignes (en octets) d'une plage, avec la position de chacune dans le fichier."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            yield position, line
+            position += len(line)
@@ -0,0 +1,10 @@
+# Hyperparamètres de fine-tuning par défaut, partagés par train.py, sweep.py et profile_dataset.py
+# (module sans dépendance : le profilage local n'importe ni wandb ni le SDK Mistral)
+
+# Définir les hyperparamètres par défaut
+DEFAULT_HYPERPARAMS = {
+    "training_steps": 10,
+    "learning_rate": 0.0001,
+    "weight_decay": 0.1,
+    "warmup_fraction": 0.05,
+}
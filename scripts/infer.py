@@ -1,37 +1,197 @@
 from mistral import Mistral
+import os
+import sys
+import csv
+import json
+import time
+import argparse
 import getpass
+from inference_engine import InferenceEngine, DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT
+from completion_cache import CompletionCache, DEFAULT_CACHE_PATH
+from model_registry import resolve_model
+from telemetry import add_arguments, session, telemetry
 
-def infer(api_key, prompt):
-    """Crée et lance une inférence en utilisant l'API Mistral."""
+# Dossier des réponses générées en mode batch
+RESULTS_DIR = "data/results"
 
-    # Initialiser le client Mistral
-    client = Mistral(api_key=api_key)
-    
-    # Lister les jobs (finetuning)
-    jobs = client.fine_tuning.jobs.list()
+def make_client(api_key, server_url=None):
+    """Client Mistral, éventuellement pointé vers un autre serveur (ex. : serveur factice de mistral_stub.py)."""
+    if server_url:
+        return Mistral(api_key=api_key, server_url=server_url)
+    return Mistral(api_key=api_key)
 
-    # Dernier modèle fine-tuné
-    job_id = jobs.data[0].id
+def infer(api_key, prompt, cache_path=DEFAULT_CACHE_PATH, model=None, stream=False, server_url=None, client=None,
+          tag=None, best=None):
+    """Crée et lance une inférence en utilisant l'API Mistral (réponses mises en cache dans cache_path).
 
-    # Choisir le job correspondant au modèle souhaité
-    retrieved_jobs = client.fine_tuning.jobs.get(job_id=job_id)
+    Sans model, le modèle est choisi dans le registre local (le plus récent, ou selon tag/best).
+    Avec stream=True, la réponse est affichée au fur et à mesure de sa génération.
+    """
 
-    # Charger le modèle fine-tuné
-    fine_tuned_model = retrieved_jobs.fine_tuned_model
+    # Initialiser le client Mistral
+    client = client or make_client(api_key, server_url)
+    fine_tuned_model = model or resolve_model(client, tag=tag, metric=best)
 
-    # Tester le modèle avec le prompt de l'utilisateur
-    chat_response = client.chat.complete(
-        model=fine_tuned_model,
-        messages=[{"role": 'user', "content": prompt}]
-    )
+    # Tester le modèle avec le prompt de l'utilisateur (sans appel si la réponse est en cache)
+    cache = CompletionCache(cache_path) if cache_path else None
+    engine = InferenceEngine(client, max_concurrency=1, cache=cache)
+    messages = [{"role": 'user', "content": prompt}]
+    if stream:
+        print("Réponse du modèle: ", end="", flush=True)
+        answer = ""
+        for piece in engine.stream(model=fine_tuned_model, messages=messages):
+            print(piece, end="", flush=True)
+            answer += piece
+        print()
+    else:
+        answer = engine.complete(model=fine_tuned_model, messages=messages)
+    if cache is not None:
+        cache.close()
 
     # Afficher la réponse
-    print("Réponse du modèle:", chat_response.choices[0].message.content)
+    if not stream:
+        print("Réponse du modèle:", answer)
+    return answer
+
+def read_prompts(source, field="prompt", file_format=None):
+    """Lit les prompts d'un fichier JSONL/CSV (ou de l'entrée standard avec "-") et produit (id, messages).
+
+    Une ligne JSONL peut être une chaîne, un objet contenant le champ field, ou un
+    exemple au format chat ({"messages": [...]}, les réponses finales de l'assistant
+    sont alors retirées). Un CSV doit contenir la colonne field.
+    """
+    file_format = file_format or ("csv" if source.lower().endswith(".csv") else "jsonl")
+    f = sys.stdin if source == "-" else open(source, "r", encoding="utf-8", newline="")
+    try:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            if field not in (reader.fieldnames or []):
+                raise ValueError(f"Le CSV doit contenir une colonne '{field}'.")
+            for index, row in enumerate(reader):
+                yield row.get("id") or index, [{"role": "user", "content": row[field]}]
+            return
+
+        for index, line in enumerate(line for line in f if line.strip()):
+            row = json.loads(line)
+            if isinstance(row, str):
+                yield index, [{"role": "user", "content": row}]
+            elif "messages" in row:
+                messages = list(row["messages"])
+                while messages and messages[-1]["role"] == "assistant":
+                    messages.pop()
+                yield row.get("id", index), messages
+            elif field in row:
+                yield row.get("id", index), [{"role": "user", "content": row[field]}]
+            else:
+                raise ValueError(f"Ligne {index + 1} : champ '{field}' ou 'messages' manquant.")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def default_output_path(source):
+    """Chemin par défaut du fichier de réponses associé à un fichier de prompts."""
+    base_filename = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(RESULTS_DIR, f"{base_filename}_answers.jsonl")
+
+def infer_batch(api_key, source, output_path=None, model=None, field="prompt", file_format=None,
+                concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT, cache_path=DEFAULT_CACHE_PATH,
+                server_url=None, client=None, tag=None, best=None, **params):
+    """Génère les réponses d'un fichier de prompts en parallèle.
+
+    Chaque réponse est écrite en JSONL dès qu'elle est prête (dans l'ordre d'arrivée,
+    le champ "index" donne la position du prompt). Une requête en échec est écrite
+    avec un champ "error" sans interrompre les autres. Retourne un résumé
+    (nombre de réponses, d'erreurs, débit et percentiles de latence).
+    """
+    client = client or make_client(api_key, server_url)
+    model = model or resolve_model(client, tag=tag, metric=best)
+
+    cache = CompletionCache(cache_path) if cache_path else None
+    engine = InferenceEngine(client, max_concurrency=concurrency, rate_limit=rate_limit, cache=cache)
+
+    # Seuls les prompts en cours de traitement sont gardés en mémoire
+    in_flight = {}
+    def requests():
+        for index, (row_id, messages) in enumerate(read_prompts(source, field, file_format)):
+            in_flight[index] = (row_id, messages)
+            yield {"model": model, "messages": messages, **params}
+
+    output_path = output_path or ("-" if source == "-" else default_output_path(source))
+    if output_path != "-" and os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    log = sys.stderr if out is sys.stdout else sys.stdout
+
+    count, errors = 0, 0
+    start = time.perf_counter()
+    try:
+        with telemetry.profile("infer_batch"):
+            for index, output in engine.imap(requests(), ordered=False, return_exceptions=True):
+                row_id, messages = in_flight.pop(index)
+                record = {"index": index, "id": row_id, "prompt": messages[-1]["content"] if messages else ""}
+                if isinstance(output, Exception):
+                    record["error"] = str(output)
+                    errors += 1
+                else:
+                    record["answer"] = output
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if cache is not None:
+            cache.close()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "model": model,
+        "prompts": count,
+        "errors": errors,
+        "api_requests": engine.requests,
+        "retries": engine.retries,
+        "seconds": elapsed,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "latency": engine.latency_percentiles(),
+    }
+    latency = " | ".join(f"{q} {value * 1000:.0f} ms" for q, value in summary["latency"].items())
+    print(f"{count} réponses ({errors} erreurs) en {elapsed:.2f}s, soit {summary['throughput']:.1f} prompts/s", file=log)
+    print(f"Latence par requête : {latency or 'aucune requête envoyée (cache)'}", file=log)
+    if out is not sys.stdout:
+        print(f"Réponses enregistrées : {output_path}", file=log)
+    return summary
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inférence avec le dernier modèle Mistral fine-tuné.")
+    parser.add_argument("--input", type=str, help="Prompt à envoyer au modèle (demandé interactivement si absent)")
+    parser.add_argument("--batch", type=str, help="Fichier de prompts JSONL ou CSV (\"-\" pour l'entrée standard)")
+    parser.add_argument("--output", type=str, help="Fichier JSONL des réponses en mode batch (\"-\" pour la sortie standard)")
+    parser.add_argument("--field", type=str, default="prompt", help="Champ ou colonne contenant le prompt")
+    parser.add_argument("--format", type=str, choices=["jsonl", "csv"], help="Format du fichier de prompts (déduit de l'extension par défaut)")
+    parser.add_argument("--model", type=str, help="Modèle à utiliser (par défaut : dernier modèle fine-tuné du registre)")
+    parser.add_argument("--tag", type=str, help="Utiliser le modèle du registre portant ce tag")
+    parser.add_argument("--best", type=str, help="Utiliser le meilleur modèle du registre selon cette métrique (ex. : valid_loss)")
+    parser.add_argument("--stream", action="store_true", help="Afficher la réponse au fur et à mesure (mode interactif)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Nombre maximal de requêtes simultanées")
+    parser.add_argument("--rate_limit", type=float, default=DEFAULT_RATE_LIMIT, help="Requêtes par seconde (0 = illimité)")
+    parser.add_argument("--server_url", type=str, help="URL d'un autre serveur compatible (ex. : serveur factice local)")
+    parser.add_argument("--cache", type=str, default=DEFAULT_CACHE_PATH, help="Fichier SQLite du cache de complétions")
+    parser.add_argument("--no_cache", action="store_true", help="Désactiver le cache de complétions")
+    add_arguments(parser)
+    args = parser.parse_args()
+
     # Demander la clé API et la question à l'utilisateur
     api_key = getpass.getpass("Entrez votre clé API Mistral : ")
-    prompt = input("Entrez votre prompt : ")
+    cache_path = None if args.no_cache else args.cache
+
+    with session(args):
+        if args.batch:
+            infer_batch(api_key, args.batch, output_path=args.output, model=args.model, field=args.field,
+                        file_format=args.format, concurrency=args.concurrency, rate_limit=args.rate_limit,
+                        cache_path=cache_path, server_url=args.server_url, tag=args.tag, best=args.best)
+        else:
+            prompt = args.input or input("Entrez votre prompt : ")
 
-    # Lancer l'inférence
-    infer(api_key, prompt)
+            # Lancer l'inférence
+            infer(api_key, prompt, cache_path=cache_path, model=args.model, stream=args.stream, server_url=args.server_url,
+                  tag=args.tag, best=args.best)
@@ -0,0 +1,260 @@
+# Moteur d'inférence concurrent pour l'API Mistral (limitation de débit et retries)
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from telemetry import telemetry
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS = {408, 425, 429}
+
+# Paramètres par défaut du moteur
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE_LIMIT = 5.0  # requêtes par seconde
+DEFAULT_MAX_RETRIES = 6
+
+
+def get_status_code(error):
+    """Extrait le code HTTP d'une exception levée par le client (None si absent)."""
+    code = getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code
+
+    response = getattr(error, "raw_response", None) or getattr(error, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    """Indique si une erreur est transitoire : 408, 425, 429, 5xx ou erreur réseau."""
+    code = get_status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS or code >= 500
+
+    # Erreurs réseau (socket, timeout, ou erreurs de transport httpx utilisées par le SDK)
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return type(error).__module__.startswith("httpx")
+
+
+def retry_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    """Calcule l'attente avant une nouvelle tentative (Retry-After ou backoff exponentiel avec jitter)."""
+    response = getattr(error, "raw_response", None) or getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after is not None:
+        try:
+            return min(max_delay, float(retry_after))
+        except ValueError:
+            pass
+
+    # Backoff exponentiel avec "full jitter" pour désynchroniser les workers
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def percentiles(values, qs=(50, 90, 99)):
+    """Percentiles (rang le plus proche) d'une liste de valeurs, sous forme {"p50": ...}."""
+    values = sorted(values)
+    if not values:
+        return {}
+    return {f"p{q}": values[min(len(values) - 1, max(0, -(-q * len(values) // 100) - 1))] for q in qs}
+
+
+class TokenBucket:
+    """Limiteur de débit à seau de jetons, partagé entre les threads.
+
+    Le débit s'adapte : il est divisé par deux à chaque 429 puis remonte
+    progressivement (AIMD) jusqu'au débit configuré.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.1, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        self.capacity = capacity or max(1.0, rate or 1.0)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloque jusqu'à ce qu'un jeton soit disponible."""
+        if not self.rate:
+            return
+
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            self._sleep(wait_time)
+
+    def slow_down(self):
+        """Réduit le débit de moitié (réponse 429)."""
+        if not self.max_rate:
+            return
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        """Augmente légèrement le débit après un succès, sans dépasser le maximum."""
+        if not self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class InferenceEngine:
+    """Envoie des requêtes chat.complete en parallèle avec un plafond de concurrence.
+
+    Les requêtes sont des dictionnaires d'arguments pour client.chat.complete
+    ({"model": ..., "messages": ..., "temperature": ...}). Si un cache de
+    complétions est fourni, les réponses déjà générées ne sont pas redemandées.
+    """
+
+    def __init__(self, client, max_concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=1.0, max_delay=60.0, cache=None, sleep=time.sleep):
+        self.client = client
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate_limit, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.latencies = []  # durée de chaque requête envoyée à l'API, retries compris (secondes)
+
+    def _call(self, method, model, messages, params):
+        """Appelle client.chat.<method> avec limitation de débit et retries sur les erreurs transitoires."""
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = getattr(self.client.chat, method)(model=model, messages=messages, **params)
+            except Exception as e:
+                telemetry.increment("api_errors_total", method=method, status=get_status_code(e) or "network")
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                if get_status_code(e) == 429:
+                    self.bucket.slow_down()
+                with self._lock:
+                    self.retries += 1
+                telemetry.increment("api_retries_total", method=method)
+                self._sleep(retry_delay(e, attempt, self.base_delay, self.max_delay))
+                continue
+
+            self.bucket.speed_up()
+            with self._lock:
+                self.requests += 1
+            return response, start
+
+    def _record_latency(self, start, model, method, tokens=None):
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(latency)
+        telemetry.observe("api_latency_seconds", latency, model=model, method=method)
+        if tokens and latency > 0:
+            telemetry.observe("api_tokens_per_second", tokens / latency, model=model)
+
+    def complete(self, model, messages, **params):
+        """Envoie une requête (avec limitation de débit et retries) et retourne le texte généré."""
+        if self.cache is not None:
+            cached = self.cache.get(model, messages, params)
+            telemetry.increment("cache_hits_total" if cached is not None else "cache_misses_total")
+            if cached is not None:
+                return cached
+
+        response, start = self._call("complete", model, messages, params)
+        usage = getattr(response, "usage", None)
+        self._record_latency(start, model, "complete", getattr(usage, "completion_tokens", None))
+
+        content = response.choices[0].message.content
+        if self.cache is not None:
+            self.cache.put(model, messages, params, content)
+        return content
+
+    def stream(self, model, messages, **params):
+        """Comme complete, mais produit le texte morceau par morceau (client.chat.stream).
+
+        Les retries ne couvrent que l'ouverture du flux ; une réponse en cache est produite d'un bloc.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(model, messages, params)
+            telemetry.increment("cache_hits_total" if cached is not None else "cache_misses_total")
+            if cached is not None:
+                yield cached
+                return
+
+        response, start = self._call("stream", model, messages, params)
+        pieces = []
+        for event in response:
+            delta = event.data.choices[0].delta.content
+            if delta:
+                pieces.append(delta)
+                yield delta
+        self._record_latency(start, model, "stream")
+
+        if self.cache is not None:
+            self.cache.put(model, messages, params, "".join(pieces))
+
+    def latency_percentiles(self, qs=(50, 90, 99)):
+        """Percentiles des latences des requêtes envoyées à l'API (secondes)."""
+        with self._lock:
+            return percentiles(self.latencies, qs)
+
+    def imap(self, requests, ordered=True, return_exceptions=False):
+        """Exécute les requêtes en parallèle et produit des couples (index, réponse).
+
+        Au plus quelques requêtes par worker sont en attente à la fois, ce qui permet
+        de consommer un itérable de requêtes arbitrairement long. Avec ordered=True,
+        les réponses sont produites dans l'ordre des requêtes. Avec return_exceptions=True,
+        une requête en échec produit son exception au lieu d'interrompre les autres.
+        """
+        def result(future):
+            if return_exceptions and future.exception() is not None:
+                return future.exception()
+            return future.result()
+
+        window = self.max_concurrency * 2
+        requests = iter(enumerate(requests))
+        pending = deque()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            while True:
+                # Remplir la fenêtre de requêtes en cours
+                while len(pending) < window:
+                    item = next(requests, None)
+                    if item is None:
+                        break
+                    index, request = item
+                    pending.append((index, executor.submit(lambda r=request: self.complete(**r))))
+
+                if not pending:
+                    break
+
+                if ordered:
+                    index, future = pending.popleft()
+                    yield index, result(future)
+                else:
+                    done, _ = wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+                    for entry in [e for e in pending if e[1] in done]:
+                        pending.remove(entry)
+                        yield entry[0], result(entry[1])
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, requests):
+        """Exécute toutes les requêtes et retourne les réponses dans l'ordre d'entrée."""
+        return [output for _, output in self.imap(requests)]
@@ -0,0 +1,284 @@
+# Suivi des jobs de fine-tuning : interrogation adaptative de l'API et log des checkpoints
+
+import time
+import heapq
+import argparse
+import getpass
+import itertools
+import wandb
+from mistral import Mistral
+from inference_engine import is_retryable, retry_delay
+from telemetry import add_arguments, session, telemetry
+
+# Statuts après lesquels un job n'évolue plus
+TERMINAL_STATUSES = {"FAILED_VALIDATION", "FAILED", "STOPPED", "SUCCESS", "CANCELLED"}
+
+# Intervalles d'interrogation (en secondes) : court après une activité, allongé en l'absence de changement
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 60.0
+BACKOFF_FACTOR = 2.0
+
+# Quand un checkpoint est en retard, on interroge au plus tous les quarts de période
+OVERDUE_FRACTION = 0.25
+
+# Poids d'une nouvelle mesure dans la moyenne de la durée entre deux checkpoints
+PERIOD_SMOOTHING = 0.5
+
+# Nombre d'échecs consécutifs tolérés lors de l'interrogation d'un job
+DEFAULT_MAX_RETRIES = 6
+
+WANDB_PROJECT = "mistral-finetuning"
+
+
+class _JobState:
+    """État du suivi d'un job."""
+
+    def __init__(self, job_id, min_interval):
+        self.job_id = job_id
+        self.status = None
+        self.last_step = 0
+        self.interval = min_interval
+        self.last_checkpoint_at = None
+        self.period = None
+        self.failures = 0
+        self.polls = 0
+
+
+class JobMonitor:
+    """Suit un ou plusieurs jobs de fine-tuning depuis un seul processus.
+
+    Chaque job a sa prochaine échéance d'interrogation dans un tas. L'intervalle
+    double tant que rien ne change, revient au minimum après une activité, et se
+    cale sur l'arrivée attendue du prochain checkpoint (durée moyenne observée
+    entre deux checkpoints). Tous les nouveaux checkpoints sont transmis, par ordre
+    d'étape, à on_checkpoints(job_id, checkpoints).
+    """
+
+    def __init__(self, client, on_checkpoints=None, on_status=None, on_finish=None,
+                 min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, backoff=BACKOFF_FACTOR,
+                 max_retries=DEFAULT_MAX_RETRIES, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.on_checkpoints = on_checkpoints
+        self.on_status = on_status
+        self.on_finish = on_finish
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+
+        self._states = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self.polls = 0
+
+    def watch(self, job_id):
+        """Ajoute un job au suivi (première interrogation immédiate)."""
+        if job_id not in self._states:
+            self._states[job_id] = _JobState(job_id, self.min_interval)
+            self._schedule(job_id, self.clock())
+
+    def unwatch(self, job_id):
+        """Retire un job du suivi (par exemple après son annulation)."""
+        self._states.pop(job_id, None)
+
+    def _schedule(self, job_id, due):
+        heapq.heappush(self._queue, (due, next(self._counter), job_id))
+
+    def _next_interval(self, state, now, active):
+        """Délai avant la prochaine interrogation d'un job."""
+        if active:
+            state.interval = self.min_interval
+        else:
+            state.interval = min(state.interval * self.backoff, self.max_interval)
+
+        if not state.period:
+            return state.interval
+
+        # Dormir jusqu'au checkpoint attendu, puis interroger plus souvent s'il est en retard
+        expected_in = state.last_checkpoint_at + state.period - now
+        if expected_in > self.min_interval:
+            return min(expected_in, self.max_interval)
+        return min(state.interval, max(self.min_interval, state.period * OVERDUE_FRACTION))
+
+    def _new_checkpoints(self, state, job, now):
+        """Checkpoints postérieurs au dernier traité, triés par étape ; met à jour la période estimée."""
+        checkpoints = sorted(
+            (c for c in (job.checkpoints or []) if c.step_number > state.last_step),
+            key=lambda c: c.step_number,
+        )
+        if checkpoints:
+            if state.last_checkpoint_at is not None:
+                sample = (now - state.last_checkpoint_at) / len(checkpoints)
+                state.period = sample if state.period is None else (
+                    PERIOD_SMOOTHING * sample + (1 - PERIOD_SMOOTHING) * state.period
+                )
+            state.last_checkpoint_at = now
+            state.last_step = checkpoints[-1].step_number
+        return checkpoints
+
+    def poll(self, job_id):
+        """Interroge un job, traite ses nouveaux checkpoints et retourne (job, délai avant la prochaine interrogation)."""
+        state = self._states[job_id]
+        try:
+            with telemetry.span("api.jobs.get"):
+                job = self.client.fine_tuning.jobs.get(job_id=job_id)
+        except Exception as error:
+            state.failures += 1
+            if not is_retryable(error) or state.failures > self.max_retries:
+                raise
+            telemetry.increment("api_retries_total", method="jobs.get")
+            return None, retry_delay(error, state.failures - 1)
+
+        state.failures = 0
+        state.polls += 1
+        self.polls += 1
+        now = self.clock()
+
+        active = job.status != state.status
+        if active:
+            # Début de l'entraînement : référence pour estimer la durée du premier checkpoint
+            if job.status == "RUNNING" and state.status is not None:
+                state.last_checkpoint_at = now
+            state.status = job.status
+            if self.on_status:
+                self.on_status(job_id, job)
+
+        checkpoints = self._new_checkpoints(state, job, now)
+        if checkpoints:
+            active = True
+            if self.on_checkpoints:
+                self.on_checkpoints(job_id, checkpoints)
+
+        return job, self._next_interval(state, now, active)
+
+    def run(self):
+        """Suit les jobs jusqu'à ce qu'ils soient tous terminés et retourne leur dernier état (par ID)."""
+        results = {}
+        while self._queue:
+            due, _, job_id = heapq.heappop(self._queue)
+            if job_id not in self._states:
+                continue
+
+            delay = due - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+
+            job, interval = self.poll(job_id)
+            if job is not None and job.status in TERMINAL_STATUSES:
+                results[job_id] = job
+                self.unwatch(job_id)
+                if self.on_finish:
+                    self.on_finish(job_id, job)
+            elif job_id in self._states:
+                self._schedule(job_id, self.clock() + interval)
+        return results
+
+
+def checkpoint_row(checkpoint, prefix=""):
+    """Ligne de métriques W&B d'un checkpoint."""
+    return {
+        f"{prefix}step": checkpoint.step_number,
+        f"{prefix}training_loss": checkpoint.metrics.train_loss,
+        f"{prefix}validation_loss": checkpoint.metrics.valid_loss,
+        f"{prefix}validation_accuracy": checkpoint.metrics.valid_mean_token_accuracy,
+    }
+
+
+class MetricsLogger:
+    """Accumule les métriques des checkpoints et les envoie à W&B.
+
+    Avec plusieurs jobs dans le même run, les clés sont préfixées par l'ID du job, et
+    les lignes de tous les jobs à une même étape sont fusionnées en un seul appel à
+    log (W&B enregistre une étape d'historique par appel : des étapes différentes ne
+    peuvent pas être regroupées).
+    """
+
+    def __init__(self, log=None, flush_every=50, flush_interval=30.0, prefix_jobs=False, clock=time.monotonic):
+        self.log = log or wandb.log
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.prefix_jobs = prefix_jobs
+        self.clock = clock
+        self._buffer = []
+        self._last_flush = clock()
+
+    def __call__(self, job_id, checkpoints):
+        prefix = f"{job_id}/" if self.prefix_jobs else ""
+        self._buffer.extend((checkpoint.step_number, checkpoint_row(checkpoint, prefix)) for checkpoint in checkpoints)
+        if len(self._buffer) >= self.flush_every or self.clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Envoie les lignes en attente : un appel à log par étape, dans l'ordre des étapes."""
+        merged = {}
+        for step, row in self._buffer:
+            merged.setdefault(step, {}).update(row)
+        self._buffer = []
+        for step in sorted(merged):
+            self.log(merged[step])
+        self._last_flush = self.clock()
+
+
+def print_checkpoints(job_id, checkpoints):
+    """Affiche les métriques de chaque nouveau checkpoint."""
+    for checkpoint in checkpoints:
+        metrics = checkpoint.metrics
+        print(f"[{job_id}] Step {checkpoint.step_number} | Train Loss: {metrics.train_loss:.4f} | "
+              f"Val Loss: {metrics.valid_loss:.4f} | Val Acc: {metrics.valid_mean_token_accuracy:.4f}")
+
+
+def monitor_jobs(client, job_ids, logger=None, **monitor_kwargs):
+    """Suit des jobs jusqu'à leur fin en affichant et loggant chaque checkpoint ; retourne leur dernier état."""
+
+    def on_checkpoints(job_id, checkpoints):
+        print_checkpoints(job_id, checkpoints)
+        if logger:
+            logger(job_id, checkpoints)
+
+    def on_status(job_id, job):
+        print(f"[{job_id}] Statut : {job.status}")
+
+    def on_finish(job_id, job):
+        # Les métriques d'un job terminé sont envoyées sans attendre le lot suivant
+        if logger:
+            logger.flush()
+
+    monitor = JobMonitor(client, on_checkpoints=on_checkpoints, on_status=on_status, on_finish=on_finish, **monitor_kwargs)
+    for job_id in job_ids:
+        monitor.watch(job_id)
+    try:
+        results = monitor.run()
+    finally:
+        # Ne pas perdre les métriques en attente si le suivi est interrompu (Ctrl+C, erreur d'API)
+        if logger:
+            logger.flush()
+    print(f"Suivi terminé ({monitor.polls} interrogations de l'API).")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suivre un ou plusieurs jobs de fine-tuning Mistral avec log WandB.")
+    parser.add_argument("job_ids", type=str, nargs="+", help="IDs des jobs à suivre")
+    parser.add_argument("--min_interval", type=float, default=MIN_POLL_INTERVAL, help="Intervalle minimal entre deux interrogations (s)")
+    parser.add_argument("--max_interval", type=float, default=MAX_POLL_INTERVAL, help="Intervalle maximal entre deux interrogations (s)")
+    parser.add_argument("--no_wandb", action="store_true", help="Ne pas envoyer les métriques à WandB")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    api_key = getpass.getpass("Entrez votre clé API Mistral : ")
+    client = Mistral(api_key=api_key)
+
+    logger = None
+    if not args.no_wandb:
+        wandb.login(key=getpass.getpass("Entrez votre clé API WandB : "))
+        wandb.init(project=WANDB_PROJECT, name="Monitor")
+        logger = MetricsLogger(prefix_jobs=len(args.job_ids) > 1)
+
+    with session(args):
+        monitor_jobs(client, args.job_ids, logger=logger, min_interval=args.min_interval, max_interval=args.max_interval)
+
+        if logger:
+            telemetry.log_to_wandb()
+            wandb.finish()
@@ -1,55 +1,104 @@
 # ATTENTION : Ce script suppose que les données sont organisées en "question" et "answer"
 
 import os
+import re
 import json
 import argparse
+from chat_format import write_examples
+from telemetry import add_arguments, session, telemetry
 
 # Définir les dossiers d'entrée et de sortie
 INPUT_DIR = "data/raw"
 OUTPUT_DIR = "data/converted"
 
+# Taille des blocs lus dans le fichier JSON
+READ_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
 # Vérifier et créer le dossier de sortie s'il n'existe pas
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def convert_json_to_jsonl(input_filename):
-    """Convertit un fichier JSON en JSONL et le sauvegarde dans le dossier de sortie."""
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """Parcourt les éléments d'un tableau JSON au fil de la lecture, sans charger tout le fichier."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def next_char():
+        # Sauter les blancs (en lisant la suite du fichier si besoin) et retourner le caractère suivant
+        nonlocal buffer, pos, eof
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            buffer, pos = f.read(chunk_size), 0
+            eof = not buffer
+
+    if next_char() != "[":
+        raise ValueError("Le fichier JSON doit contenir une liste d'exemples.")
+    pos += 1
+    if next_char() == "]":
+        return
+
+    while True:
+        next_char()
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # Un élément qui touche la fin du tampon peut être tronqué (nombre coupé)
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+
+        if not complete:
+            more = f.read(chunk_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+
+        yield item
+        pos = end
+
+        separator = next_char()
+        if separator == "]":
+            return
+        if separator != ",":
+            raise json.JSONDecodeError("',' ou ']' attendu", buffer, pos)
+        pos += 1
+
+def convert_json_to_jsonl(input_filename, input_dir=INPUT_DIR, output_dir=OUTPUT_DIR):
+    """Convertit un fichier JSON en JSONL et le sauvegarde dans le dossier de sortie.
+
+    Le fichier est lu et écrit au fil de l'eau : la mémoire utilisée ne dépend pas de sa taille.
+    """
     
-    input_path = os.path.join(INPUT_DIR, input_filename)
+    input_path = os.path.join(input_dir, input_filename)
     output_filename = os.path.splitext(input_filename)[0] + "_formatted.jsonl"
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
+    output_path = os.path.join(output_dir, output_filename)
 
     # Vérifier si le fichier existe
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Le fichier {input_path} n'existe pas.")
 
-    # Charger le fichier JSON
+    # Lire le fichier JSON élément par élément et écrire le JSONL par lots
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data_f = json.load(f)
-    except Exception as e:
+        with open(input_path, 'r', encoding='utf-8') as f, telemetry.span("convert.json"), telemetry.profile("convert_json"):
+            count = write_examples(
+                output_path,
+                ((entry["question"], entry["answer"]) for entry in iter_json_array(f)),
+            )
+    except (ValueError, KeyError, TypeError) as e:
         raise ValueError(f"Erreur lors de la lecture du fichier JSON : {e}")
 
-    # Convertir les données en JSONL
-    jsonl_data = [
-        {
-            "messages": [
-                {"role": "user", "content": entry["question"]},
-                {"role": "assistant", "content": entry["answer"]}
-            ]
-        }
-        for entry in data_f
-    ]
-
-    # Sauvegarder en JSONL
-    with open(output_path, 'w', encoding='utf-8') as jsonl_file:
-        for entry in jsonl_data:
-            jsonl_file.write(json.dumps(entry) + '\n')
-
-    print(f"Fichier JSONL généré : {output_path}")
+    print(f"Fichier JSONL généré : {output_path} ({count} exemples)")
+    return output_path
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convertir un fichier JSON en JSONL.")
     parser.add_argument("filename", type=str, help="Nom du fichier JSON à convertir (doit être dans data/raw)")
+    add_arguments(parser)
     args = parser.parse_args()
 
-    convert_json_to_jsonl(args.filename)
+    with session(args):
+        convert_json_to_jsonl(args.filename)
@@ -0,0 +1,178 @@
+# Index des lignes d'un fichier JSONL (positions en octets) pour un accès direct sans tout charger
+#
+# L'index est un fichier .npy à côté du JSONL (<fichier>.jsonl.idx) contenant la position
+# de début de chaque ligne non vide, suivie de la taille du fichier. Le JSONL et l'index
+# sont projetés en mémoire (mmap) : seules les lignes demandées sont lues et décodées.
+
+import os
+import json
+import mmap
+import argparse
+import numpy as np
+from telemetry import add_arguments, session, telemetry
+
+# Taille des blocs lus pour repérer les fins de ligne
+INDEX_BLOCK_SIZE = 1 << 24
+
+# Octets retirés par bytes.strip() : une ligne ne contenant que ces octets est ignorée,
+# comme dans le découpage et la validation
+WHITESPACE = np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8)
+
+
+def index_path(path):
+    """Chemin de l'index associé à un fichier JSONL."""
+    return path + ".idx"
+
+
+def offsets_dtype(size):
+    """Entiers 32 bits pour les fichiers de moins de 4 Go, 64 bits au-delà."""
+    return np.uint32 if size < 2**32 else np.uint64
+
+
+def save_offsets(path, offsets):
+    """Enregistre l'index d'un fichier JSONL (écriture atomique)."""
+    tmp_path = index_path(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=offsets_dtype(offsets[-1] if len(offsets) else 0)))
+    os.replace(tmp_path, index_path(path))
+
+
+def build_index(path, block_size=INDEX_BLOCK_SIZE):
+    """Construit et enregistre l'index d'un fichier JSONL ; retourne les positions (lignes + taille du fichier)."""
+    size = os.path.getsize(path)
+    newlines = []
+    with open(path, "rb") as f:
+        position = 0
+        for block in iter(lambda: f.read(block_size), b""):
+            newlines.append(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10) + position)
+            position += len(block)
+
+    ends = np.concatenate(newlines) + 1 if newlines else np.zeros(0, dtype=np.int64)
+    if size and (not len(ends) or ends[-1] != size):
+        ends = np.append(ends, size)  # dernière ligne sans retour à la ligne
+    starts = np.concatenate(([0], ends[:-1])).astype(np.int64) if len(ends) else ends
+
+    # Écarter les lignes vides ou ne contenant que des blancs (line.strip() vide, comme dans
+    # le découpage et la validation) ; ces blancs restent attachés à la ligne précédente.
+    # Seules les lignes commençant par un blanc peuvent être vides : elles sont vérifiées une à une.
+    keep = np.ones(len(starts), dtype=bool)
+    if size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first_bytes = np.frombuffer(data, dtype=np.uint8)[starts]
+            for i in np.flatnonzero(np.isin(first_bytes, WHITESPACE)):
+                keep[i] = bool(data[starts[i]:ends[i]].strip())
+
+    offsets = np.append(starts[keep], size)
+    save_offsets(path, offsets)
+    return offsets
+
+
+def is_fresh(path):
+    """Vrai si l'index existe et correspond au fichier (même taille, plus récent que le fichier)."""
+    idx = index_path(path)
+    if not os.path.exists(idx) or os.path.getmtime(idx) < os.path.getmtime(path):
+        return False
+    offsets = np.load(idx, mmap_mode="r")
+    return len(offsets) > 0 and int(offsets[-1]) == os.path.getsize(path)
+
+
+def load_offsets(path):
+    """Positions des lignes d'un fichier JSONL (index projeté en mémoire, reconstruit s'il est absent ou périmé)."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Le fichier {path} n'existe pas.")
+    if not is_fresh(path):
+        build_index(path)
+    return np.load(index_path(path), mmap_mode="r")
+
+
+class JsonlIndex:
+    """Accès direct aux lignes d'un fichier JSONL.
+
+    index[i] décode la ligne i, index[a:b] une tranche, index.raw(i) retourne les octets
+    bruts. sample et shard permettent d'extraire un sous-ensemble ou de répartir le
+    fichier entre plusieurs processus sans le charger : la mémoire utilisée est de
+    4 octets par ligne (8 au-delà de 4 Go).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = load_offsets(path)
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _position(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Ligne {i} hors du fichier ({len(self)} lignes)")
+        return i
+
+    def raw(self, i):
+        """Octets bruts de la ligne i (avec son retour à la ligne)."""
+        i = self._position(i)
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(range(*key.indices(len(self))))
+        # strip : les lignes blanches rattachées peuvent contenir \x0b ou \x0c, refusés par json.loads
+        return json.loads(self.raw(key).strip())
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices):
+        """Décode les lignes demandées, dans l'ordre donné."""
+        return [self[i] for i in indices]
+
+    def sample_indices(self, k, seed=0):
+        """Numéros de k lignes tirées sans remise (triés, pour une lecture séquentielle)."""
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(len(self), size=min(k, len(self)), replace=False))
+
+    def sample(self, k, seed=0):
+        """k lignes tirées au hasard, sans remise."""
+        return self.take(self.sample_indices(k, seed))
+
+    def shard(self, shard_id, num_shards):
+        """Lignes (range) de la part shard_id sur num_shards parts contiguës de tailles égales à une ligne près."""
+        if not 0 <= shard_id < num_shards:
+            raise ValueError(f"Part {shard_id} invalide pour {num_shards} parts")
+        return range(len(self) * shard_id // num_shards, len(self) * (shard_id + 1) // num_shards)
+
+    def byte_range(self, rows):
+        """Plage d'octets (début, fin) couvrant des lignes contiguës (ex. : une part de shard)."""
+        return int(self.offsets[rows.start]), int(self.offsets[rows.stop])
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construire l'index (positions des lignes) de fichiers JSONL.")
+    parser.add_argument("filenames", type=str, nargs="+", help="Fichiers JSONL à indexer")
+    parser.add_argument("--force", action="store_true", help="Reconstruire l'index même s'il est à jour")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with session(args), telemetry.profile("jsonl_index"):
+        for filename in args.filenames:
+            if args.force or not is_fresh(filename):
+                with telemetry.span("index.build"):
+                    offsets = build_index(filename)
+                print(f"Index créé : {index_path(filename)} ({len(offsets) - 1} lignes)")
+            else:
+                print(f"Index à jour : {index_path(filename)}")
@@ -0,0 +1,214 @@
+# Calcul des métriques d'évaluation (BLEU-1, ROUGE-1/2/L, F1) par lots
+
+import math
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+import nltk
+from nltk.stem import porter
+from nltk.translate.bleu_score import sentence_bleu
+from rouge_score import rouge_scorer
+from rouge_score import tokenize as rouge_tokenize
+from telemetry import telemetry
+
+# Télécharger les ressources nécessaires pour NLTK
+nltk.download("punkt")
+
+# Métriques calculées, dans l'ordre des colonnes retournées
+METRICS = ("bleu", "rouge1", "rouge2", "rougeL", "f1")
+
+# Colonnes de la matrice de comptages partagée par toutes les métriques
+(
+    BLEU_MATCH, HYP_LEN, REF_LEN,
+    F1_COMMON, F1_CAND, F1_REF,
+    R1_MATCH, R1_PRED, R1_TARGET,
+    R2_MATCH, R2_PRED, R2_TARGET,
+    LCS, LCS_PRED, LCS_TARGET,
+) = range(15)
+NUM_COUNTS = 15
+
+# Taille des lots envoyés aux processus de calcul
+DEFAULT_CHUNK_SIZE = 2048
+
+# Même stemmer que rouge_score (use_stemmer=True)
+_stemmer = porter.PorterStemmer()
+
+
+def calculate_metrics(reference, candidate):
+    """Calcule BLEU, ROUGE et F1-score entre une réponse attendue et une réponse générée.
+
+    Implémentation de référence ligne par ligne ; score_batch donne les mêmes valeurs beaucoup plus vite.
+    """
+
+    # BLEU score (1-gram)
+    bleu_score = sentence_bleu([nltk.word_tokenize(reference)], nltk.word_tokenize(candidate), weights=(1, 0, 0, 0))
+
+    # ROUGE scores
+    scorer = rouge_scorer.RougeScorer(["rouge1", "rouge2", "rougeL"], use_stemmer=True)
+    rouge_scores = scorer.score(reference, candidate)
+
+    # F1 score (approximation via la similarité des tokens)
+    ref_tokens = set(nltk.word_tokenize(reference))
+    cand_tokens = set(nltk.word_tokenize(candidate))
+
+    common_tokens = ref_tokens.intersection(cand_tokens)
+    precision = len(common_tokens) / len(cand_tokens) if cand_tokens else 0
+    recall = len(common_tokens) / len(ref_tokens) if ref_tokens else 0
+    f1 = (2 * precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+
+    return bleu_score, rouge_scores, f1
+
+
+@lru_cache(maxsize=1 << 18)
+def _stem(word):
+    """Racinise un mot (mémoïsé : le vocabulaire est bien plus petit que le corpus)."""
+    return _stemmer.stem(word)
+
+
+def _rouge_tokens(text):
+    """Reproduit la tokenisation de rouge_score avec use_stemmer=True."""
+    text = rouge_tokenize.NON_ALPHANUM_RE.sub(" ", text.lower())
+    tokens = [_stem(x) if len(x) > 3 else x for x in rouge_tokenize.SPACES_RE.split(text)]
+    return tuple(x for x in tokens if rouge_tokenize.VALID_TOKEN_RE.match(x))
+
+
+@lru_cache(maxsize=1 << 16)
+def text_features(text):
+    """Tokenise un texte une seule fois et prépare les comptages utilisés par toutes les métriques.
+
+    Les tokens NLTK servent au BLEU et au F1, les tokens ROUGE (racinisés) aux scores ROUGE.
+    Le cache évite de retokeniser la réponse attendue pour chaque modèle évalué.
+    """
+    with telemetry.span("metrics.word_tokenize"):
+        words = nltk.word_tokenize(text)
+    with telemetry.span("metrics.rouge_stemming"):
+        rouge = _rouge_tokens(text)
+    return {
+        "words": Counter(words),
+        "word_set": frozenset(words),
+        "num_words": len(words),
+        "rouge": rouge,
+        "unigrams": Counter(rouge),
+        "bigrams": Counter(zip(rouge, rouge[1:])),
+    }
+
+
+def lcs_length(a, b):
+    """Longueur de la plus longue sous-séquence commune (algorithme bit-parallèle).
+
+    Chaque position de a est un bit d'un entier : une itération par token de b
+    remplace une ligne entière de la table de programmation dynamique.
+    """
+    if not a or not b:
+        return 0
+
+    masks = {}
+    for i, token in enumerate(a):
+        masks[token] = masks.get(token, 0) | (1 << i)
+
+    full = (1 << len(a)) - 1
+    v = full
+    for token in b:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - bin(v).count("1")
+
+
+def count_features(references, candidates):
+    """Construit la matrice des comptages (lignes × NUM_COUNTS) d'où dérivent toutes les métriques."""
+    rows = []
+    for reference, candidate in zip(references, candidates):
+        ref = text_features(reference)
+        cand = text_features(candidate)
+        rows.append((
+            # BLEU-1 : unigrammes du candidat plafonnés par ceux de la référence
+            sum((cand["words"] & ref["words"]).values()),
+            cand["num_words"],
+            ref["num_words"],
+            # F1 sur les ensembles de tokens
+            len(cand["word_set"] & ref["word_set"]),
+            len(cand["word_set"]),
+            len(ref["word_set"]),
+            # ROUGE-1 et ROUGE-2 : intersection des multi-ensembles de n-grammes
+            sum((ref["unigrams"] & cand["unigrams"]).values()),
+            len(cand["rouge"]),
+            len(ref["rouge"]),
+            sum((ref["bigrams"] & cand["bigrams"]).values()),
+            max(len(cand["rouge"]) - 1, 0),
+            max(len(ref["rouge"]) - 1, 0),
+            # ROUGE-L
+            lcs_length(ref["rouge"], cand["rouge"]),
+            len(cand["rouge"]),
+            len(ref["rouge"]),
+        ))
+
+    return np.array(rows, dtype=np.int64).reshape(-1, NUM_COUNTS)
+
+
+def _fmeasure(matches, predicted, target):
+    """Précision, rappel puis F-mesure vectorisés, avec les mêmes opérations que rouge_score."""
+    precision = matches / np.maximum(predicted, 1)
+    recall = matches / np.maximum(target, 1)
+    total = precision + recall
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, 2 * precision * recall / total, 0.0)
+
+
+def metrics_from_counts(counts):
+    """Calcule les métriques à partir de la matrice des comptages."""
+    scores = {
+        "rouge1": _fmeasure(counts[:, R1_MATCH], counts[:, R1_PRED], counts[:, R1_TARGET]),
+        "rouge2": _fmeasure(counts[:, R2_MATCH], counts[:, R2_PRED], counts[:, R2_TARGET]),
+        "rougeL": _fmeasure(counts[:, LCS], counts[:, LCS_PRED], counts[:, LCS_TARGET]),
+    }
+
+    # F1 : mêmes conventions que calculate_metrics (0 pour un ensemble vide)
+    common = counts[:, F1_COMMON]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(counts[:, F1_CAND] > 0, common / counts[:, F1_CAND], 0.0)
+        recall = np.where(counts[:, F1_REF] > 0, common / counts[:, F1_REF], 0.0)
+        total = precision + recall
+        scores["f1"] = np.where(total > 0, (2 * precision * recall) / total, 0.0)
+
+    # BLEU-1 : les exponentielles passent par math pour reproduire exactement NLTK
+    bleu = np.zeros(len(counts))
+    for row, (matches, hyp_len, ref_len) in enumerate(counts[:, [BLEU_MATCH, HYP_LEN, REF_LEN]].tolist()):
+        if matches == 0:
+            continue
+        penalty = 1 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+        bleu[row] = penalty * math.exp(math.log(matches / hyp_len))
+    scores["bleu"] = bleu
+
+    return {metric: scores[metric] for metric in METRICS}
+
+
+def score_batch(references, candidates, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Calcule BLEU-1, ROUGE-1/2/L et F1 pour des listes de références et de réponses.
+
+    Retourne un dictionnaire {métrique: tableau NumPy}, avec les mêmes valeurs que
+    calculate_metrics appelé ligne par ligne. Avec workers > 1, les comptages sont
+    répartis sur un pool de processus par lots de chunk_size lignes.
+    """
+    references, candidates = list(references), list(candidates)
+    if len(references) != len(candidates):
+        raise ValueError("Les listes de références et de réponses doivent avoir la même taille.")
+    with telemetry.span("metrics.score_batch"):
+        return _score_batch(references, candidates, workers, chunk_size)
+
+
+def _score_batch(references, candidates, workers, chunk_size):
+
+    if workers > 1 and len(references) > chunk_size:
+        starts = range(0, len(references), chunk_size)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = executor.map(
+                count_features,
+                [references[s:s + chunk_size] for s in starts],
+                [candidates[s:s + chunk_size] for s in starts],
+            )
+            counts = np.concatenate(list(parts))
+    else:
+        counts = count_features(references, candidates)
+
+    return metrics_from_counts(counts)
@@ -0,0 +1,361 @@
+# Client Mistral factice pour tester et mesurer les scripts sans accès réseau
+
+import json
+import math
+import random
+import argparse
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+class StubAPIError(Exception):
+    """Erreur d'API factice portant un code HTTP, comme les erreurs du SDK Mistral."""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(message or f"Erreur HTTP {status_code}")
+        self.status_code = status_code
+
+
+def default_responder(model, messages):
+    """Génère une réponse déterministe à partir du dernier message utilisateur."""
+    prompt = messages[-1]["content"]
+    return f"Réponse de {model} : {prompt}"
+
+
+def make_response(model, content, prompt_tokens=0):
+    """Construit un objet réponse ayant la même forme que celle de chat.complete."""
+    completion_tokens = len(content.split())
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        ),
+    )
+
+
+class _StubChat:
+    """Équivalent factice de client.chat."""
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def complete(self, model, messages, **params):
+        return self._owner._complete(model, messages, params)
+
+    def stream(self, model, messages, **params):
+        # Les erreurs sont levées à l'ouverture du flux, comme avec le SDK
+        return self._owner._stream(model, messages, params)
+
+
+class _StubFiles:
+    """Équivalent factice de client.files : les contenus uploadés sont gardés en mémoire."""
+
+    def __init__(self, owner):
+        self._owner = owner
+        self.uploaded = {}
+
+    def upload(self, file):
+        self._owner._simulate_call()
+        content = file["content"]
+        data = content.read() if hasattr(content, "read") else content
+        file_id = str(uuid.UUID(int=self._owner._random.getrandbits(128)))
+        self.uploaded[file_id] = {"file_name": file["file_name"], "content": data}
+        return SimpleNamespace(id=file_id, filename=file["file_name"], bytes=len(data), purpose="fine-tune")
+
+    def retrieve(self, file_id):
+        if file_id not in self.uploaded:
+            raise StubAPIError(404, f"Fichier inconnu : {file_id}")
+        entry = self.uploaded[file_id]
+        return SimpleNamespace(id=file_id, filename=entry["file_name"], bytes=len(entry["content"]))
+
+
+def default_losses(hyperparameters, step):
+    """Courbes de perte synthétiques : décroissantes, et meilleures pour un taux d'apprentissage proche de 1e-4."""
+    learning_rate = hyperparameters.get("learning_rate", 1e-4)
+    floor = 0.8 + 0.3 * abs(math.log10(learning_rate) + 4)
+    train_loss = floor + 1.5 / (1 + 0.5 * step)
+    valid_loss = train_loss + 0.05 + 0.01 * hyperparameters.get("weight_decay", 0.1)
+    return train_loss, valid_loss, 1 / (1 + valid_loss)
+
+
+class FakeJobs:
+    """Équivalent factice de client.fine_tuning.jobs.
+
+    L'avancement d'un job dépend uniquement de l'horloge (injectable) : une étape
+    toutes les seconds_per_step secondes après le démarrage, et un checkpoint
+    toutes les checkpoint_every étapes. Comme l'API, get() renvoie les checkpoints
+    du plus récent au plus ancien.
+    """
+
+    def __init__(self, clock=time.monotonic, seconds_per_step=1.0, checkpoint_every=1, queue_seconds=0.0, losses=None, seed=0):
+        self.clock = clock
+        self.seconds_per_step = seconds_per_step
+        self.checkpoint_every = checkpoint_every
+        self.queue_seconds = queue_seconds
+        self.losses = losses or default_losses
+        self._random = random.Random(seed)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.gets = 0
+        self.lists = 0
+
+    def create(self, model, training_files, validation_files=None, hyperparameters=None, auto_start=True, **kwargs):
+        with self._lock:
+            job_id = str(uuid.UUID(int=self._random.getrandbits(128)))
+            self._jobs[job_id] = {
+                "id": job_id,
+                "model": model,
+                "training_files": training_files,
+                "validation_files": validation_files or [],
+                "hyperparameters": dict(hyperparameters or {}),
+                "created_at": self.clock(),
+                "started_at": None,
+                "status": "VALIDATED",
+                "fine_tuned_model": None,
+            }
+        if auto_start:
+            self.start(job_id)
+        return self.get(job_id)
+
+    def start(self, job_id):
+        job = self._job(job_id)
+        with self._lock:
+            job["started_at"] = self.clock()
+            job["status"] = "QUEUED"
+        return self.get(job_id)
+
+    def cancel(self, job_id):
+        job = self._job(job_id)
+        with self._lock:
+            self._advance(job)
+            if job["status"] not in ("SUCCESS", "FAILED"):
+                job["status"] = "CANCELLED"
+        return self.get(job_id)
+
+    def get(self, job_id):
+        job = self._job(job_id)
+        with self._lock:
+            self.gets += 1
+            self._advance(job)
+            return self._snapshot(job)
+
+    def list(self, page=0, page_size=100, created_after=None, **kwargs):
+        with self._lock:
+            self.lists += 1
+            for job in self._jobs.values():
+                self._advance(job)
+            after = created_after.timestamp() if hasattr(created_after, "timestamp") else created_after
+            jobs = sorted(
+                (job for job in self._jobs.values() if after is None or job["created_at"] > after),
+                key=lambda job: job["created_at"], reverse=True,
+            )
+            data = [self._snapshot(job) for job in jobs[page * page_size:(page + 1) * page_size]]
+            return SimpleNamespace(data=data, total=len(jobs))
+
+    def _job(self, job_id):
+        if job_id not in self._jobs:
+            raise StubAPIError(404, f"Job inconnu : {job_id}")
+        return self._jobs[job_id]
+
+    def _steps_done(self, job):
+        if job["started_at"] is None:
+            return 0
+        elapsed = self.clock() - job["started_at"] - self.queue_seconds
+        total = job["hyperparameters"].get("training_steps", 10)
+        if elapsed < 0:
+            return 0
+        if self.seconds_per_step <= 0:
+            return total
+        return min(total, int(elapsed / self.seconds_per_step))
+
+    def _advance(self, job):
+        if job["status"] not in ("QUEUED", "RUNNING"):
+            return
+        steps = self._steps_done(job)
+        job["steps_done"] = steps
+        if self.clock() - job["started_at"] >= self.queue_seconds:
+            job["status"] = "RUNNING"
+        if steps >= job["hyperparameters"].get("training_steps", 10):
+            job["status"] = "SUCCESS"
+            job["fine_tuned_model"] = f"ft:{job['model']}:{job['id'][:8]}"
+
+    def _snapshot(self, job):
+        total = job["hyperparameters"].get("training_steps", 10)
+        steps = job.get("steps_done", 0)
+        checkpoints = []
+        for step in range(steps, 0, -1):
+            if step % self.checkpoint_every and step != total:
+                continue
+            train_loss, valid_loss, accuracy = self.losses(job["hyperparameters"], step)
+            checkpoints.append(SimpleNamespace(
+                step_number=step,
+                created_at=job["started_at"] + self.queue_seconds + step * self.seconds_per_step,
+                metrics=SimpleNamespace(train_loss=train_loss, valid_loss=valid_loss, valid_mean_token_accuracy=accuracy),
+            ))
+        return SimpleNamespace(
+            id=job["id"],
+            model=job["model"],
+            status=job["status"],
+            training_files=[f["file_id"] if isinstance(f, dict) else f for f in job["training_files"]],
+            validation_files=list(job["validation_files"]),
+            hyperparameters=SimpleNamespace(**job["hyperparameters"]),
+            fine_tuned_model=job["fine_tuned_model"],
+            created_at=job["created_at"],
+            checkpoints=checkpoints,
+        )
+
+
+class StubMistral:
+    """Client factice imitant l'interface du client Mistral utilisée par les scripts.
+
+    La latence, le taux d'erreurs 5xx et le taux de réponses 429 sont configurables
+    afin de mesurer le débit des scripts sans appeler l'API.
+    """
+
+    def __init__(self, latency=0.05, error_rate=0.0, rate_limit_rate=0.0, seed=0, responder=None, jobs=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.responder = responder or default_responder
+        self.chat = _StubChat(self)
+        self.files = _StubFiles(self)
+        self.fine_tuning = SimpleNamespace(jobs=jobs or FakeJobs(seed=seed))
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _simulate_call(self):
+        """Simule la latence et les erreurs transitoires (429, 503) d'un appel à l'API."""
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            draw = self._random.random()
+
+        try:
+            time.sleep(self.latency)
+            if draw < self.rate_limit_rate + self.error_rate:
+                with self._lock:
+                    self.errors += 1
+                if draw < self.rate_limit_rate:
+                    raise StubAPIError(429, "Rate limit exceeded")
+                raise StubAPIError(503, "Service unavailable")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _complete(self, model, messages, params):
+        self._simulate_call()
+        content = self.responder(model, messages)
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        return make_response(model, content, prompt_tokens)
+
+    def _stream(self, model, messages, params):
+        self._simulate_call()
+        words = self.responder(model, messages).split(" ")
+        return (make_chunk(model, word + (" " if i < len(words) - 1 else "")) for i, word in enumerate(words))
+
+
+def make_chunk(model, content):
+    """Construit un événement ayant la même forme que ceux de chat.stream."""
+    return SimpleNamespace(data=SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, delta=SimpleNamespace(role="assistant", content=content), finish_reason=None)],
+    ))
+
+
+def make_handler(stub):
+    """Handler HTTP exposant un StubMistral sous la route /v1/chat/completions de l'API."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_json(404, {"message": f"Route inconnue : {self.path}"})
+                return
+
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            model, messages = request["model"], request["messages"]
+            try:
+                if request.get("stream"):
+                    chunks = stub._stream(model, messages, request)
+                else:
+                    response = stub._complete(model, messages, request)
+            except StubAPIError as e:
+                self._send_json(e.status_code, {"message": str(e)})
+                return
+
+            if not request.get("stream"):
+                self._send_json(200, {
+                    "id": uuid.uuid4().hex,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": response.choices[0].message.content},
+                                 "finish_reason": "stop"}],
+                    "usage": vars(response.usage),
+                })
+                return
+
+            # Server-Sent Events, terminés par [DONE]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for chunk in chunks:
+                event = {
+                    "id": uuid.uuid4().hex,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": chunk.data.choices[0].delta.content}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return StubHandler
+
+
+def start_server(stub, host="127.0.0.1", port=0):
+    """Démarre un serveur HTTP factice dans un thread et retourne (serveur, URL à passer en server_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur HTTP local imitant l'API chat de Mistral (benchmarks sans réseau).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8000, help="Port d'écoute")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latence simulée d'une requête (secondes)")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Proportion de réponses 503 simulées")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Proportion de réponses 429 simulées")
+    args = parser.parse_args()
+
+    stub = StubMistral(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub))
+    print(f"Serveur factice à l'écoute : http://{args.host}:{args.port} (utiliser --server_url)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
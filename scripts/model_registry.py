@@ -0,0 +1,278 @@
+# Registre local des modèles fine-tunés : évite d'interroger l'API à chaque lancement
+
+import os
+import json
+import time
+import argparse
+import getpass
+from datetime import datetime, timezone
+from upload_manifest import MANIFEST_PATH, load_manifest
+from telemetry import add_arguments, session, telemetry
+
+# Index local des jobs de fine-tuning et de leurs modèles
+REGISTRY_PATH = "data/models.json"
+
+# Durée (en secondes) pendant laquelle l'index est considéré à jour
+DEFAULT_TTL = 3600
+
+# Taille des pages demandées à jobs.list
+PAGE_SIZE = 100
+
+# Statuts après lesquels un job n'évolue plus
+TERMINAL_STATUSES = {"FAILED_VALIDATION", "FAILED", "STOPPED", "SUCCESS", "CANCELLED"}
+
+
+def as_dict(value):
+    """Convertit un objet du SDK (pydantic ou simple objet) en dictionnaire."""
+    if value is None:
+        return {}
+    if isinstance(value, dict):
+        return dict(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return dict(vars(value))
+
+
+def file_ids(files):
+    """IDs des fichiers d'un job (chaînes ou objets {"file_id": ...})."""
+    ids = []
+    for f in files or []:
+        if isinstance(f, str):
+            ids.append(f)
+        else:
+            ids.append(as_dict(f).get("file_id"))
+    return [file_id for file_id in ids if file_id]
+
+
+def final_metrics(job):
+    """Métriques du dernier checkpoint d'un job."""
+    checkpoints = getattr(job, "checkpoints", None) or []
+    if not checkpoints:
+        return {}
+    last = max(checkpoints, key=lambda c: c.step_number)
+    metrics = {key: value for key, value in as_dict(last.metrics).items() if value is not None}
+    metrics["step"] = last.step_number
+    return metrics
+
+
+def lower_is_better(metric):
+    """Les pertes sont à minimiser, les autres métriques (précision, BLEU, ROUGE...) à maximiser."""
+    return metric.endswith("loss")
+
+
+class ModelRegistry:
+    """Index JSON des jobs de fine-tuning (data/models.json).
+
+    Chaque entrée conserve l'ID du job, le modèle fine-tuné, les empreintes des
+    datasets (d'après le manifeste d'upload), les hyperparamètres, les métriques
+    finales et des tags. L'index est rafraîchi de façon incrémentale quand il est
+    plus vieux que ttl secondes : les nouveaux jobs sont enregistrés d'après la
+    réponse de jobs.list, et seuls les jobs connus encore en cours sont redemandés
+    un par un (jobs.get).
+    """
+
+    def __init__(self, path=REGISTRY_PATH, ttl=DEFAULT_TTL, manifest_path=MANIFEST_PATH, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.manifest_path = manifest_path
+        self.clock = clock
+        self.data = {"refreshed_at": None, "models": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    @property
+    def models(self):
+        return self.data["models"]
+
+    def save(self):
+        """Écrit l'index (écriture atomique)."""
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self):
+        refreshed_at = self.data.get("refreshed_at")
+        return refreshed_at is None or self.clock() - refreshed_at > self.ttl
+
+    def _digests(self):
+        """Empreinte de chaque fichier uploadé, par ID distant (d'après le manifeste d'upload)."""
+        return {entry["file_id"]: digest for digest, entry in load_manifest(self.manifest_path).items()}
+
+    def record(self, job, save=True, digests=None):
+        """Ajoute ou met à jour l'entrée d'un job (objet retourné par jobs.get ou jobs.list) ; les tags sont conservés.
+
+        Les métriques finales sont lues dans les checkpoints du job s'ils sont présents ;
+        sinon les métriques déjà enregistrées sont gardées.
+        """
+        previous = self.models.get(job.id, {})
+        digests = self._digests() if digests is None else digests
+        training_files = file_ids(getattr(job, "training_files", None))
+        validation_files = file_ids(getattr(job, "validation_files", None))
+
+        entry = {
+            "job_id": job.id,
+            "model": job.fine_tuned_model,
+            "base_model": job.model,
+            "status": job.status,
+            "created_at": job.created_at,
+            "hyperparameters": as_dict(getattr(job, "hyperparameters", None)),
+            "training_files": training_files,
+            "validation_files": validation_files,
+            "dataset_hashes": {file_id: digests[file_id] for file_id in training_files + validation_files if file_id in digests},
+            "metrics": {**previous.get("metrics", {}), **final_metrics(job)},
+            "tags": previous.get("tags", []),
+        }
+        self.models[job.id] = entry
+        if save:
+            self.save()
+        return entry
+
+    def _list_jobs(self, client, created_after=None):
+        """Parcourt les pages de jobs.list (uniquement les jobs créés après created_after si fourni)."""
+        kwargs = {}
+        if created_after is not None:
+            kwargs["created_after"] = datetime.fromtimestamp(created_after, tz=timezone.utc)
+        page = 0
+        while True:
+            with telemetry.span("api.jobs.list"):
+                jobs = client.fine_tuning.jobs.list(page=page, page_size=PAGE_SIZE, **kwargs)
+            yield from jobs.data
+            if len(jobs.data) < PAGE_SIZE:
+                break
+            page += 1
+
+    def refresh(self, client, force=False):
+        """Met à jour l'index si son TTL est dépassé (ou si force=True) ; retourne le nombre de jobs mis à jour."""
+        if not force and not self.is_stale():
+            return 0
+
+        # Jobs créés depuis le plus récent connu (marge d'une seconde) : enregistrés d'après la liste
+        newest = max((entry["created_at"] for entry in self.models.values()), default=None)
+        since = newest - 1 if newest is not None else None
+        digests = self._digests()
+        listed = set()
+        for job in self._list_jobs(client, since):
+            self.record(job, save=False, digests=digests)
+            listed.add(job.id)
+
+        # Jobs plus anciens qui n'étaient pas terminés : seul leur état courant est redemandé
+        to_fetch = [job_id for job_id, entry in self.models.items()
+                    if job_id not in listed and entry["status"] not in TERMINAL_STATUSES]
+        for job_id in sorted(to_fetch):
+            with telemetry.span("api.jobs.get"):
+                job = client.fine_tuning.jobs.get(job_id=job_id)
+            self.record(job, save=False, digests=digests)
+
+        self.data["refreshed_at"] = self.clock()
+        self.save()
+        return len(listed) + len(to_fetch)
+
+    def find(self, reference):
+        """Retrouve une entrée par ID de job ou par nom de modèle fine-tuné."""
+        if reference in self.models:
+            return self.models[reference]
+        for entry in self.models.values():
+            if entry["model"] == reference:
+                return entry
+        raise ValueError(f"Modèle ou job inconnu dans le registre : {reference}")
+
+    def tag(self, reference, tag):
+        """Ajoute un tag à un modèle (ex. : "production")."""
+        entry = self.find(reference)
+        if tag not in entry["tags"]:
+            entry["tags"].append(tag)
+        self.save()
+        return entry
+
+    def set_metrics(self, reference, metrics):
+        """Enregistre des métriques (ex. : résultats d'évaluation) pour un modèle."""
+        entry = self.find(reference)
+        entry["metrics"].update(metrics)
+        self.save()
+        return entry
+
+    def resolve(self, tag=None, metric=None):
+        """Choisit un modèle terminé avec succès : le plus récent, ou le meilleur selon metric, parmi ceux portant tag.
+
+        Retourne l'entrée correspondante, ou None si aucun modèle ne convient.
+        """
+        candidates = [entry for entry in self.models.values() if entry["status"] == "SUCCESS" and entry["model"]]
+        if tag:
+            candidates = [entry for entry in candidates if tag in entry["tags"]]
+        if metric:
+            candidates = [entry for entry in candidates if entry["metrics"].get(metric) is not None]
+            sign = 1 if lower_is_better(metric) else -1
+            return min(candidates, key=lambda entry: sign * entry["metrics"][metric], default=None)
+        return max(candidates, key=lambda entry: entry["created_at"], default=None)
+
+
+def resolve_model(client, tag=None, metric=None, path=REGISTRY_PATH, ttl=DEFAULT_TTL):
+    """Retourne le nom du modèle fine-tuné à utiliser.
+
+    L'index local suffit tant qu'il est à jour et contient un modèle adapté ; sinon il
+    est rafraîchi auprès de l'API.
+    """
+    registry = ModelRegistry(path, ttl)
+    entry = None if registry.is_stale() else registry.resolve(tag, metric)
+    if entry is None:
+        registry.refresh(client, force=True)
+        entry = registry.resolve(tag, metric)
+    if entry is None:
+        raise ValueError("Aucun modèle fine-tuné terminé avec succès ne correspond"
+                         + (f" au tag '{tag}'" if tag else "") + (f" (métrique {metric})" if metric else "") + ".")
+    return entry["model"]
+
+
+def print_registry(registry):
+    """Affiche les modèles du registre, du plus récent au plus ancien."""
+    entries = sorted(registry.models.values(), key=lambda entry: entry["created_at"], reverse=True)
+    if not entries:
+        print("Registre vide.")
+    for entry in entries:
+        metrics = ", ".join(f"{k}={v:.4f}" for k, v in entry["metrics"].items() if isinstance(v, float))
+        tags = f" [{', '.join(entry['tags'])}]" if entry["tags"] else ""
+        print(f"{entry['job_id']} | {entry['status']:<17} | {entry['model'] or '-'}{tags}")
+        if metrics:
+            print(f"    {metrics}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registre local des modèles fine-tunés.")
+    parser.add_argument("--registry", type=str, default=REGISTRY_PATH, help="Fichier JSON du registre")
+    add_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="Afficher les modèles connus (sans appel à l'API)")
+    subparsers.add_parser("refresh", help="Mettre à jour le registre depuis l'API")
+
+    tag_parser = subparsers.add_parser("tag", help="Ajouter un tag à un modèle")
+    tag_parser.add_argument("model", type=str, help="ID du job ou nom du modèle fine-tuné")
+    tag_parser.add_argument("tag", type=str, help="Tag à ajouter (ex. : production)")
+
+    resolve_parser = subparsers.add_parser("resolve", help="Afficher le modèle sélectionné")
+    resolve_parser.add_argument("--tag", type=str, help="Ne considérer que les modèles portant ce tag")
+    resolve_parser.add_argument("--best", type=str, help="Choisir le meilleur modèle selon cette métrique (ex. : valid_loss)")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.registry)
+
+    with session(args):
+        if args.command == "list":
+            print_registry(registry)
+        elif args.command == "refresh":
+            from mistral import Mistral
+            client = Mistral(api_key=getpass.getpass("Entrez votre clé API Mistral : "))
+            with telemetry.profile("registry_refresh"):
+                count = registry.refresh(client, force=True)
+            print(f"{count} jobs mis à jour.")
+            print_registry(registry)
+        elif args.command == "tag":
+            entry = registry.tag(args.model, args.tag)
+            print(f"Tags de {entry['model'] or entry['job_id']} : {', '.join(entry['tags'])}")
+        else:
+            entry = registry.resolve(args.tag, args.best)
+            print(entry["model"] if entry else "Aucun modèle ne correspond (essayez la commande refresh).")
@@ -0,0 +1,363 @@
+# Orchestrateur du pipeline complet : conversion -> découpage -> upload -> entraînement -> évaluation
+#
+# Les étapes forment un graphe de dépendances décrit par un seul fichier de configuration.
+# Chaque étape enregistre les empreintes de ses entrées et de ses sorties : elle n'est
+# relancée que si ses entrées, ses paramètres ou ses sorties ont changé.
+
+import os
+import copy
+import json
+import time
+import hashlib
+import argparse
+import getpass
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from telemetry import add_arguments, session, telemetry
+
+# Configuration et état par défaut
+CONFIG_PATH = "pipeline.json"
+STATE_PATH = "data/pipeline_state.json"
+
+# Paramètres par défaut de chaque étape (complétés par le fichier de configuration)
+DEFAULT_CONFIG = {
+    "convert": {"input": "data/raw/dataset.csv", "output_dir": "data/converted"},
+    "dedup": {"enabled": False, "field": "pair", "near": True},
+    "split": {"train_ratio": 0.9, "val_ratio": 0.05, "test_ratio": 0.05, "seed": 0, "key": None,
+              "stratify": None, "exact": False, "output_dir": "data/processed"},
+    "profile": {"tokenizer": "approx", "output": "data/results/profile.json"},
+    "upload": {"validate": True, "retries": 5},
+    "train": {"hyperparameters": {}},
+    "evaluate": {"models": None, "samples": 1, "temperature": None, "concurrency": 8, "rate_limit": 5.0,
+                 "output": None},
+}
+
+# Taille des blocs lus pour calculer une empreinte
+HASH_BLOCK_SIZE = 1 << 20
+
+_print_lock = threading.Lock()
+
+
+def log(stage, message):
+    """Affiche un message préfixé par le nom de l'étape (sans mélanger les lignes des étapes parallèles)."""
+    with _print_lock:
+        print(f"[{stage}] {message}")
+
+
+def load_config(path=CONFIG_PATH):
+    """Charge la configuration JSON et la complète avec DEFAULT_CONFIG (étape par étape)."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for stage, params in json.load(f).items():
+                config.setdefault(stage, {}).update(params)
+    elif path != CONFIG_PATH:
+        raise FileNotFoundError(f"Le fichier de configuration {path} n'existe pas.")
+    return config
+
+
+def digest(value):
+    """Empreinte d'une valeur JSON (paramètres, IDs...)."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class FileHasher:
+    """Empreintes SHA-256 de fichiers, mémorisées par (taille, date de modification).
+
+    Un fichier inchangé depuis la dernière exécution n'est pas relu.
+    """
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        stat = os.stat(path)
+        with self._lock:
+            entry = self.known.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                sha.update(block)
+        with self._lock:
+            self.known[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha.hexdigest()}
+        return sha.hexdigest()
+
+
+class Stage:
+    """Étape du pipeline.
+
+    inputs(ctx) retourne les fichiers lus et les valeurs amont utilisées (IDs, noms de
+    modèles) ; run(ctx, params) produit un dictionnaire de sorties. Les sorties dont le
+    nom se termine par "_path" sont des fichiers, dont l'empreinte est vérifiée.
+    """
+
+    def __init__(self, name, deps, inputs, run):
+        self.name = name
+        self.deps = deps
+        self.inputs = inputs
+        self.run = run
+
+
+# Étapes
+
+def _convert(ctx, params):
+    from json_to_jsonl import convert_json_to_jsonl
+    from cvs_to_jsonl import convert_csv_to_jsonl
+    input_dir, input_filename = os.path.split(params["input"])
+    convert = convert_csv_to_jsonl if input_filename.lower().endswith(".csv") else convert_json_to_jsonl
+    os.makedirs(params["output_dir"], exist_ok=True)
+    return {"dataset_path": convert(input_filename, input_dir=input_dir, output_dir=params["output_dir"])}
+
+
+def _dedup(ctx, params):
+    from dedup import deduplicate
+    input_dir, input_filename = os.path.split(ctx.output("convert", "dataset_path"))
+    path = deduplicate(input_filename, field=params["field"], near=params["near"], input_dir=input_dir, output_dir=input_dir)
+    return {"dataset_path": path}
+
+
+def _split(ctx, params):
+    from train_test_val import split_dataset
+    input_dir, input_filename = os.path.split(ctx.dataset_path())
+    os.makedirs(params["output_dir"], exist_ok=True)
+    train_path, validation_path, test_path = split_dataset(
+        input_filename, params["train_ratio"], params["val_ratio"], params["test_ratio"], seed=params["seed"],
+        key=params["key"], stratify=params["stratify"], exact=params["exact"],
+        input_dir=input_dir, output_dir=params["output_dir"],
+    )
+    return {"train_path": train_path, "validation_path": validation_path, "test_path": test_path}
+
+
+def _profile(ctx, params):
+    from profile_dataset import estimate_training, profile_file
+    from hyperparams import DEFAULT_HYPERPARAMS
+    profile = profile_file(ctx.output("split", "train_path"), params["tokenizer"])
+    steps = ctx.config["train"]["hyperparameters"].get("training_steps", DEFAULT_HYPERPARAMS["training_steps"])
+    profile["training"] = estimate_training(profile["total_tokens"], steps)
+    os.makedirs(os.path.dirname(params["output"]) or ".", exist_ok=True)
+    with open(params["output"], "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2, ensure_ascii=False)
+    log("profile", f"{profile['samples']} exemples, {profile['total_tokens']} tokens, "
+                   f"{profile['training']['epochs']:.2f} époque(s)")
+    return {"profile_path": params["output"]}
+
+
+def _upload(ctx, params):
+    from upload_to_mistral import upload_files
+    train_id, validation_id = upload_files(
+        ctx.client(), [ctx.output("split", "train_path"), ctx.output("split", "validation_path")],
+        max_retries=params["retries"], validate=params["validate"],
+    )
+    if not train_id or not validation_id:
+        raise RuntimeError("L'upload des fichiers a échoué.")
+    return {"train_file_id": train_id, "validation_file_id": validation_id}
+
+
+def _train(ctx, params):
+    from hyperparams import DEFAULT_HYPERPARAMS
+    from train import train_mistral
+    hyperparams = {**DEFAULT_HYPERPARAMS, **params["hyperparameters"]}
+    job = train_mistral(ctx.secret("mistral"), ctx.secret("wandb"), ctx.output("upload", "train_file_id"),
+                        ctx.output("upload", "validation_file_id"), hyperparams, client=ctx.client())
+    if job.status != "SUCCESS":
+        raise RuntimeError(f"Le job {job.id} s'est terminé avec le statut {job.status}.")
+    return {"job_id": job.id, "model": job.fine_tuned_model}
+
+
+def _evaluate(ctx, params):
+    from evaluate import BASE_MODEL, EvalOptions, default_output_path, evaluate_model, table_path
+    test_path = ctx.output("split", "test_path")
+    output_path = params["output"] or default_output_path(test_path)
+    models = params["models"] or [ctx.output("train", "model"), BASE_MODEL]
+    options = EvalOptions(concurrency=params["concurrency"], rate_limit=params["rate_limit"],
+                          samples=params["samples"], temperature=params["temperature"])
+    evaluate_model(ctx.secret("mistral"), test_path, options, output_path=output_path, client=ctx.client(), models=models)
+    return {"results_path": output_path, "table_path": table_path(output_path)}
+
+
+def build_stages(config):
+    """Graphe des étapes ; la déduplication n'y figure que si elle est activée."""
+    dedup = config["dedup"].get("enabled")
+    stages = [
+        Stage("convert", [], lambda ctx: {"raw": ctx.file(ctx.config["convert"]["input"])}, _convert),
+        Stage("split", ["dedup" if dedup else "convert"], lambda ctx: {"dataset": ctx.file(ctx.dataset_path())}, _split),
+        Stage("profile", ["split"], lambda ctx: {"train": ctx.file(ctx.output("split", "train_path"))}, _profile),
+        Stage("upload", ["split"], lambda ctx: {
+            "train": ctx.file(ctx.output("split", "train_path")),
+            "validation": ctx.file(ctx.output("split", "validation_path")),
+        }, _upload),
+        Stage("train", ["upload"], lambda ctx: {
+            "train_file_id": ctx.output("upload", "train_file_id"),
+            "validation_file_id": ctx.output("upload", "validation_file_id"),
+        }, _train),
+        Stage("evaluate", ["split", "train"], lambda ctx: {
+            "test": ctx.file(ctx.output("split", "test_path")),
+            "model": None if ctx.config["evaluate"]["models"] else ctx.output("train", "model"),
+        }, _evaluate),
+    ]
+    if dedup:
+        stages.insert(1, Stage("dedup", ["convert"], lambda ctx: {"dataset": ctx.file(ctx.output("convert", "dataset_path"))}, _dedup))
+    return {stage.name: stage for stage in stages}
+
+
+class Pipeline:
+    """Exécute les étapes dans l'ordre des dépendances, en parallèle quand elles sont indépendantes.
+
+    L'état (data/pipeline_state.json) garde, pour chaque étape, l'empreinte de ses
+    entrées et paramètres ainsi que ses sorties : une étape dont l'empreinte n'a pas
+    changé et dont les fichiers de sortie sont intacts n'est pas relancée.
+    """
+
+    def __init__(self, config, state_path=STATE_PATH, client=None, max_workers=4):
+        self.config = config
+        self.state_path = state_path
+        self.stages = build_stages(config)
+        self.max_workers = max_workers
+        self._client = client
+        self._secrets = {}
+        self._lock = threading.Lock()
+
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.file = FileHasher(self.state.get("files"))
+        self.outputs = {name: entry["outputs"] for name, entry in self.state["stages"].items()}
+
+    # Accès utilisés par les étapes
+
+    def output(self, stage, key):
+        return self.outputs[stage][key]
+
+    def dataset_path(self):
+        return self.output("dedup" if "dedup" in self.stages else "convert", "dataset_path")
+
+    def secret(self, name):
+        """Clé d'API (variable d'environnement MISTRAL_API_KEY / WANDB_API_KEY, sinon demandée une fois)."""
+        with self._lock:
+            if name not in self._secrets:
+                self._secrets[name] = os.environ.get(f"{name.upper()}_API_KEY") or getpass.getpass(
+                    f"Entrez votre clé API {'Mistral' if name == 'mistral' else 'WandB'} : ")
+            return self._secrets[name]
+
+    def client(self):
+        with self._lock:
+            needs_client = self._client is None
+        if needs_client:
+            from mistral import Mistral
+            api_key = self.secret("mistral")
+            with self._lock:
+                self._client = self._client or Mistral(api_key=api_key)
+        return self._client
+
+    # Exécution
+
+    def save_state(self):
+        with self._lock:
+            self.state["files"] = self.file.known
+            if os.path.dirname(self.state_path):
+                os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+
+    def stage_key(self, stage):
+        """Empreinte des entrées (contenu des fichiers, valeurs amont) et des paramètres d'une étape."""
+        return digest({"inputs": stage.inputs(self), "params": self.config.get(stage.name, {})})
+
+    def outputs_intact(self, entry):
+        for name, value in entry["outputs"].items():
+            if name.endswith("_path"):
+                if not os.path.exists(value) or self.file(value) != entry["output_hashes"].get(name):
+                    return False
+        return True
+
+    def run_stage(self, stage, force=False):
+        """Exécute une étape si nécessaire ; retourne True si elle a été exécutée."""
+        key = self.stage_key(stage)
+        entry = self.state["stages"].get(stage.name)
+        if not force and entry and entry["key"] == key and self.outputs_intact(entry):
+            log(stage.name, "inchangé, étape ignorée")
+            return False
+
+        log(stage.name, "exécution...")
+        start = time.perf_counter()
+        with telemetry.span("pipeline.stage", stage=stage.name):
+            outputs = stage.run(self, self.config.get(stage.name, {}))
+        entry = {
+            "key": key,
+            "outputs": outputs,
+            "output_hashes": {name: self.file(value) for name, value in outputs.items() if name.endswith("_path")},
+            "seconds": time.perf_counter() - start,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock:
+            self.outputs[stage.name] = outputs
+            self.state["stages"][stage.name] = entry
+        self.save_state()
+        log(stage.name, f"terminé en {entry['seconds']:.1f}s")
+        return True
+
+    def selected(self, targets=None):
+        """Étapes nécessaires pour atteindre targets (toutes par défaut), dépendances comprises."""
+        if not targets:
+            return set(self.stages)
+        selected, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in self.stages:
+                raise ValueError(f"Étape inconnue : {name} (étapes : {', '.join(self.stages)})")
+            if name not in selected:
+                selected.add(name)
+                todo.extend(self.stages[name].deps)
+        return selected
+
+    def run(self, targets=None, force=()):
+        """Exécute les étapes sélectionnées ; celles dont les dépendances sont prêtes tournent en parallèle.
+
+        Retourne la liste des étapes effectivement exécutées.
+        """
+        pending = self.selected(targets)
+        done, executed = set(), []
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in sorted(pending):
+                    if all(dep in done for dep in self.stages[name].deps):
+                        pending.discard(name)
+                        running[executor.submit(self.run_stage, self.stages[name], name in force)] = name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        if future.result():
+                            executed.append(name)
+                    except Exception:
+                        # Laisser les étapes en cours se terminer, sans en lancer de nouvelles
+                        pending.clear()
+                        wait(running)
+                        raise
+                    done.add(name)
+        return executed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exécuter le pipeline complet (seules les étapes modifiées sont relancées).")
+    parser.add_argument("--config", type=str, default=CONFIG_PATH, help="Fichier de configuration JSON")
+    parser.add_argument("--state", type=str, default=STATE_PATH, help="Fichier d'état (empreintes des étapes)")
+    parser.add_argument("--stages", type=str, nargs="+", help="Étapes à atteindre (avec leurs dépendances), ex. : evaluate")
+    parser.add_argument("--force", type=str, nargs="+", default=[], help="Étapes à relancer même si rien n'a changé")
+    parser.add_argument("--workers", type=int, default=4, help="Nombre maximal d'étapes simultanées")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline = Pipeline(load_config(args.config), args.state, max_workers=args.workers)
+    with session(args):
+        executed = pipeline.run(args.stages, force=set(args.force))
+    print(f"\nÉtapes exécutées : {', '.join(executed) if executed else 'aucune (tout est à jour)'}")
@@ -0,0 +1,233 @@
+# Profil des fichiers d'entraînement : nombre de tokens, distribution des longueurs et coût estimé
+
+import os
+import json
+import argparse
+from array import array
+import multiprocessing
+import numpy as np
+from file_chunks import byte_ranges, iter_range_lines
+from hyperparams import DEFAULT_HYPERPARAMS
+from telemetry import add_arguments, session, telemetry
+
+# Dossier contenant les fichiers à profiler
+DATASET_DIR = "data/processed"
+
+# Tokenizer par défaut : approximation locale, sans dépendance
+DEFAULT_TOKENIZER = "approx"
+
+# Longueur maximale d'un exemple avant troncature (contexte d'open-mistral-7b)
+DEFAULT_MAX_TOKENS = 32768
+
+# Hypothèse : nombre de tokens traités par étape d'entraînement (à ajuster selon le modèle)
+DEFAULT_TOKENS_PER_STEP = 131072
+
+# Tokens ajoutés par le gabarit de conversation pour chaque message ([INST], [/INST], </s>...)
+MESSAGE_OVERHEAD = 3
+
+ROLES = ("system", "user", "assistant")
+
+# Bornes des classes de l'histogramme des longueurs (en tokens)
+HISTOGRAM_BINS = [0, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, np.inf]
+
+
+def approx_token_count(text):
+    """Estimation rapide du nombre de tokens : environ 4 caractères par token, et au moins un token par mot."""
+    return max(len(text.split()), (len(text) + 3) // 4)
+
+
+def load_tokenizer(spec):
+    """Retourne une fonction texte -> nombre de tokens.
+
+    spec vaut "approx" (par défaut), "mistral" (paquet mistral_common) ou
+    "hf:<nom>" (tokenizer Hugging Face, paquet transformers).
+    """
+    if spec == "approx":
+        return approx_token_count
+
+    if spec == "mistral":
+        try:
+            from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+        except ImportError:
+            raise ValueError("Le tokenizer 'mistral' nécessite le paquet mistral_common (pip install mistral-common).")
+        tokenizer = MistralTokenizer.v3().instruct_tokenizer.tokenizer
+        return lambda text: len(tokenizer.encode(text, bos=False, eos=False))
+
+    if spec.startswith("hf:"):
+        try:
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise ValueError("Les tokenizers 'hf:<nom>' nécessitent le paquet transformers.")
+        tokenizer = AutoTokenizer.from_pretrained(spec[3:])
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+    raise ValueError(f"Tokenizer inconnu : {spec} (choix : approx, mistral, hf:<nom>)")
+
+
+_count_tokens = None
+
+
+def _init_worker(spec):
+    global _count_tokens
+    _count_tokens = load_tokenizer(spec)
+
+
+def _profile_range(task):
+    """Compte les tokens des lignes d'une plage d'octets (exécuté dans un processus du pool)."""
+    path, start, end = task
+    role_lengths = {role: array("I") for role in ROLES}
+    totals, line_numbers = array("I"), array("I")
+    invalid, num_lines = 0, 0
+
+    for _, line in iter_range_lines(path, start, end):
+        num_lines += 1
+        if not line.strip():
+            continue
+        try:
+            messages = json.loads(line)["messages"]
+            total = 0
+            for message in messages:
+                count = _count_tokens(str(message["content"]))
+                role_lengths.setdefault(message["role"], array("I")).append(count)
+                total += count + MESSAGE_OVERHEAD
+        except (ValueError, KeyError, TypeError):
+            invalid += 1
+            continue
+        totals.append(total)
+        line_numbers.append(num_lines)
+
+    return {
+        "lines": num_lines,
+        "invalid": invalid,
+        "roles": {role: lengths.tobytes() for role, lengths in role_lengths.items()},
+        "totals": totals.tobytes(),
+        "line_numbers": line_numbers.tobytes(),
+    }
+
+
+def histogram(lengths):
+    """Histogramme des longueurs selon HISTOGRAM_BINS."""
+    counts, _ = np.histogram(lengths, bins=HISTOGRAM_BINS)
+    return counts
+
+
+def profile_file(path, tokenizer=DEFAULT_TOKENIZER, workers=None, max_tokens=DEFAULT_MAX_TOKENS):
+    """Compte les tokens d'un fichier JSONL au format chat, en parallèle sur des plages d'octets."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Le fichier {path} n'existe pas.")
+
+    workers = workers or os.cpu_count() or 1
+    tasks = [(path, start, end) for start, end in byte_ranges(path, workers)]
+
+    if len(tasks) > 1:
+        # spawn plutôt que fork : le pipeline profile le dataset dans un thread, pendant l'upload
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(workers, len(tasks)), initializer=_init_worker, initargs=(tokenizer,)) as pool:
+            parts = pool.map(_profile_range, tasks)
+    else:
+        _init_worker(tokenizer)
+        parts = [_profile_range(task) for task in tasks]
+
+    # Fusionner les plages dans l'ordre du fichier (numéros de ligne décalés)
+    role_lengths = {}
+    totals, line_numbers = [], []
+    line_offset, invalid = 0, 0
+    for part in parts:
+        for role, data in part["roles"].items():
+            role_lengths.setdefault(role, []).append(np.frombuffer(data, dtype=np.uint32))
+        totals.append(np.frombuffer(part["totals"], dtype=np.uint32))
+        line_numbers.append(np.frombuffer(part["line_numbers"], dtype=np.uint32).astype(np.int64) + line_offset)
+        line_offset += part["lines"]
+        invalid += part["invalid"]
+
+    totals = np.concatenate(totals).astype(np.int64)
+    line_numbers = np.concatenate(line_numbers)
+    role_lengths = {role: np.concatenate(chunks).astype(np.int64) for role, chunks in role_lengths.items()}
+
+    # Exemples qui seraient tronqués, du plus long au plus court
+    too_long = np.flatnonzero(totals > max_tokens)
+    too_long = too_long[np.argsort(-totals[too_long], kind="stable")]
+
+    return {
+        "file": path,
+        "tokenizer": tokenizer,
+        "samples": int(len(totals)),
+        "invalid_lines": invalid,
+        "total_tokens": int(totals.sum()),
+        "roles": {
+            role: {
+                "messages": int(len(lengths)),
+                "tokens": int(lengths.sum()),
+                "percentiles": {f"p{q}": float(np.percentile(lengths, q)) for q in (50, 90, 99)} if len(lengths) else {},
+                "max": int(lengths.max()) if len(lengths) else 0,
+                "histogram": histogram(lengths).tolist(),
+            }
+            for role, lengths in role_lengths.items() if len(lengths)
+        },
+        "sample_histogram": histogram(totals).tolist(),
+        "truncated": [{"line": int(line_numbers[i]), "tokens": int(totals[i])} for i in too_long],
+    }
+
+
+def estimate_training(total_tokens, training_steps, tokens_per_step=DEFAULT_TOKENS_PER_STEP):
+    """Estime les tokens vus pendant l'entraînement et le nombre d'époques correspondant."""
+    trained_tokens = training_steps * tokens_per_step
+    return {
+        "training_steps": training_steps,
+        "tokens_per_step": tokens_per_step,
+        "trained_tokens": trained_tokens,
+        "epochs": trained_tokens / total_tokens if total_tokens else 0.0,
+    }
+
+
+def print_report(profile, estimate, max_outliers=10):
+    """Affiche le profil d'un fichier."""
+    labels = [f"<{int(b)}" if np.isfinite(b) else f">={int(HISTOGRAM_BINS[-2])}" for b in HISTOGRAM_BINS[1:]]
+
+    print(f"\n {profile['file']} ({profile['tokenizer']})")
+    print(f"Exemples : {profile['samples']} | Tokens : {profile['total_tokens']} | Lignes invalides : {profile['invalid_lines']}")
+
+    for role, stats in profile["roles"].items():
+        p = stats["percentiles"]
+        print(f"\n  {role} : {stats['messages']} messages, {stats['tokens']} tokens "
+              f"(p50 {p['p50']:.0f}, p90 {p['p90']:.0f}, p99 {p['p99']:.0f}, max {stats['max']})")
+        peak = max(stats["histogram"]) or 1
+        for label, count in zip(labels, stats["histogram"]):
+            if count:
+                print(f"    {label:>7} | {'█' * max(1, round(40 * count / peak)):<40} {count}")
+
+    print(f"\nEntraînement : {estimate['training_steps']} étapes × {estimate['tokens_per_step']} tokens "
+          f"= {estimate['trained_tokens']} tokens, soit {estimate['epochs']:.2f} époque(s)")
+
+    if profile["truncated"]:
+        print(f"\n {len(profile['truncated'])} exemples dépassent la longueur maximale et seraient tronqués :")
+        for outlier in profile["truncated"][:max_outliers]:
+            print(f"    ligne {outlier['line']} : {outlier['tokens']} tokens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profiler les fichiers JSONL d'entraînement (tokens, longueurs, époques).")
+    parser.add_argument("filenames", type=str, nargs="+", help="Fichiers JSONL à profiler (dans data/processed)")
+    parser.add_argument("--tokenizer", type=str, default=DEFAULT_TOKENIZER, help="approx, mistral ou hf:<nom>")
+    parser.add_argument("--workers", type=int, help="Nombre de processus (par défaut : nombre de cœurs)")
+    parser.add_argument("--max_tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Longueur maximale avant troncature")
+    parser.add_argument("--training_steps", type=int, default=DEFAULT_HYPERPARAMS["training_steps"], help="Nombre d'étapes d'entraînement prévu")
+    parser.add_argument("--tokens_per_step", type=int, default=DEFAULT_TOKENS_PER_STEP, help="Tokens traités par étape")
+    parser.add_argument("--output", type=str, help="Fichier JSON où enregistrer le profil")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with session(args):
+        profiles = []
+        with telemetry.profile("profile_dataset"):
+            for filename in args.filenames:
+                with telemetry.span("profile.file"):
+                    profile = profile_file(os.path.join(DATASET_DIR, filename), args.tokenizer, args.workers, args.max_tokens)
+                profile["training"] = estimate_training(profile["total_tokens"], args.training_steps, args.tokens_per_step)
+                print_report(profile, profile["training"])
+                profiles.append(profile)
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(profiles, f, indent=2, ensure_ascii=False)
+            print(f"\nProfil enregistré : {args.output}")
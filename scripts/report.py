@@ -0,0 +1,158 @@
+# Rapport d'évaluation sans affichage : graphiques PNG, page HTML et intervalles de confiance bootstrap
+
+import os
+import io
+import json
+import base64
+import argparse
+import html
+import matplotlib
+matplotlib.use("Agg")  # rendu sans écran (serveur, CI)
+import matplotlib.pyplot as plt
+from results_table import ResultsTable
+from telemetry import add_arguments, session, telemetry
+
+# Paramètres par défaut du bootstrap
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+
+ROUGE_METRICS = ("rouge1", "rouge2", "rougeL")
+METRIC_LABELS = {"bleu": "BLEU", "rouge1": "ROUGE-1", "rouge2": "ROUGE-2", "rougeL": "ROUGE-L", "f1": "F1"}
+
+
+def plot_comparison(summary, intervals=None):
+    """Graphiques BLEU / ROUGE / F1 des scores moyens de chaque modèle (barres d'erreur = IC bootstrap)."""
+    models = list(summary)
+    colors = [plt.cm.tab10(m % 10) for m in range(len(models))]
+
+    def errors(model, metrics):
+        if not intervals:
+            return None
+        ci = intervals["means"][model]
+        # max(0, ...) : bornes égales à la moyenne aux erreurs d'arrondi près (scores constants)
+        return [[max(0.0, summary[model][k] - ci[k]["low"]) for k in metrics],
+                [max(0.0, ci[k]["high"] - summary[model][k]) for k in metrics]]
+
+    fig, axs = plt.subplots(1, 3, figsize=(18, 6))
+    width = 0.8 / len(models)
+
+    for ax, metrics, title in ((axs[0], ("bleu",), 'BLEU Score Comparison'),
+                               (axs[1], ROUGE_METRICS, 'ROUGE Score Comparison'),
+                               (axs[2], ("f1",), 'F1 Score Comparison')):
+        for m, model in enumerate(models):
+            positions = [k + (m - (len(models) - 1) / 2) * width for k in range(len(metrics))]
+            ax.bar(positions, [summary[model][k] for k in metrics], width, yerr=errors(model, metrics),
+                   capsize=4, color=colors[m], label=model)
+        ax.set_xticks(range(len(metrics)))
+        ax.set_xticklabels([METRIC_LABELS[k] for k in metrics])
+        ax.set_title(title)
+    axs[1].legend()
+
+    plt.tight_layout()
+    return fig
+
+
+def _format_interval(ci):
+    return f"{ci['mean']:.4f} [{ci['low']:.4f} ; {ci['high']:.4f}]"
+
+
+def render_html(table, intervals, png_bytes, reference=None):
+    """Page HTML autonome (graphique intégré en base64) avec les moyennes et leurs intervalles de confiance."""
+    level = int(round(intervals["confidence"] * 100))
+    header = "".join(f"<th>{METRIC_LABELS.get(k, k)}</th>" for k in table.metrics)
+
+    rows = "".join(
+        f"<tr><td>{html.escape(model)}</td>"
+        + "".join(f"<td>{_format_interval(intervals['means'][model][k])}</td>" for k in table.metrics)
+        + "</tr>"
+        for model in table.models
+    )
+
+    differences = ""
+    if intervals["differences"]:
+        diff_rows = ""
+        for model, scores in intervals["differences"].items():
+            cells = ""
+            for k in table.metrics:
+                ci = scores[k]
+                significant = ci["low"] > 0 or ci["high"] < 0
+                style = ' style="font-weight:bold"' if significant else ""
+                cells += f"<td{style}>{ci['mean']:+.4f} [{ci['low']:+.4f} ; {ci['high']:+.4f}]<br><small>P(gain) = {ci['p_gain']:.3f}</small></td>"
+            diff_rows += f"<tr><td>{html.escape(model)}</td>{cells}</tr>"
+        differences = (
+            f"<h2>Écart au modèle {html.escape(reference)} (IC {level} %, bootstrap apparié)</h2>"
+            "<p>En gras : écarts dont l'intervalle ne contient pas 0.</p>"
+            f"<table><tr><th>Modèle</th>{header}</tr>{diff_rows}</table>"
+        )
+
+    image = base64.b64encode(png_bytes).decode("ascii")
+    return f"""<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8"><title>Rapport d'évaluation</title>
+<style>body{{font-family:sans-serif;margin:2em}}table{{border-collapse:collapse}}td,th{{border:1px solid #ccc;padding:4px 8px;text-align:right}}td:first-child{{text-align:left}}</style>
+</head><body>
+<h1>Rapport d'évaluation</h1>
+<p>{intervals['rows']} lignes évaluées, {table.samples} échantillon(s) par prompt, {intervals['resamples']} rééchantillonnages bootstrap.</p>
+<h2>Scores moyens (IC {level} %)</h2>
+<table><tr><th>Modèle</th>{header}</tr>{rows}</table>
+{differences}
+<h2>Graphiques</h2>
+<img src="data:image/png;base64,{image}" alt="Comparaison des scores" style="max-width:100%">
+</body></html>
+"""
+
+
+def write_report(table, output_dir, name="report", reference=None, num_resamples=DEFAULT_RESAMPLES,
+                 confidence=DEFAULT_CONFIDENCE, seed=0):
+    """Écrit <name>.png, <name>.html et <name>_ci.json dans output_dir ; retourne les intervalles de confiance."""
+    if reference is not None and reference not in table.models:
+        raise ValueError(f"Le modèle de référence {reference} n'a pas été évalué.")
+    os.makedirs(output_dir, exist_ok=True)
+
+    intervals = table.bootstrap(reference, num_resamples, confidence, seed)
+    fig = plot_comparison(table.summary(), intervals)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    plt.close(fig)
+
+    base = os.path.join(output_dir, name)
+    with open(base + ".png", "wb") as f:
+        f.write(buffer.getvalue())
+    with open(base + ".html", "w", encoding="utf-8") as f:
+        f.write(render_html(table, intervals, buffer.getvalue(), reference))
+    with open(base + "_ci.json", "w", encoding="utf-8") as f:
+        json.dump(intervals, f, indent=2, ensure_ascii=False)
+
+    print(f"Rapport enregistré : {base}.html ({base}.png, {base}_ci.json)")
+    return intervals
+
+
+def print_differences(intervals, reference):
+    """Affiche les écarts au modèle de référence et leurs intervalles de confiance."""
+    level = int(round(intervals["confidence"] * 100))
+    for model, scores in intervals["differences"].items():
+        print(f"{model} - {reference} (IC {level} %) :")
+        for metric, ci in scores.items():
+            verdict = "gain significatif" if ci["low"] > 0 else "perte significative" if ci["high"] < 0 else "non significatif"
+            print(f"   {METRIC_LABELS.get(metric, metric):<8} {ci['mean']:+.4f} [{ci['low']:+.4f} ; {ci['high']:+.4f}]  {verdict}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Générer le rapport d'une évaluation enregistrée (sans relancer l'inférence).")
+    parser.add_argument("results", type=str, help="Fichier .npz des résultats (data/results/<fichier>_results.npz)")
+    parser.add_argument("--reference", type=str, help="Modèle de référence pour les écarts (par défaut : dernier modèle évalué)")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES, help="Nombre de rééchantillonnages bootstrap")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="Niveau de confiance des intervalles")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du bootstrap")
+    parser.add_argument("--output_dir", type=str, help="Dossier du rapport (par défaut : celui des résultats)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with session(args):
+        table = ResultsTable.load(args.results)
+        reference = args.reference or table.models[-1]
+        output_dir = args.output_dir or os.path.dirname(args.results) or "."
+        name = os.path.splitext(os.path.basename(args.results))[0] + "_report"
+
+        with telemetry.span("report.write"), telemetry.profile("report"):
+            intervals = write_report(table, output_dir, name, reference, args.resamples, args.confidence, args.seed)
+        print_differences(intervals, reference)
@@ -0,0 +1,185 @@
+# Table de résultats d'évaluation en colonnes : modèles × lignes × échantillons × métriques
+
+import os
+import json
+import time
+import numpy as np
+from metrics import METRICS
+
+# Nombre de rééchantillonnages bootstrap traités par lot (une matrice lot × lignes en mémoire)
+BOOTSTRAP_BATCH = 256
+
+
+def encode_strings(strings):
+    """Encode une liste de textes en un bloc UTF-8 et un tableau d'offsets (stockage en colonnes sans pickle)."""
+    encoded = [(s or "").encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(data, offsets):
+    """Inverse de encode_strings."""
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def sidecar_path(path):
+    """Chemin du fichier JSON décrivant un fichier .npz de résultats."""
+    return os.path.splitext(path)[0] + ".json"
+
+
+class ResultsTable:
+    """Scores d'une évaluation dans un seul tableau numpy.
+
+    scores[m, r, s, k] est la métrique k de l'échantillon s généré par le modèle m
+    pour la ligne r ; les cases non encore évaluées valent NaN. Les réponses générées
+    (generations[m, r, s]), les questions et les réponses attendues sont gardées à côté.
+    """
+
+    def __init__(self, models, num_rows, samples=1, metrics=METRICS, questions=None, references=None):
+        self.models = list(models)
+        self.metrics = list(metrics)
+        self.num_rows = num_rows
+        self.samples = samples
+        self.scores = np.full((len(self.models), num_rows, samples, len(self.metrics)), np.nan)
+        self.generations = np.full((len(self.models), num_rows, samples), "", dtype=object)
+        self.questions = list(questions) if questions is not None else [""] * num_rows
+        self.references = list(references) if references is not None else [""] * num_rows
+        self.metadata = {}
+
+    def set_row(self, row, scores, generations=None):
+        """Enregistre les scores d'une ligne : dictionnaire métrique -> tableau (modèles × échantillons)."""
+        for k, metric in enumerate(self.metrics):
+            self.scores[:, row, :, k] = np.asarray(scores[metric], dtype=float).reshape(len(self.models), self.samples)
+        if generations is not None:
+            self.generations[:, row, :] = np.array(generations, dtype=object).reshape(len(self.models), self.samples)
+
+    def row_record(self, row):
+        """Scores d'une ligne sous forme {modèle: {métrique: [échantillons]}} (pour le fichier JSONL)."""
+        return {
+            model: {metric: self.scores[m, row, :, k].tolist() for k, metric in enumerate(self.metrics)}
+            for m, model in enumerate(self.models)
+        }
+
+    def set_row_record(self, row, record):
+        """Inverse de row_record (reprise d'une évaluation)."""
+        for m, model in enumerate(self.models):
+            for k, metric in enumerate(self.metrics):
+                self.scores[m, row, :, k] = record[model][metric]
+
+    def completed_rows(self):
+        """Masque des lignes entièrement évaluées."""
+        return ~np.isnan(self.scores).any(axis=(0, 2, 3))
+
+    def means(self):
+        """Moyenne de chaque métrique par modèle (sur les lignes et les échantillons évalués) : tableau modèles × métriques."""
+        done = self.completed_rows()
+        if not done.any():
+            return np.full((len(self.models), len(self.metrics)), np.nan)
+        return self.scores[:, done].mean(axis=(1, 2))
+
+    def summary(self):
+        """Moyennes sous forme {modèle: {métrique: valeur}}."""
+        means = self.means()
+        return {
+            model: {metric: float(means[m, k]) for k, metric in enumerate(self.metrics)}
+            for m, model in enumerate(self.models)
+        }
+
+    def bootstrap(self, reference=None, num_resamples=1000, confidence=0.95, seed=0, batch_size=BOOTSTRAP_BATCH):
+        """Intervalles de confiance bootstrap des moyennes, et des écarts à un modèle de référence.
+
+        Les lignes sont rééchantillonnées (les échantillons d'une ligne restent ensemble) ;
+        les mêmes tirages servent à tous les modèles, ce qui donne un test apparié des
+        écarts. Chaque lot de tirages est une matrice de poids multinomiaux multipliée
+        par la matrice lignes × (modèles, métriques). Retourne
+        {"means": {modèle: {métrique: {mean, low, high}}}, "differences": {modèle: {métrique: {mean, low, high, p_gain}}}}.
+        """
+        done = self.completed_rows()
+        n = int(done.sum())
+        num_models, num_metrics = len(self.models), len(self.metrics)
+        per_row = self.scores[:, done].mean(axis=2)  # modèles × lignes × métriques
+        values = per_row.transpose(1, 0, 2).reshape(n, num_models * num_metrics)
+
+        rng = np.random.default_rng(seed)
+        boot = np.empty((num_resamples, num_models, num_metrics))
+        if n:
+            uniform = np.full(n, 1.0 / n)
+            for start in range(0, num_resamples, batch_size):
+                size = min(batch_size, num_resamples - start)
+                weights = rng.multinomial(n, uniform, size=size) / n
+                boot[start:start + size] = (weights @ values).reshape(size, num_models, num_metrics)
+        else:
+            boot[:] = np.nan
+
+        tail = (1 - confidence) / 2 * 100
+        means = per_row.mean(axis=1) if n else np.full((num_models, num_metrics), np.nan)
+
+        def interval(point, samples):
+            low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+            return point, low, high
+
+        result = {"confidence": confidence, "resamples": num_resamples, "rows": n, "means": {}, "differences": {}}
+        point, low, high = interval(means, boot)
+        for m, model in enumerate(self.models):
+            result["means"][model] = {
+                metric: {"mean": float(point[m, k]), "low": float(low[m, k]), "high": float(high[m, k])}
+                for k, metric in enumerate(self.metrics)
+            }
+
+        if reference is not None:
+            r = self.models.index(reference)
+            diffs = boot - boot[:, r:r + 1]
+            point, low, high = interval(means - means[r], diffs)
+            p_gain = (diffs > 0).mean(axis=0)
+            for m, model in enumerate(self.models):
+                if m == r:
+                    continue
+                result["differences"][model] = {
+                    metric: {"mean": float(point[m, k]), "low": float(low[m, k]), "high": float(high[m, k]),
+                             "p_gain": float(p_gain[m, k])}
+                    for k, metric in enumerate(self.metrics)
+                }
+        return result
+
+    def save(self, path, **metadata):
+        """Enregistre la table dans path (.npz) et ses métadonnées dans un fichier JSON à côté."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        gen_data, gen_offsets = encode_strings(self.generations.ravel().tolist())
+        q_data, q_offsets = encode_strings(self.questions)
+        ref_data, ref_offsets = encode_strings(self.references)
+        np.savez_compressed(
+            path, scores=self.scores,
+            generations=gen_data, generation_offsets=gen_offsets,
+            questions=q_data, question_offsets=q_offsets,
+            references=ref_data, reference_offsets=ref_offsets,
+        )
+        sidecar = {
+            "models": self.models,
+            "metrics": self.metrics,
+            "rows": self.num_rows,
+            "samples": self.samples,
+            "completed_rows": int(self.completed_rows().sum()),
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "summary": self.summary(),
+            **metadata,
+        }
+        with open(sidecar_path(path), "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """Recharge une table enregistrée avec save ; les métadonnées sont dans table.metadata."""
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        with np.load(path) as arrays:
+            table = cls(metadata["models"], metadata["rows"], metadata["samples"], metadata["metrics"],
+                        decode_strings(arrays["questions"], arrays["question_offsets"]),
+                        decode_strings(arrays["references"], arrays["reference_offsets"]))
+            table.scores = arrays["scores"]
+            generations = decode_strings(arrays["generations"], arrays["generation_offsets"])
+            table.generations = np.array(generations, dtype=object).reshape(table.generations.shape)
+        table.metadata = metadata
+        return table
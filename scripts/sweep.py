@@ -0,0 +1,299 @@
+# Balayage d'hyperparamètres : plusieurs jobs de fine-tuning suivis ensemble, avec arrêt anticipé
+
+import os
+import json
+import math
+import time
+import random
+import argparse
+import getpass
+import itertools
+import wandb
+from mistral import Mistral
+from hyperparams import DEFAULT_HYPERPARAMS
+from job_monitor import TERMINAL_STATUSES, WANDB_PROJECT, JobMonitor, MetricsLogger, print_checkpoints
+from model_registry import ModelRegistry
+from telemetry import add_arguments, session, telemetry
+
+# Dossier des résumés de balayage
+SWEEPS_DIR = "data/sweeps"
+
+# Espace de recherche par défaut : listes de valeurs (grille ou tirage), ou intervalles {"min", "max", "log"}
+DEFAULT_SEARCH_SPACE = {
+    "training_steps": [10, 20],
+    "learning_rate": [1e-5, 5e-5, 1e-4],
+    "weight_decay": [0.0, 0.1],
+    "warmup_fraction": [0.05],
+}
+
+# Nombre maximal de jobs en cours en même temps
+DEFAULT_MAX_CONCURRENT = 2
+
+# Un job est arrêté si sa valid_loss dépasse de plus de 10 % la meilleure obtenue à la même étape
+DEFAULT_MARGIN = 0.1
+
+# Étape à partir de laquelle l'arrêt anticipé est possible
+DEFAULT_MIN_STEP = 2
+
+INTEGER_PARAMS = {"training_steps"}
+
+
+def grid_configs(space):
+    """Toutes les combinaisons d'une grille (chaque paramètre doit être une liste de valeurs)."""
+    for name, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f"Recherche en grille : le paramètre {name} doit être une liste de valeurs.")
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_configs(space, num_trials, seed=0):
+    """Tire num_trials configurations : valeur d'une liste, ou valeur uniforme (log-uniforme si "log") d'un intervalle."""
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_trials):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, list):
+                value = rng.choice(values)
+            elif values.get("log"):
+                value = math.exp(rng.uniform(math.log(values["min"]), math.log(values["max"])))
+            else:
+                value = rng.uniform(values["min"], values["max"])
+            config[name] = int(round(value)) if name in INTEGER_PARAMS else value
+        configs.append(config)
+    return configs
+
+
+class Sweep:
+    """Lance les configurations d'un balayage (au plus max_concurrent jobs à la fois) et les suit ensemble.
+
+    Tous les jobs sont suivis par un seul JobMonitor. La valid_loss de chaque job est
+    comparée à la meilleure valid_loss observée à la même étape (y compris quand un
+    autre job atteint cette étape plus tard) : au-delà de (1 + margin) fois celle-ci,
+    le job est annulé. Quand un job se termine, la configuration suivante est soumise.
+    """
+
+    def __init__(self, client, configs, train_file_id, validation_file_id, model="open-mistral-7b",
+                 max_concurrent=DEFAULT_MAX_CONCURRENT, margin=DEFAULT_MARGIN, min_step=DEFAULT_MIN_STEP,
+                 logger=None, verbose=True, **monitor_kwargs):
+        self.client = client
+        self.configs = list(configs)
+        self.train_file_id = train_file_id
+        self.validation_file_id = validation_file_id
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self.margin = margin
+        self.min_step = min_step
+        self.logger = logger
+        self.verbose = verbose
+        self.monitor = JobMonitor(client, on_checkpoints=self._on_checkpoints, on_finish=self._on_finish, **monitor_kwargs)
+
+        self.runs = {}
+        self.best_by_step = {}
+        self._next_config = 0
+
+    def _submit_next(self):
+        """Soumet la prochaine configuration, s'il en reste."""
+        if self._next_config >= len(self.configs):
+            return
+        config = self.configs[self._next_config]
+        self._next_config += 1
+        hyperparams = {**DEFAULT_HYPERPARAMS, **config}
+
+        jobs = self.client.fine_tuning.jobs
+        with telemetry.span("api.jobs.create"):
+            created_job = jobs.create(
+                model=self.model,
+                training_files=[{"file_id": self.train_file_id, "weight": 1}],
+                validation_files=[self.validation_file_id],
+                hyperparameters=hyperparams,
+                auto_start=False
+            )
+            jobs.start(job_id=created_job.id)
+
+        self.runs[created_job.id] = {
+            "job_id": created_job.id,
+            "hyperparameters": hyperparams,
+            "status": "QUEUED",
+            "stopped_early": False,
+            "history": [],
+            "losses": {},
+        }
+        self.monitor.watch(created_job.id)
+        if self.verbose:
+            print(f"Job soumis : {created_job.id} {config}")
+
+    def _on_checkpoints(self, job_id, checkpoints):
+        run = self.runs[job_id]
+        if self.verbose:
+            print_checkpoints(job_id, checkpoints)
+        if self.logger:
+            self.logger(job_id, checkpoints)
+
+        for checkpoint in checkpoints:
+            step, valid_loss = checkpoint.step_number, checkpoint.metrics.valid_loss
+            run["history"].append({"step": step, "train_loss": checkpoint.metrics.train_loss, "valid_loss": valid_loss})
+            if valid_loss is None:
+                continue
+            run["losses"][step] = valid_loss
+
+            best = self.best_by_step.get(step)
+            if best is None or valid_loss < best:
+                # Nouveau meilleur à cette étape : réévaluer les jobs en cours qui l'ont déjà atteinte
+                self.best_by_step[step] = valid_loss
+                for other_id in list(self.runs):
+                    if other_id != job_id and step in self.runs[other_id]["losses"]:
+                        self._check(other_id, step)
+            else:
+                self._check(job_id, step)
+
+    def _check(self, job_id, step):
+        """Annule un job en cours dont la valid_loss à cette étape dépasse la meilleure de plus de margin."""
+        run = self.runs[job_id]
+        valid_loss, best = run["losses"][step], self.best_by_step[step]
+        if step < self.min_step or run["stopped_early"] or run["status"] in TERMINAL_STATUSES:
+            return
+        if valid_loss > best * (1 + self.margin):
+            # Trop loin du meilleur run à la même étape : arrêter le job pour libérer la place
+            run["stopped_early"] = True
+            run["stopped_at"] = {"step": step, "valid_loss": valid_loss, "best_valid_loss": best}
+            self.client.fine_tuning.jobs.cancel(job_id=job_id)
+            telemetry.increment("sweep_early_stops_total")
+            if self.verbose:
+                print(f"[{job_id}] Arrêt anticipé à l'étape {step} : valid_loss {valid_loss:.4f} > meilleure {best:.4f} (+{self.margin:.0%})")
+
+    def _on_finish(self, job_id, job):
+        run = self.runs[job_id]
+        run["status"] = job.status
+        run["fine_tuned_model"] = job.fine_tuned_model
+        if self.verbose:
+            print(f"[{job_id}] Terminé : {job.status}")
+        if self.logger:
+            self.logger.flush()
+        self._submit_next()
+
+    def run(self):
+        """Exécute le balayage jusqu'au dernier job et retourne le résumé."""
+        start = time.monotonic()
+        for _ in range(min(self.max_concurrent, len(self.configs))):
+            self._submit_next()
+        try:
+            with telemetry.profile("sweep"):
+                self.monitor.run()
+        finally:
+            if self.logger:
+                self.logger.flush()
+        return self.summary(time.monotonic() - start)
+
+    def summary(self, elapsed=None):
+        """Résultats de chaque run, du meilleur au moins bon (dernière valid_loss).
+
+        Les runs terminés (SUCCESS) sont classés avant les autres. Le meilleur run est le
+        meilleur des runs terminés, ou à défaut des runs arrêtés avec une valid_loss.
+        """
+        runs = []
+        for run in self.runs.values():
+            losses = [h["valid_loss"] for h in run["history"] if h["valid_loss"] is not None]
+            runs.append({
+                **{key: value for key, value in run.items() if key not in ("history", "losses")},
+                "steps": run["history"][-1]["step"] if run["history"] else 0,
+                "final_valid_loss": losses[-1] if losses else None,
+                "best_valid_loss": min(losses) if losses else None,
+                "history": run["history"],
+            })
+        runs.sort(key=lambda r: (r["status"] != "SUCCESS", r["stopped_early"],
+                                 r["final_valid_loss"] is None, r["final_valid_loss"] or 0))
+        completed = [r for r in runs if r["status"] == "SUCCESS" and r["final_valid_loss"] is not None]
+        scored = completed or [r for r in runs if r["final_valid_loss"] is not None]
+        return {
+            "configs": len(self.configs),
+            "stopped_early": sum(r["stopped_early"] for r in runs),
+            "api_polls": self.monitor.polls,
+            "seconds": elapsed,
+            "best": scored[0] if scored else None,
+            "runs": runs,
+        }
+
+
+def print_summary(summary):
+    """Affiche le classement des runs."""
+    print(f"\nBalayage : {summary['configs']} configurations, {summary['stopped_early']} arrêtées tôt, "
+          f"{summary['api_polls']} interrogations de l'API")
+    for rank, run in enumerate(summary["runs"], 1):
+        h = run["hyperparameters"]
+        loss = f"{run['final_valid_loss']:.4f}" if run["final_valid_loss"] is not None else "-"
+        flag = " (arrêt anticipé)" if run["stopped_early"] else ""
+        print(f"{rank:>3}. valid_loss {loss} | étapes {run['steps']:>4} | lr {h['learning_rate']:.2e} | "
+              f"wd {h['weight_decay']} | warmup {h['warmup_fraction']} | {run['status']}{flag}")
+    best = summary["best"]
+    if best:
+        flag = " (aucun run terminé : meilleur run arrêté)" if best["status"] != "SUCCESS" else ""
+        print(f"\nMeilleur run : {best['job_id']} ({best['fine_tuned_model']}){flag}")
+
+
+def save_summary(summary, name, sweeps_dir=SWEEPS_DIR):
+    """Écrit le résumé du balayage dans data/sweeps/<name>.json."""
+    os.makedirs(sweeps_dir, exist_ok=True)
+    path = os.path.join(sweeps_dir, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def record_runs(client, summary, name):
+    """Ajoute les jobs terminés au registre des modèles, avec le tag sweep:<name>."""
+    registry = ModelRegistry()
+    for run in summary["runs"]:
+        if run["status"] == "SUCCESS":
+            registry.record(client.fine_tuning.jobs.get(job_id=run["job_id"]), save=False)
+            tags = registry.models[run["job_id"]]["tags"]
+            if f"sweep:{name}" not in tags:
+                tags.append(f"sweep:{name}")
+    registry.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Balayage d'hyperparamètres de fine-tuning Mistral.")
+    parser.add_argument("train_file_id", type=str, help="ID du fichier d'entraînement sur Mistral")
+    parser.add_argument("validation_file_id", type=str, help="ID du fichier de validation sur Mistral")
+    parser.add_argument("--space", type=str, help="Fichier JSON de l'espace de recherche (par défaut : DEFAULT_SEARCH_SPACE)")
+    parser.add_argument("--random", type=int, help="Nombre de configurations tirées au hasard (par défaut : grille complète)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du tirage aléatoire")
+    parser.add_argument("--max_concurrent", type=int, default=DEFAULT_MAX_CONCURRENT, help="Nombre maximal de jobs simultanés")
+    parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN, help="Écart relatif de valid_loss au meilleur run déclenchant l'arrêt")
+    parser.add_argument("--min_step", type=int, default=DEFAULT_MIN_STEP, help="Première étape où l'arrêt anticipé est possible")
+    parser.add_argument("--name", type=str, default=time.strftime("sweep_%Y%m%d_%H%M%S"), help="Nom du balayage (résumé et tag du registre)")
+    parser.add_argument("--dry_run", action="store_true", help="Simuler les jobs avec l'API factice (sans clé ni coût)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    space = DEFAULT_SEARCH_SPACE
+    if args.space:
+        with open(args.space, "r", encoding="utf-8") as f:
+            space = json.load(f)
+    configs = random_configs(space, args.random, args.seed) if args.random else grid_configs(space)
+
+    logger = None
+    if args.dry_run:
+        from mistral_stub import FakeJobs, StubMistral
+        client = StubMistral(jobs=FakeJobs(seconds_per_step=0.05))
+        monitor_kwargs = {"min_interval": 0.02, "max_interval": 0.5}
+    else:
+        client = Mistral(api_key=getpass.getpass("Entrez votre clé API Mistral : "))
+        wandb.login(key=getpass.getpass("Entrez votre clé API WandB : "))
+        wandb.init(project=WANDB_PROJECT, name=args.name)
+        logger = MetricsLogger(prefix_jobs=True)
+        monitor_kwargs = {}
+
+    with session(args):
+        sweep = Sweep(client, configs, args.train_file_id, args.validation_file_id, max_concurrent=args.max_concurrent,
+                      margin=args.margin, min_step=args.min_step, logger=logger, **monitor_kwargs)
+        summary = sweep.run()
+        print_summary(summary)
+        print(f"Résumé enregistré : {save_summary(summary, args.name)}")
+
+        if not args.dry_run:
+            telemetry.log_to_wandb()
+            wandb.finish()
+            record_runs(client, summary, args.name)
@@ -0,0 +1,277 @@
+# Mesures de performance communes à tous les scripts : durées, latences de l'API, compteurs
+#
+# Désactivée par défaut : span(), observe() et increment() ne coûtent alors qu'un test.
+# Activée (--telemetry / --profile), elle exporte ses mesures en JSON ou au format texte
+# de Prometheus, et dans le run WandB en cours s'il y en a un.
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import cProfile
+import pstats
+import threading
+from array import array
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+# Dossier par défaut des profils cProfile (--profile sans argument)
+PROFILE_DIR = "data/profiles"
+
+# Percentiles exportés pour chaque histogramme
+QUANTILES = (50, 90, 99)
+
+# Nombre de fonctions listées dans le résumé texte d'un profil
+PROFILE_TOP = 30
+
+# Valeurs gardées par histogramme pour les percentiles (échantillon uniforme, 8 octets chacune) :
+# la mémoire reste bornée quelle que soit la durée du script
+RESERVOIR_SIZE = 4096
+
+_NULL_SPAN = nullcontext()
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _escape(value):
+    """Échappe une valeur d'étiquette Prometheus."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Histogram:
+    """Nombre, somme, minimum et maximum exacts, et échantillon uniforme borné des valeurs (algorithme R)."""
+
+    __slots__ = ("count", "sum", "min", "max", "values", "_random")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.values = array("d")
+        self._random = random.Random(0)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.values) < RESERVOIR_SIZE:
+            self.values.append(value)
+        else:
+            i = self._random.randrange(self.count)
+            if i < RESERVOIR_SIZE:
+                self.values[i] = value
+
+    def summary(self):
+        """Résumé exporté : nombre, somme, moyenne, extrêmes et percentiles (estimés sur l'échantillon)."""
+        summary = {"count": self.count, "sum": self.sum}
+        if self.count:
+            summary.update(mean=self.sum / self.count, min=self.min, max=self.max)
+            values = np.frombuffer(self.values, dtype=np.float64)
+            summary.update({f"p{q}": float(v) for q, v in zip(QUANTILES, np.percentile(values, QUANTILES))})
+        return summary
+
+
+class _Span:
+    """Chronomètre d'un bloc ; la durée est enregistrée dans l'histogramme span_seconds."""
+
+    __slots__ = ("telemetry", "labels", "start")
+
+    def __init__(self, telemetry, labels):
+        self.telemetry = telemetry
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.telemetry.observe("span_seconds", time.perf_counter() - self.start, **self.labels)
+
+
+class Telemetry:
+    """Registre de compteurs et d'histogrammes, partagé entre les threads.
+
+    Les mesures sont identifiées par un nom et des étiquettes (ex. : model="open-mistral-7b") ;
+    chaque histogramme garde au plus RESERVOIR_SIZE valeurs pour estimer ses percentiles.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profile_dir = None
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def enable(self, profile_dir=None):
+        """Active les mesures (et le profilage des boucles principales si profile_dir est donné)."""
+        self.enabled = True
+        self.profile_dir = profile_dir
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def span(self, name, **labels):
+        """Contexte mesurant la durée d'un bloc (étape, appel à l'API) : with telemetry.span("split"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, {"span": name, **labels})
+
+    def observe(self, name, value, **labels):
+        """Ajoute une valeur à un histogramme (latence, tokens par seconde...)."""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram()
+            histogram.add(value)
+
+    def increment(self, name, value=1, **labels):
+        """Incrémente un compteur (retries, réponses en cache...)."""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def profile(self, name):
+        """Profile un bloc avec cProfile si le profilage est activé.
+
+        Écrit <profile_dir>/<name>.prof (lisible avec pstats ou snakeviz) et un résumé
+        <name>.txt des fonctions les plus coûteuses (temps cumulé).
+        """
+        if not self.profile_dir:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif (boucle profilée imbriquée dans une autre)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            base = os.path.join(self.profile_dir, name)
+            profiler.dump_stats(base + ".prof")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            print(f"Profil enregistré : {base}.prof ({base}.txt)")
+
+    # Export
+
+    def snapshot(self):
+        """Mesures sous forme de dictionnaire : compteurs, et résumé de chaque histogramme."""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: histogram.summary() for key, histogram in self.histograms.items()}
+
+        result = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration_seconds": time.time() - self.started,
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(counters.items())],
+            "histograms": [],
+        }
+        for (name, labels), summary in sorted(histograms.items()):
+            result["histograms"].append({"name": name, "labels": dict(labels), **summary})
+        return result
+
+    def to_prometheus(self, snapshot=None):
+        """Mesures au format texte de Prometheus (compteurs et histogrammes en type summary)."""
+        snapshot = snapshot or self.snapshot()
+
+        def series(name, labels, extra=None):
+            labels = {**labels, **(extra or {})}
+            body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            return f"{_INVALID_NAME.sub('_', name)}{{{body}}}" if body else _INVALID_NAME.sub("_", name)
+
+        lines, typed = [], set()
+        for counter in snapshot["counters"]:
+            if counter["name"] not in typed:
+                lines.append(f"# TYPE {_INVALID_NAME.sub('_', counter['name'])} counter")
+                typed.add(counter["name"])
+            lines.append(f"{series(counter['name'], counter['labels'])} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = histogram["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {_INVALID_NAME.sub('_', name)} summary")
+                typed.add(name)
+            for q in QUANTILES:
+                if f"p{q}" in histogram:
+                    lines.append(f"{series(name, histogram['labels'], {'quantile': q / 100})} {histogram[f'p{q}']}")
+            lines.append(f"{series(name + '_sum', histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{series(name + '_count', histogram['labels'])} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Écrit les mesures dans path : format Prometheus pour .prom/.txt, JSON sinon."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        snapshot = self.snapshot()
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus(snapshot))
+            else:
+                json.dump(snapshot, f, indent=2, ensure_ascii=False)
+        print(f"Mesures enregistrées : {path}")
+        return snapshot
+
+    def log_to_wandb(self):
+        """Envoie le résumé des mesures au run WandB en cours (si wandb est utilisé par le script)."""
+        wandb = sys.modules.get("wandb")
+        if not self.enabled or wandb is None or getattr(wandb, "run", None) is None:
+            return False
+
+        def label(entry):
+            return entry["name"] + "".join(f"/{v}" for v in entry["labels"].values())
+
+        snapshot = self.snapshot()
+        data = {f"telemetry/{label(c)}": c["value"] for c in snapshot["counters"]}
+        for h in snapshot["histograms"]:
+            for stat in ("count", "mean", *(f"p{q}" for q in QUANTILES)):
+                if stat in h:
+                    data[f"telemetry/{label(h)}/{stat}"] = h[stat]
+        wandb.log(data)
+        return True
+
+
+# Registre partagé par tous les modules
+telemetry = Telemetry()
+
+
+def add_arguments(parser):
+    """Ajoute les options --telemetry et --profile à un parseur argparse."""
+    parser.add_argument("--telemetry", type=str, help="Fichier où exporter les mesures de performance (.json, ou .prom pour Prometheus)")
+    parser.add_argument("--profile", type=str, nargs="?", const=PROFILE_DIR,
+                        help=f"Profiler la boucle principale avec cProfile (dossier des profils, {PROFILE_DIR} par défaut)")
+
+
+@contextmanager
+def session(args):
+    """Active les mesures selon les options --telemetry / --profile, et les exporte à la fin du script."""
+    if args.telemetry or args.profile:
+        telemetry.enable(profile_dir=args.profile)
+    try:
+        yield telemetry
+    finally:
+        if args.telemetry:
+            telemetry.export(args.telemetry)
+            telemetry.log_to_wandb()
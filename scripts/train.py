@@ -1,23 +1,17 @@
-import os
-import time
 import argparse
 import getpass
 import wandb
 from mistral import Mistral
+from job_monitor import WANDB_PROJECT, MetricsLogger, monitor_jobs
+from model_registry import ModelRegistry
+from telemetry import add_arguments, session, telemetry
+from hyperparams import DEFAULT_HYPERPARAMS
 
-# Définir les hyperparamètres par défaut
-DEFAULT_HYPERPARAMS = {
-    "training_steps": 10,
-    "learning_rate": 0.0001,
-    "weight_decay": 0.1,
-    "warmup_fraction": 0.05,
-}
-
-def train_mistral(api_key, wandb_key, train_file_id, validation_file_id, hyperparams):
+def train_mistral(api_key, wandb_key, train_file_id, validation_file_id, hyperparams, client=None):
     """Crée et lance un job de fine-tuning sur Mistral AI tout en loggant avec WandB."""
 
     # Initialiser le client Mistral
-    client = Mistral(api_key=api_key)
+    client = client or Mistral(api_key=api_key)
 
     # Créer un job de fine-tuning
     created_job = client.fine_tuning.jobs.create(
@@ -36,48 +30,19 @@ def train_mistral(api_key, wandb_key, train_file_id, validation_file_id, hyperpa
 
     # Initialiser WandB
     wandb.login(key=wandb_key)
-    wandb.init(project="mistral-finetuning", name="Medical")
-
-    # Stocker les étapes déjà enregistrées pour éviter les doublons
-    logged_steps = set()
-
-    while True:
-        job_status = client.fine_tuning.jobs.get(job_id=created_job.id)
-
-        # Vérifier s'il y a des checkpoints
-        if job_status.checkpoints:
-            checkpoint = job_status.checkpoints[0]
-            step = checkpoint.step_number
-
-            if step not in logged_steps:
-                train_loss = checkpoint.metrics.train_loss
-                valid_loss = checkpoint.metrics.valid_loss
-                accuracy = checkpoint.metrics.valid_mean_token_accuracy
-
-                # Envoyer les métriques à WandB
-                wandb.log({
-                    "step": step,
-                    "training_loss": train_loss,
-                    "validation_loss": valid_loss,
-                    "validation_accuracy": accuracy
-                })
+    wandb.init(project=WANDB_PROJECT, name="Medical")
 
-                print(f"Step {step} | Train Loss: {train_loss:.4f} | Val Loss: {valid_loss:.4f} | Val Acc: {accuracy:.4f}")
+    # Suivre le job jusqu'à la fin : chaque nouveau checkpoint est affiché et envoyé à WandB
+    job = monitor_jobs(client, [created_job.id], logger=MetricsLogger())[created_job.id]
 
-                logged_steps.add(step)
-
-        else:
-            print("Aucun checkpoint disponible...")
-
-        # Vérifier si le job est terminé
-        if job_status.status in ["FAILED_VALIDATION", "STOPPED", "SUCCESS"]:
-            break
-
-        time.sleep(1)  # Vérifier toutes les secondes
-
-    # Fin du run WandB
+    # Fin du run WandB (avec les mesures de performance si elles sont activées)
+    telemetry.log_to_wandb()
     wandb.finish()
-    print("Entraînement terminé.")
+    print(f"Entraînement terminé : {job.status}")
+
+    # Enregistrer le job dans le registre local (infer.py et evaluate.py le trouveront sans appel à l'API)
+    ModelRegistry().record(job)
+    return job
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fine-tuning d'un modèle Mistral avec suivi WandB.")
@@ -87,6 +52,7 @@ if __name__ == "__main__":
     parser.add_argument("--learning_rate", type=float, default=DEFAULT_HYPERPARAMS["learning_rate"], help="Taux d'apprentissage")
     parser.add_argument("--weight_decay", type=float, default=DEFAULT_HYPERPARAMS["weight_decay"], help="Pondération du déclin du poids")
     parser.add_argument("--warmup_fraction", type=float, default=DEFAULT_HYPERPARAMS["warmup_fraction"], help="Fraction de l'échauffement")
+    add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -103,4 +69,5 @@ if __name__ == "__main__":
     }
 
     # Lancer l'entraînement
-    train_mistral(api_key, wandb_key, args.train_file_id, args.validation_file_id, hyperparams)
+    with session(args):
+        train_mistral(api_key, wandb_key, args.train_file_id, args.validation_file_id, hyperparams)
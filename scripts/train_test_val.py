@@ -1,65 +1,156 @@
 import os
 import json
-import random
+import math
+import hashlib
 import argparse
+from array import array
+import numpy as np
+from jsonl_index import save_offsets
+from telemetry import add_arguments, session, telemetry
 
 # Définir les dossiers d'entrée et de sortie
 INPUT_DIR = "data/converted"
 OUTPUT_DIR = "data/processed"
 
+# Noms des ensembles générés, dans l'ordre des ratios
+SPLITS = ("train", "validation", "test")
+
+# Taille des tampons de lecture et d'écriture
+BUFFER_SIZE = 1 << 20
+
 # Vérifier et créer le dossier de sortie s'il n'existe pas
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def split_dataset(input_filename, train_ratio=0.9, val_ratio=0.05, test_ratio=0.05):
-    """Divise un fichier JSONL en ensembles d'entraînement, validation et test."""
+def get_field(line, path):
+    """Extrait un champ d'une ligne JSONL à partir d'un chemin pointé (ex : "messages.0.content")."""
+    value = json.loads(line)
+    for part in path.split("."):
+        value = value[int(part)] if isinstance(value, list) else value[part]
+    return value
+
+def row_hash(data, seed):
+    """Hache une clé (bytes) en un entier 64 bits reproductible, dépendant de la graine."""
+    digest = hashlib.blake2b(data, digest_size=8, key=seed.to_bytes(8, "little", signed=True)).digest()
+    return int.from_bytes(digest, "little")
+
+def row_key(line, key):
+    """Clé stable d'une ligne : la ligne brute, ou la valeur du champ demandé."""
+    if key is None:
+        return line.rstrip(b"\r\n")
+    value = get_field(line, key)
+    return value.encode("utf-8") if isinstance(value, str) else json.dumps(value, sort_keys=True).encode("utf-8")
+
+def iter_lines(input_path):
+    """Parcourt les lignes non vides d'un fichier JSONL, en octets bruts."""
+    with open(input_path, 'rb', buffering=BUFFER_SIZE) as f:
+        for line in f:
+            if line.strip():
+                yield line if line.endswith(b"\n") else line + b"\n"
+
+def assign_exact(input_path, ratios, seed, key, stratify):
+    """Attribue un ensemble à chaque ligne avec des proportions exactes (par strate si demandé).
+
+    Une première passe ne garde en mémoire qu'une empreinte de 8 octets et un identifiant
+    de strate par ligne ; les lignes de chaque strate sont ensuite ordonnées par empreinte
+    et découpées selon les ratios.
+    """
+    hashes = array("Q")
+    strata_ids = array("I")
+    strata = {}
+
+    for line in iter_lines(input_path):
+        hashes.append(row_hash(row_key(line, key), seed))
+        if stratify:
+            value = json.dumps(get_field(line, stratify), sort_keys=True)
+            strata_ids.append(strata.setdefault(value, len(strata)))
+
+    total_size = len(hashes)
+    hashes = np.frombuffer(hashes, dtype=np.uint64) if total_size else np.zeros(0, dtype=np.uint64)
+    strata_ids = np.frombuffer(strata_ids, dtype=np.uint32) if stratify and total_size else np.zeros(total_size, dtype=np.uint32)
+
+    # Trier par strate puis par empreinte, et calculer le rang de chaque ligne dans sa strate
+    order = np.lexsort((hashes, strata_ids))
+    sorted_strata = strata_ids[order]
+    rank = np.arange(total_size) - np.searchsorted(sorted_strata, sorted_strata, side="left")
+    stratum_size = np.bincount(strata_ids)[sorted_strata] if total_size else np.zeros(0, dtype=np.int64)
+
+    # Mêmes tailles que l'ancien découpage : int(n * ratio) pour train et validation, le reste en test
+    train_size = (stratum_size * ratios[0]).astype(np.int64)
+    val_size = (stratum_size * ratios[1]).astype(np.int64)
+
+    assignment = np.empty(total_size, dtype=np.uint8)
+    assignment[order] = np.where(rank < train_size, 0, np.where(rank < train_size + val_size, 1, 2))
+    return assignment
+
+def split_dataset(input_filename, train_ratio=0.9, val_ratio=0.05, test_ratio=0.05, seed=0, key=None,
+                  stratify=None, exact=False, input_dir=INPUT_DIR, output_dir=OUTPUT_DIR):
+    """Divise un fichier JSONL en ensembles d'entraînement, validation et test.
+
+    Le fichier n'est jamais chargé en mémoire et les lignes sont recopiées telles quelles.
+    Par défaut, chaque ligne est placée selon l'empreinte de sa clé (la ligne entière, ou
+    le champ key) : le découpage est identique d'une exécution à l'autre pour une même
+    graine, en une seule passe, avec des proportions approximatives. Avec exact=True ou
+    stratify (champ de stratification), les proportions sont exactes, dans chaque strate.
+    """
     
-    input_path = os.path.join(INPUT_DIR, input_filename)
+    input_path = os.path.join(input_dir, input_filename)
     base_filename = os.path.splitext(input_filename)[0]  # Récupérer le nom sans extension
 
     # Vérifier si le fichier existe
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Le fichier {input_path} n'existe pas.")
 
-    # Charger le fichier JSONL
-    dataset = []
-    with open(input_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            dataset.append(json.loads(line))  # Convertir chaque ligne JSON en dictionnaire
-
-    # Mélanger les données pour garantir une distribution aléatoire
-    random.shuffle(dataset)
-
     # Vérifier que la somme des ratios est bien égale à 1
     total_ratio = train_ratio + val_ratio + test_ratio
-    if total_ratio != 1:
+    if not math.isclose(total_ratio, 1):
         raise ValueError(f"Les ratios doivent totaliser 1 (actuellement : {total_ratio})")
 
-    # Calcul des tailles des ensembles
-    total_size = len(dataset)
-    train_size = int(total_size * train_ratio)
-    val_size = int(total_size * val_ratio)
-
-    # Division du dataset
-    train_data = dataset[:train_size]
-    val_data = dataset[train_size:train_size + val_size]
-    test_data = dataset[train_size + val_size:]
-
-    # Fonction pour enregistrer un dataset en JSONL
-    def save_jsonl(data, output_filename):
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for item in data:
-                f.write(json.dumps(item) + '\n')
-        print(f" Fichier créé : {output_path} ({len(data)} échantillons)")
-
-    # Sauvegarde des fichiers
-    save_jsonl(train_data, f"{base_filename}_train.jsonl")
-    save_jsonl(val_data, f"{base_filename}_validation.jsonl")
-    save_jsonl(test_data, f"{base_filename}_test.jsonl")
+    # Attribuer un ensemble (0 = train, 1 = validation, 2 = test) à chaque ligne
+    if exact or stratify:
+        with telemetry.span("split.assign_exact"):
+            assignment = iter(assign_exact(input_path, (train_ratio, val_ratio, test_ratio), seed, key, stratify).tolist())
+        choose = lambda line: next(assignment)
+    else:
+        train_limit = int(train_ratio * 2**64)
+        val_limit = int((train_ratio + val_ratio) * 2**64)
+
+        def choose(line):
+            h = row_hash(row_key(line, key), seed)
+            return 0 if h < train_limit else (1 if h < val_limit else 2)
+
+    # Recopier chaque ligne brute dans le fichier de son ensemble, en notant sa position
+    # (index des lignes écrit à côté de chaque fichier, pour l'accès direct sans relecture)
+    output_paths = [os.path.join(output_dir, f"{base_filename}_{split}.jsonl") for split in SPLITS]
+    files = [open(path, 'wb', buffering=BUFFER_SIZE) for path in output_paths]
+    offsets = [array("Q", [0]) for _ in SPLITS]
+    try:
+        with telemetry.span("split.write"), telemetry.profile("split"):
+            for line in iter_lines(input_path):
+                split = choose(line)
+                files[split].write(line)
+                offsets[split].append(offsets[split][-1] + len(line))
+    finally:
+        for f in files:
+            f.close()
+
+    for path, split_offsets in zip(output_paths, offsets):
+        save_offsets(path, np.frombuffer(split_offsets, dtype=np.uint64))
+        print(f" Fichier créé : {path} ({len(split_offsets) - 1} échantillons)")
+    return output_paths
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Diviser un fichier JSONL en ensembles train/val/test.")
     parser.add_argument("filename", type=str, help="Nom du fichier JSONL à diviser (doit être dans data/converted)")
+    parser.add_argument("--train_ratio", type=float, default=0.9, help="Proportion de l'ensemble d'entraînement")
+    parser.add_argument("--val_ratio", type=float, default=0.05, help="Proportion de l'ensemble de validation")
+    parser.add_argument("--test_ratio", type=float, default=0.05, help="Proportion de l'ensemble de test")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du découpage (même graine = mêmes ensembles)")
+    parser.add_argument("--key", type=str, help="Champ servant de clé stable (ex : messages.0.content) ; par défaut la ligne entière")
+    parser.add_argument("--stratify", type=str, help="Champ de stratification (ex : topic)")
+    parser.add_argument("--exact", action="store_true", help="Proportions exactes (deux lectures du fichier au lieu d'une)")
+    add_arguments(parser)
     args = parser.parse_args()
 
-    split_dataset(args.filename)
+    with session(args):
+        split_dataset(args.filename, args.train_ratio, args.val_ratio, args.test_ratio,
+                      seed=args.seed, key=args.key, stratify=args.stratify, exact=args.exact)
@@ -0,0 +1,34 @@
+# Manifeste des uploads : empreinte SHA-256 du contenu d'un fichier -> fichier distant (ID Mistral)
+
+import os
+import json
+import threading
+
+# Dossier des fichiers uploadés, où le manifeste est enregistré
+DATASET_DIR = "data/processed"
+
+# Manifeste local : empreinte du contenu -> ID du fichier distant
+MANIFEST_PATH = os.path.join(DATASET_DIR, "upload_manifest.json")
+
+_manifest_lock = threading.Lock()
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Charge le manifeste des fichiers déjà uploadés (vide s'il n'existe pas)."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest_entry(manifest_path, digest, entry):
+    """Ajoute une entrée au manifeste (écriture atomique, sûre entre threads)."""
+    with _manifest_lock:
+        manifest = load_manifest(manifest_path)
+        manifest[digest] = entry
+        if os.path.dirname(manifest_path):
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
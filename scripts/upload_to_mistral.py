@@ -1,33 +1,122 @@
 import os
+import time
+import hashlib
 import argparse
 import getpass
+from concurrent.futures import ThreadPoolExecutor
 from mistral import Mistral  # Assurez-vous que la librairie est installée
+from inference_engine import get_status_code, is_retryable, retry_delay
+from validate_jsonl import validate_file
+from upload_manifest import DATASET_DIR, MANIFEST_PATH, load_manifest, save_manifest_entry
+from telemetry import add_arguments, session, telemetry
 
-# Définir le dossier contenant les fichiers à uploader
-DATASET_DIR = "data/processed"
+# Nombre maximal de nouvelles tentatives après une erreur transitoire
+DEFAULT_MAX_RETRIES = 5
 
-def upload_file(client, file_path):
-    """Upload un fichier vers Mistral et retourne son ID."""
+def hash_file(file_path, validate=False):
+    """Calcule l'empreinte SHA-256 d'un fichier et, si demandé, le valide (validate_jsonl) pendant la même lecture.
+
+    La validation s'exécute dans le thread appelant, sans pool de processus : les
+    fichiers sont uploadés depuis plusieurs threads. Retourne (empreinte, liste des
+    erreurs {"line", "offset", "error"}).
+    """
+    if validate:
+        with telemetry.span("upload.validate"):
+            report = validate_file(file_path, digest=True)
+        return report["sha256"], report["errors"]
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f, telemetry.span("upload.hash"):
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest(), []
+
+def remote_file_exists(client, file_id, max_retries=DEFAULT_MAX_RETRIES):
+    """Vérifie que le fichier référencé dans le manifeste existe toujours côté Mistral.
+
+    Seule une réponse 404 signifie que le fichier a été supprimé : les erreurs transitoires
+    sont retentées, les autres sont propagées (plutôt que de renvoyer un doublon du fichier).
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            client.files.retrieve(file_id=file_id)
+            return True
+        except Exception as e:
+            if get_status_code(e) == 404:
+                return False
+            if attempt < max_retries and is_retryable(e):
+                telemetry.increment("api_retries_total", method="files.retrieve")
+                time.sleep(retry_delay(e, attempt))
+                continue
+            raise
+
+def upload_file(client, file_path, manifest_path=MANIFEST_PATH, max_retries=DEFAULT_MAX_RETRIES, validate=False, force=False):
+    """Upload un fichier vers Mistral et retourne son ID.
+
+    Un fichier dont le contenu figure déjà dans le manifeste n'est pas renvoyé (sauf avec force=True).
+    Les erreurs transitoires (429, 5xx, réseau) sont retentées avec un délai exponentiel.
+    """
     file_name = os.path.basename(file_path)
 
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Fichier introuvable : {file_path}")
 
-    try:
-        with open(file_path, "rb") as file_content:
-            uploaded_file = client.files.upload(
-                file={"file_name": file_name, "content": file_content}
-            )
-        print(f"Fichier uploadé : {file_name} (ID : {uploaded_file.id})")
-        return uploaded_file.id
-    except Exception as e:
-        print(f"Erreur lors de l'upload de {file_name} : {e}")
+    # Empreinte du contenu (et validation éventuelle) en une seule lecture
+    digest, errors = hash_file(file_path, validate=validate)
+    if errors:
+        print(f"{file_name} : {len(errors)} erreurs, upload annulé (python scripts/validate_jsonl.py --repair pour corriger)")
+        for error in errors[:10]:
+            print(f"   ligne {error['line']} (octet {error['offset']}) : {error['error']}")
         return None
 
+    if manifest_path and not force:
+        known = load_manifest(manifest_path).get(digest)
+        if known and remote_file_exists(client, known["file_id"], max_retries):
+            print(f"Fichier inchangé, déjà uploadé : {file_name} (ID : {known['file_id']})")
+            telemetry.increment("upload_skipped_total")
+            return known["file_id"]
+
+    for attempt in range(max_retries + 1):
+        try:
+            with open(file_path, "rb") as file_content, telemetry.span("api.files.upload"):
+                uploaded_file = client.files.upload(
+                    file={"file_name": file_name, "content": file_content}
+                )
+            break
+        except Exception as e:
+            if attempt < max_retries and is_retryable(e):
+                telemetry.increment("api_retries_total", method="files.upload")
+                delay = retry_delay(e, attempt)
+                print(f"Erreur transitoire lors de l'upload de {file_name} : {e} (nouvel essai dans {delay:.1f}s)")
+                time.sleep(delay)
+                continue
+            print(f"Erreur lors de l'upload de {file_name} : {e}")
+            return None
+
+    print(f"Fichier uploadé : {file_name} (ID : {uploaded_file.id})")
+    if manifest_path:
+        save_manifest_entry(manifest_path, digest, {
+            "file_id": uploaded_file.id,
+            "file_name": file_name,
+            "size": os.path.getsize(file_path),
+            "uploaded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+    return uploaded_file.id
+
+def upload_files(client, file_paths, **kwargs):
+    """Upload plusieurs fichiers en parallèle ; retourne leurs IDs dans le même ordre."""
+    with ThreadPoolExecutor(max_workers=max(1, len(file_paths))) as executor:
+        futures = [executor.submit(upload_file, client, path, **kwargs) for path in file_paths]
+        return [future.result() for future in futures]
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Uploader des fichiers vers Mistral AI.")
     parser.add_argument("train_file", type=str, help="Nom du fichier d'entraînement (dans data/processed)")
     parser.add_argument("validation_file", type=str, help="Nom du fichier de validation (dans data/processed)")
+    parser.add_argument("--validate", action="store_true", help="Valider chaque ligne (schéma messages) avant l'upload")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES, help="Nombre maximal de nouvelles tentatives")
+    parser.add_argument("--force", action="store_true", help="Ignorer le manifeste et renvoyer les fichiers")
+    add_arguments(parser)
     args = parser.parse_args()
 
     # Demander la clé API de Mistral de manière sécurisée
@@ -40,10 +129,13 @@ if __name__ == "__main__":
     train_path = os.path.join(DATASET_DIR, args.train_file)
     validation_path = os.path.join(DATASET_DIR, args.validation_file)
 
-    # Uploader les fichiers
-    train_file_id = upload_file(client, train_path)
-    validation_file_id = upload_file(client, validation_path)
+    # Uploader les fichiers en parallèle
+    with session(args):
+        train_file_id, validation_file_id = upload_files(
+            client, [train_path, validation_path],
+            max_retries=args.retries, validate=args.validate, force=args.force,
+        )
 
     print("\n Résumé de l'upload :")
     print(f"Train File ID      : {train_file_id}")
-    print(f"Validation File ID : {validation_file_id}")
\ No newline at end of file
+    print(f"Validation File ID : {validation_file_id}")
@@ -0,0 +1,295 @@
+# Validation (et réparation) rapide des fichiers JSONL au format chat {"messages": [...]}
+#
+# Les erreurs que Mistral ne signale qu'après l'upload (job FAILED_VALIDATION) sont
+# détectées localement : JSON invalide, octets non UTF-8, contenu vide ou NaN,
+# rôles inconnus ou dans le mauvais ordre. Le fichier est traité en parallèle par
+# plages d'octets.
+
+import os
+import json
+import math
+import shutil
+import hashlib
+import argparse
+import multiprocessing
+from file_chunks import byte_ranges, iter_range_lines
+from chat_format import WRITE_BUFFER_SIZE
+from telemetry import add_arguments, session, telemetry
+
+# Dossier des fichiers à valider
+DATASET_DIR = "data/processed"
+
+# Rôles acceptés dans les messages
+VALID_ROLES = {"system", "user", "assistant", "tool"}
+
+# Nombre d'erreurs affichées par fichier (toutes sont retournées et peuvent être enregistrées)
+DEFAULT_MAX_SHOWN = 20
+
+
+def _describe_content(content):
+    """Retourne un message d'erreur si le contenu d'un message n'est pas un texte non vide, sinon None."""
+    if isinstance(content, float) and math.isnan(content):
+        return "contenu NaN (cellule vide du fichier source ?)"
+    if not isinstance(content, str):
+        return f"contenu non textuel ({type(content).__name__})"
+    if not content.strip():
+        return "contenu vide"
+    return None
+
+
+def _is_valid_pair(messages):
+    """Cas le plus fréquent, vérifié sans boucle : une question user et une réponse assistant non vides."""
+    if len(messages) != 2:
+        return False
+    user, assistant = messages
+    return (type(user) is dict and type(assistant) is dict
+            and user.get("role") == "user" and assistant.get("role") == "assistant"
+            and type(user.get("content")) is str and type(assistant.get("content")) is str
+            and not user["content"].isspace() and not assistant["content"].isspace()
+            and user["content"] != "" and assistant["content"] != "")
+
+
+def check_example(entry):
+    """Liste de toutes les erreurs d'un exemple décodé (vide s'il est valide).
+
+    Ordre attendu : un message system facultatif en tête, puis la conversation commence
+    par l'utilisateur, sans deux messages user (ou assistant) consécutifs, et se termine
+    par l'assistant.
+    """
+    messages = entry.get("messages") if isinstance(entry, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return ["champ 'messages' absent ou vide"]
+    if _is_valid_pair(messages):
+        return []
+
+    errors = []
+    previous = None
+    for i, message in enumerate(messages):
+        if not isinstance(message, dict):
+            errors.append(f"message {i} : objet attendu, pas {type(message).__name__}")
+            previous = None
+            continue
+
+        role = message.get("role")
+        if role not in VALID_ROLES:
+            errors.append(f"message {i} : rôle invalide {role!r}")
+        elif role == "system" and i > 0:
+            errors.append(f"message {i} : le message system doit être le premier")
+        elif role != "system" and previous in (None, "system") and role != "user":
+            errors.append(f"message {i} : la conversation doit commencer par un message user, pas {role}")
+        elif role == previous and role in ("user", "assistant"):
+            errors.append(f"message {i} : deux messages {role} consécutifs")
+
+        # Un message assistant peut ne contenir que des appels d'outils
+        if not (role == "assistant" and message.get("tool_calls") and message.get("content") is None):
+            error = _describe_content(message.get("content"))
+            if error:
+                errors.append(f"message {i} ({role}) : {error}")
+        previous = role
+
+    last = messages[-1]
+    if not isinstance(last, dict) or last.get("role") != "assistant":
+        errors.append("le dernier message doit être celui de l'assistant")
+    return errors
+
+
+def repair_example(entry):
+    """Version corrigée d'un exemple, ou None s'il ne peut pas être réparé.
+
+    Les messages vides, NaN ou sans rôle valide sont retirés, les messages consécutifs
+    d'un même rôle sont fusionnés, et les messages qui précèdent le premier message
+    user ou suivent la dernière réponse de l'assistant sont supprimés.
+    """
+    messages = entry.get("messages") if isinstance(entry, dict) else None
+    if not isinstance(messages, list):
+        return None
+
+    cleaned = []
+    for message in messages:
+        if not isinstance(message, dict) or message.get("role") not in VALID_ROLES:
+            continue
+        if _describe_content(message.get("content")) and not message.get("tool_calls"):
+            continue
+        role = message["role"]
+        if role == "system" and cleaned:
+            continue
+        if role not in ("system", "user") and all(m["role"] == "system" for m in cleaned):
+            continue  # réponse sans question
+        if cleaned and cleaned[-1]["role"] == role and role in ("user", "assistant") and isinstance(message.get("content"), str):
+            cleaned[-1] = {**cleaned[-1], "content": cleaned[-1]["content"] + "\n\n" + message["content"]}
+            continue
+        cleaned.append(message)
+
+    while cleaned and cleaned[-1]["role"] != "assistant":
+        cleaned.pop()
+
+    repaired = {**entry, "messages": cleaned}
+    return repaired if not check_example(repaired) else None
+
+
+def check_line(line, repair=False):
+    """Valide une ligne brute (octets) ; retourne (erreurs, exemple décodé ou None).
+
+    Avec repair=True, les octets non UTF-8 sont remplacés pour pouvoir décoder le reste de la ligne.
+    """
+    errors = []
+    try:
+        entry = json.loads(line)  # décode aussi l'UTF-8 (UnicodeDecodeError si des octets sont invalides)
+    except UnicodeDecodeError as e:
+        errors.append(f"octets non UTF-8 à la colonne {e.start}")
+        if not repair:
+            return errors, None
+        try:
+            entry = json.loads(line.decode("utf-8", errors="replace"))
+        except ValueError as e:
+            errors.append(f"JSON invalide ({e})")
+            return errors, None
+    except ValueError as e:
+        errors.append(f"JSON invalide ({e})")
+        return errors, None
+
+    errors.extend(check_example(entry))
+    return errors, entry
+
+
+def _validate_range(task):
+    """Valide les lignes d'une plage d'octets (exécuté dans un processus du pool).
+
+    Si part_path est donné, les lignes valides (telles quelles) et les lignes réparées
+    sont écrites dans ce fichier partiel, dans l'ordre. Avec digest=True, l'empreinte
+    SHA-256 de la plage est calculée pendant la même lecture.
+    """
+    path, start, end, part_path, digest = task
+    errors = []
+    num_lines, examples, valid, repaired, dropped = 0, 0, 0, 0, 0
+    output = open(part_path, "wb", buffering=WRITE_BUFFER_SIZE) if part_path else None
+    sha = hashlib.sha256() if digest else None
+
+    try:
+        for offset, line in iter_range_lines(path, start, end):
+            num_lines += 1
+            if sha:
+                sha.update(line)
+            if not line.strip():
+                continue
+            examples += 1
+            line_errors, entry = check_line(line, repair=output is not None)
+            if not line_errors:
+                valid += 1
+                if output:
+                    output.write(line if line.endswith(b"\n") else line + b"\n")
+                continue
+
+            errors.extend((num_lines, offset, error) for error in line_errors)
+            if output:
+                fixed = repair_example(entry) if entry is not None else None
+                if fixed is None:
+                    dropped += 1
+                else:
+                    output.write(json.dumps(fixed).encode("utf-8") + b"\n")
+                    repaired += 1
+    finally:
+        if output:
+            output.close()
+
+    return {"lines": num_lines, "examples": examples, "valid": valid, "repaired": repaired,
+            "dropped": dropped, "errors": errors, "sha256": sha.hexdigest() if sha else None}
+
+
+def default_repair_path(path):
+    """Chemin par défaut du fichier réparé : <nom>_clean.jsonl à côté du fichier d'origine."""
+    return os.path.splitext(path)[0] + "_clean.jsonl"
+
+
+def validate_file(path, repair_path=None, workers=None, digest=False):
+    """Valide un fichier JSONL au format chat, en parallèle sur des plages d'octets.
+
+    Retourne un rapport dont "errors" liste toutes les erreurs avec leur numéro de ligne
+    et leur position (octets) dans le fichier. Si repair_path est donné, un fichier
+    nettoyé y est écrit pendant la même lecture : lignes valides inchangées, lignes
+    réparées quand c'est possible, les autres supprimées.
+    Avec digest=True, le fichier est lu une seule fois, dans le processus courant, et
+    le rapport contient aussi son empreinte SHA-256 ("sha256").
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Le fichier {path} n'existe pas.")
+    if repair_path and os.path.abspath(repair_path) == os.path.abspath(path):
+        raise ValueError("Le fichier réparé doit être différent du fichier d'origine.")
+
+    workers = 1 if digest else workers or os.cpu_count() or 1
+    ranges = byte_ranges(path, workers)
+    tasks = [(path, start, end, f"{repair_path}.part{i}" if repair_path else None, digest)
+             for i, (start, end) in enumerate(ranges)]
+
+    if repair_path and os.path.dirname(repair_path):
+        os.makedirs(os.path.dirname(repair_path), exist_ok=True)
+    if len(tasks) > 1:
+        # spawn plutôt que fork : validate_file peut être appelée depuis un thread (uploads
+        # parallèles, pipeline), et un fork peut hériter de verrous tenus par un autre thread
+        with multiprocessing.get_context("spawn").Pool(min(workers, len(tasks))) as pool:
+            parts = pool.map(_validate_range, tasks)
+    else:
+        parts = [_validate_range(task) for task in tasks]
+
+    # Fusionner les plages dans l'ordre du fichier (numéros de ligne décalés)
+    report = {"file": path, "lines": 0, "examples": 0, "valid": 0, "repaired": 0, "dropped": 0, "errors": []}
+    for part in parts:
+        report["errors"].extend({"line": report["lines"] + line, "offset": offset, "error": error}
+                                for line, offset, error in part["errors"])
+        for key in ("lines", "examples", "valid", "repaired", "dropped"):
+            report[key] += part[key]
+    report["invalid"] = report["examples"] - report["valid"]
+    if digest:
+        report["sha256"] = parts[0]["sha256"]
+
+    if repair_path:
+        with open(repair_path, "wb") as output:
+            for _, _, _, part_path, _ in tasks:
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, output, WRITE_BUFFER_SIZE)
+                os.remove(part_path)
+        report["output"] = repair_path
+    return report
+
+
+def print_report(report, max_shown=DEFAULT_MAX_SHOWN):
+    """Affiche le résultat de la validation d'un fichier."""
+    print(f"\n {report['file']} : {report['examples']} exemples, {report['valid']} valides, "
+          f"{report['invalid']} invalides ({len(report['errors'])} erreurs)")
+    for error in report["errors"][:max_shown]:
+        print(f"    ligne {error['line']} (octet {error['offset']}) : {error['error']}")
+    if len(report["errors"]) > max_shown:
+        print(f"    ... {len(report['errors']) - max_shown} autres erreurs")
+    if "output" in report:
+        print(f" Fichier réparé : {report['output']} ({report['valid']} lignes inchangées, "
+              f"{report['repaired']} réparées, {report['dropped']} supprimées)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Valider (et réparer) des fichiers JSONL au format chat avant l'upload.")
+    parser.add_argument("filenames", type=str, nargs="+", help="Fichiers JSONL à valider (chemin, ou nom dans data/processed)")
+    parser.add_argument("--repair", action="store_true", help="Écrire une version nettoyée de chaque fichier (<nom>_clean.jsonl)")
+    parser.add_argument("--workers", type=int, help="Nombre de processus (par défaut : nombre de cœurs)")
+    parser.add_argument("--max_shown", type=int, default=DEFAULT_MAX_SHOWN, help="Nombre d'erreurs affichées par fichier")
+    parser.add_argument("--output", type=str, help="Fichier JSON où enregistrer toutes les erreurs")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with session(args):
+        reports = []
+        with telemetry.profile("validate"):
+            for filename in args.filenames:
+                path = filename if os.path.exists(filename) else os.path.join(DATASET_DIR, filename)
+                with telemetry.span("validate.file"):
+                    report = validate_file(path, default_repair_path(path) if args.repair else None, args.workers)
+                print_report(report, args.max_shown)
+                reports.append(report)
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(reports, f, indent=2, ensure_ascii=False)
+            print(f"\nRapport enregistré : {args.output}")
+
+    # Code de sortie non nul si des erreurs restent (utilisable dans un script ou en CI)
+    if not args.repair and any(report["errors"] for report in reports):
+        raise SystemExit(1)
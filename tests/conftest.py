@@ -0,0 +1,77 @@
+# Configuration commune des tests : les scripts sont importés comme modules voisins,
+# et chaque test travaille dans un dossier temporaire (certains scripts créent data/... à l'import)
+
+import os
+import sys
+import json
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+# Mots utilisés pour générer les exemples de test
+WORDS = ("le", "la", "modèle", "réponse", "question", "données", "fichier", "ligne", "score", "test",
+         "mistral", "rapide", "lent", "bleu", "rouge", "exact", "vide", "chat", "outil", "index")
+
+
+def make_examples(n, seed=0):
+    """Exemples au format chat {"messages": [user, assistant]}, reproductibles pour une graine donnée."""
+    rng = random.Random(seed)
+    examples = []
+    for i in range(n):
+        question = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+        answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 20)))
+        examples.append({"messages": [{"role": "user", "content": f"{i} {question} ?"},
+                                      {"role": "assistant", "content": answer}]})
+    return examples
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Dossier de travail temporaire."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def chat_file(workdir):
+    """Fabrique de fichiers JSONL au format chat : chat_file(nom, n, seed) retourne le chemin."""
+    def write(name="data.jsonl", n=100, seed=0):
+        path = workdir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for example in make_examples(n, seed):
+                f.write(json.dumps(example, ensure_ascii=False) + "\n")
+        return str(path)
+    return write
+
+
+class FakeClock:
+    """Horloge simulée : sleep avance le temps instantanément et note chaque attente."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """Horloge simulée partagée par FakeJobs et JobMonitor."""
+    return FakeClock()
+
+
+@pytest.fixture
+def punkt():
+    """Ignore le test si les données punkt de NLTK ne sont pas installées."""
+    nltk = pytest.importorskip("nltk")
+    try:
+        nltk.word_tokenize("punkt")
+    except LookupError:
+        pytest.skip("données punkt de NLTK absentes")
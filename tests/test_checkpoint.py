@@ -0,0 +1,80 @@
+# Tests de l'écriture incrémentale des résultats et de la reprise (checkpoint)
+
+import json
+import pytest
+from checkpoint import CheckpointWriter, content_hash, load_checkpoint
+from mistral_stub import StubMistral
+
+
+def records(n):
+    return [{"index": i, "hash": content_hash(f"ligne {i}"), "answer": f"réponse {i}"} for i in range(n)]
+
+
+def test_content_hash_ignores_surrounding_whitespace():
+    assert content_hash("abc\n") == content_hash("  abc ")
+    assert content_hash("abc") != content_hash("abd")
+
+
+def test_missing_checkpoint_is_empty(workdir):
+    assert load_checkpoint("absent.jsonl") == {}
+
+
+def test_written_records_are_reloaded(workdir):
+    with CheckpointWriter("results/run.jsonl") as writer:
+        for record in records(5):
+            writer.write(record)
+
+    completed = load_checkpoint("results/run.jsonl")
+    assert list(completed) == [(r["index"], r["hash"]) for r in records(5)]
+    assert completed[(3, content_hash("ligne 3"))]["answer"] == "réponse 3"
+
+
+def test_truncated_last_line_is_dropped_and_resume_appends(workdir):
+    with CheckpointWriter("run.jsonl") as writer:
+        for record in records(3):
+            writer.write(record)
+    with open("run.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(records(4)[3])[:20])  # interruption pendant l'écriture
+
+    completed = load_checkpoint("run.jsonl")
+    assert len(completed) == 3
+    with open("run.jsonl", "rb") as f:
+        assert f.read().endswith(b"}\n")
+
+    with CheckpointWriter("run.jsonl", resume=True) as writer:
+        writer.write(records(4)[3])
+    assert len(load_checkpoint("run.jsonl")) == 4
+
+
+def test_writer_without_resume_starts_over(workdir):
+    with CheckpointWriter("run.jsonl") as writer:
+        writer.write(records(1)[0])
+    with CheckpointWriter("run.jsonl", resume=False, fsync=True) as writer:
+        writer.write(records(2)[1])
+    assert [key[0] for key in load_checkpoint("run.jsonl")] == [1]
+
+
+def test_evaluate_resume_skips_completed_rows(chat_file, punkt):
+    pytest.importorskip("mistral")
+    pytest.importorskip("matplotlib")
+    from evaluate import EvalOptions, evaluate_model
+
+    test_file = chat_file("test.jsonl", 12, seed=7)
+    kwargs = dict(options=EvalOptions(rate_limit=0, cache_path=None), models=["a", "b"], output_path="results.jsonl")
+
+    first = StubMistral(latency=0, seed=0)
+    evaluate_model(None, test_file, client=first, **kwargs)
+    assert first.calls == 24
+
+    # Simuler une interruption après 5 lignes, dont la dernière à moitié écrite
+    with open("results.jsonl", "rb") as f:
+        lines = f.readlines()
+    with open("results.jsonl", "wb") as f:
+        f.writelines(lines[:5])
+        f.write(lines[5][:30])
+
+    second = StubMistral(latency=0, seed=0)
+    table = evaluate_model(None, test_file, client=second, resume=True, **kwargs)
+    assert second.calls == 2 * 7
+    assert table.completed_rows().all()
+    assert sorted(key[0] for key in load_checkpoint("results.jsonl")) == list(range(12))
@@ -0,0 +1,58 @@
+# Tests du cache persistant des complétions (completion_cache)
+
+from completion_cache import CompletionCache, make_key
+
+MESSAGES = [{"role": "user", "content": "Bonjour"}]
+
+
+def test_key_depends_on_model_messages_and_params():
+    key = make_key("a", MESSAGES, {"temperature": 0.2, "random_seed": 1})
+    assert key == make_key("a", MESSAGES, {"random_seed": 1, "temperature": 0.2})
+    assert key != make_key("b", MESSAGES, {"temperature": 0.2, "random_seed": 1})
+    assert key != make_key("a", [{"role": "user", "content": "Bonsoir"}], {"temperature": 0.2, "random_seed": 1})
+    assert key != make_key("a", MESSAGES, {"temperature": 0.3, "random_seed": 1})
+    assert make_key("a", MESSAGES) == make_key("a", MESSAGES, {})
+
+
+def test_get_put_and_persistence(workdir):
+    cache = CompletionCache("cache/completions.sqlite")
+    assert cache.get("a", MESSAGES) is None
+    cache.put("a", MESSAGES, {}, "Salut ✓")
+    assert cache.get("a", MESSAGES) == "Salut ✓"
+    assert cache.get("a", MESSAGES, {"temperature": 1.0}) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    cache.close()
+
+    cache = CompletionCache("cache/completions.sqlite")
+    assert cache.get("a", MESSAGES) == "Salut ✓"
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+
+def test_replacing_an_entry_keeps_size_exact(workdir):
+    cache = CompletionCache("cache.sqlite")
+    cache.put("a", MESSAGES, {}, "x" * 100)
+    cache.put("a", MESSAGES, {}, "y" * 10)
+    assert cache.stats()["size_bytes"] == 10 + len(make_key("a", MESSAGES))
+    assert cache.get("a", MESSAGES) == "y" * 10
+    cache.close()
+
+
+def test_least_recently_read_entries_are_evicted(workdir):
+    entry_size = 100 + 64  # réponse + clé
+    cache = CompletionCache("cache.sqlite", max_bytes=5 * entry_size)
+    prompts = [[{"role": "user", "content": f"q{i}"}] for i in range(6)]
+    for messages in prompts[:5]:
+        cache.put("a", messages, {}, "x" * 100)
+
+    # q0 est relue : q1 devient la plus ancienne entrée
+    assert cache.get("a", prompts[0]) is not None
+    cache.put("a", prompts[5], {}, "x" * 100)
+
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["size_bytes"] <= 5 * entry_size
+    assert cache.get("a", prompts[1]) is None
+    assert cache.get("a", prompts[0]) is not None
+    assert cache.get("a", prompts[5]) is not None
+    cache.close()
@@ -0,0 +1,34 @@
+# Tests de la conversion CSV vers JSONL (cvs_to_jsonl)
+
+import json
+import pytest
+
+
+@pytest.fixture
+def convert(workdir):
+    """Écrit un CSV dans le dossier de travail, le convertit et retourne les exemples produits."""
+    import cvs_to_jsonl
+
+    def run(text, **kw):
+        (workdir / "data.csv").write_text(text, encoding="utf-8")
+        path = cvs_to_jsonl.convert_csv_to_jsonl("data.csv", input_dir=".", output_dir=".", **kw)
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line)["messages"] for line in f]
+    return run
+
+
+def test_na_strings_are_kept_as_text(convert):
+    messages = convert("input,output\nq1,None\nNA,réponse\nq3,42\n")
+    assert [(m[0]["content"], m[1]["content"]) for m in messages] == [("q1", "None"), ("NA", "réponse"), ("q3", "42")]
+
+
+def test_empty_cells_are_skipped(convert, capsys):
+    messages = convert('input,output,extra\nq1,,x\n,a2,x\nq3,a3,\n"q4, virgule","a4\nsur deux lignes",x\n', chunk_rows=2)
+    assert [m[0]["content"] for m in messages] == ["q3", "q4, virgule"]
+    assert messages[1][1]["content"] == "a4\nsur deux lignes"
+    assert "2 lignes ignorées" in capsys.readouterr().out
+
+
+def test_missing_columns(convert):
+    with pytest.raises(ValueError):
+        convert("question,answer\nq,a\n")
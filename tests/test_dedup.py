@@ -0,0 +1,95 @@
+# Tests de la déduplication et de la détection des fuites entre train et test (dedup)
+
+import json
+import random
+import numpy as np
+import pytest
+import dedup
+
+# Vocabulaire des questions générées (grand, pour que deux questions tirées au hasard soient disjointes)
+VOCABULARY = [f"mot{i}" for i in range(5000)]
+
+
+def write(path, questions):
+    with open(path, "w", encoding="utf-8") as f:
+        for words in questions:
+            f.write(json.dumps({"messages": [{"role": "user", "content": " ".join(words)},
+                                             {"role": "assistant", "content": "réponse"}]}) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def leak_files(workdir):
+    """train (300 questions) et eval (300 lignes, 4 sortes répétées) : copie exacte,
+    un mot changé (similarité ~0.9), deux mots changés (~0.55, sous le seuil), question sans rapport."""
+    rng = random.Random(0)
+    def question():
+        return [rng.choice(VOCABULARY) for _ in range(24)]
+
+    train = [question() for _ in range(300)]
+    evaluation = []
+    for i, words in enumerate(train):
+        words = list(words)
+        if i % 4 == 1:
+            words[-1] = "autre"
+        elif i % 4 == 2:
+            words[6], words[16] = "autre", "encore"
+        elif i % 4 == 3:
+            words = question()
+        evaluation.append(words)
+    return write(workdir / "train.jsonl", train), write(workdir / "eval.jsonl", evaluation)
+
+
+def test_find_leaks_verifies_band_candidates(leak_files):
+    train_path, eval_path = leak_files
+    hasher = dedup.MinHasher()
+    exact, near = dedup.find_leaks(train_path, eval_path, hasher)
+    kinds = np.arange(len(exact)) % 4
+
+    assert exact.tolist() == (kinds == 0).tolist()
+    assert near[kinds == 1].all()
+    assert not near[(kinds == 0) | (kinds == 3)].any()
+
+    # Une bande commune ne suffit pas : seules les lignes assez similaires à une ligne de train sont retenues
+    _, train_bands = dedup.file_signatures(train_path, "question", hasher)
+    _, eval_bands = dedup.file_signatures(eval_path, "question", hasher)
+    queries, _ = dedup.candidate_pairs(eval_bands, train_bands)
+    candidates = np.zeros(len(exact), dtype=bool)
+    candidates[queries] = True
+    assert (candidates & (kinds == 2)).any()
+
+    with open(train_path, "rb") as f:
+        train_signatures = hasher.signatures([dedup.example_text(line, "question") for line in f])
+    with open(eval_path, "rb") as f:
+        eval_signatures = hasher.signatures([dedup.example_text(line, "question") for line in f])
+    for i in np.flatnonzero(candidates & ~exact):
+        similar = max(hasher.similarity(eval_signatures[i], other) for other in train_signatures) >= hasher.threshold
+        assert near[i] == similar
+
+
+def test_candidate_pairs_match_brute_force():
+    rng = np.random.default_rng(0)
+    queries = rng.integers(0, 5, size=(40, 3), dtype=np.uint64)
+    references = rng.integers(0, 5, size=(30, 3), dtype=np.uint64)
+    expected = {(q, r) for q in range(40) for r in range(30) if (queries[q] == references[r]).any()}
+    assert set(zip(*dedup.candidate_pairs(queries, references))) == expected
+    assert len(dedup.candidate_pairs(queries[:0], references)[0]) == 0
+
+
+def test_check_leakage_drops_only_leaks(leak_files, workdir):
+    report = dedup.check_leakage("train.jsonl", ["eval.jsonl"], drop=True, data_dir=str(workdir))
+    assert report["eval.jsonl"]["exact"] == 75
+    with open(workdir / "eval.jsonl") as f:
+        assert sum(1 for _ in f) == 300 - report["eval.jsonl"]["exact"] - report["eval.jsonl"]["near"]
+
+
+def test_deduplicate_keeps_first_occurrence(workdir):
+    rng = random.Random(1)
+    base = [[rng.choice(VOCABULARY) for _ in range(30)] for _ in range(50)]
+    rows = list(base) + [list(words) for words in base[:10]] + [words[:-1] + ["autre"] for words in base[10:20]]
+    write(workdir / "data.jsonl", rows)
+
+    output = dedup.deduplicate("data.jsonl", input_dir=str(workdir), output_dir=str(workdir), field="question")
+    with open(output, encoding="utf-8") as f:
+        kept = [json.loads(line)["messages"][0]["content"].split() for line in f]
+    assert kept == base
@@ -0,0 +1,114 @@
+# Tests du moteur d'inférence parallèle (inference_engine) avec le client factice
+
+import pytest
+from mistral_stub import StubAPIError, StubMistral, default_responder
+from completion_cache import CompletionCache
+from inference_engine import InferenceEngine, TokenBucket, is_retryable
+
+MODEL = "mistral-test"
+
+
+def requests(n):
+    return [{"model": MODEL, "messages": [{"role": "user", "content": f"question {i}"}]} for i in range(n)]
+
+
+def expected(n):
+    return [default_responder(MODEL, r["messages"]) for r in requests(n)]
+
+
+def make_engine(client, **kw):
+    kw.setdefault("max_concurrency", 4)
+    kw.setdefault("rate_limit", 0)
+    return InferenceEngine(client, sleep=lambda s: None, **kw)
+
+
+def test_run_keeps_request_order():
+    client = StubMistral(latency=0.001, seed=1)
+    assert make_engine(client).run(requests(50)) == expected(50)
+    assert client.calls == 50
+
+
+def test_imap_unordered_yields_every_index():
+    engine = make_engine(StubMistral(latency=0.001, seed=2))
+    results = dict(engine.imap(requests(30), ordered=False))
+    assert sorted(results) == list(range(30))
+    assert [results[i] for i in range(30)] == expected(30)
+
+
+def test_concurrency_is_capped():
+    client = StubMistral(latency=0.01, seed=3)
+    make_engine(client, max_concurrency=3).run(requests(30))
+    assert 1 <= client.max_in_flight <= 3
+
+
+def test_transient_errors_are_retried():
+    client = StubMistral(latency=0, error_rate=0.2, rate_limit_rate=0.1, seed=4)
+    engine = make_engine(client, max_retries=50)
+    assert engine.run(requests(100)) == expected(100)
+    assert engine.retries == client.errors > 0
+    assert engine.requests == 100
+    assert client.calls == 100 + engine.retries
+
+
+def test_exhausted_retries_raise_or_are_returned():
+    engine = make_engine(StubMistral(latency=0, error_rate=1.0), max_retries=2)
+    with pytest.raises(StubAPIError):
+        engine.run(requests(3))
+
+    outputs = [output for _, output in engine.imap(requests(3), return_exceptions=True)]
+    assert all(isinstance(output, StubAPIError) and output.status_code == 503 for output in outputs)
+
+
+def test_client_errors_are_not_retried():
+    assert is_retryable(StubAPIError(503)) and is_retryable(StubAPIError(429))
+    assert is_retryable(StubAPIError(408)) and is_retryable(StubAPIError(425))
+    assert not is_retryable(StubAPIError(400)) and not is_retryable(StubAPIError(409))
+
+    def reject(model, messages):
+        raise StubAPIError(400, "Requête invalide")
+
+    client = StubMistral(latency=0, responder=reject)
+    engine = make_engine(client, max_retries=5)
+    with pytest.raises(StubAPIError):
+        engine.complete(**requests(1)[0])
+    assert client.calls == 1 and engine.retries == 0
+
+
+def test_cache_avoids_repeated_calls(workdir):
+    client = StubMistral(latency=0, seed=5)
+    cache = CompletionCache("cache.sqlite")
+    engine = make_engine(client, cache=cache)
+    first = engine.run(requests(20))
+    second = engine.run(requests(20))
+    cache.close()
+
+    assert first == second == expected(20)
+    assert client.calls == 20
+
+
+def test_stream_matches_complete():
+    engine = make_engine(StubMistral(latency=0))
+    request = requests(1)[0]
+    assert "".join(engine.stream(**request)) == engine.complete(**request)
+
+
+def test_token_bucket_limits_rate():
+    now = [0.0]
+    def sleep(seconds):
+        now[0] += seconds
+
+    bucket = TokenBucket(2.0, capacity=1, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        bucket.acquire()
+    # Un jeton disponible au départ, puis un jeton toutes les 0,5 s
+    assert now[0] == pytest.approx(2.0)
+
+
+def test_token_bucket_backs_off_and_recovers():
+    bucket = TokenBucket(8.0, min_rate=1.0)
+    for _ in range(10):
+        bucket.slow_down()
+    assert bucket.rate == 1.0
+    for _ in range(100):
+        bucket.speed_up()
+    assert bucket.rate == 8.0
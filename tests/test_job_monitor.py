@@ -0,0 +1,133 @@
+# Tests du suivi des jobs de fine-tuning (job_monitor) avec l'API factice FakeJobs
+
+import pytest
+
+pytest.importorskip("mistral")
+pytest.importorskip("wandb")
+
+from job_monitor import JobMonitor, MetricsLogger, monitor_jobs
+from mistral_stub import FakeJobs, StubAPIError, StubMistral
+
+
+class FlakyJobs(FakeJobs):
+    """FakeJobs dont les appels à get échouent : le i-ème appel lève errors[i] (None pour réussir)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.errors = []
+
+    def get(self, job_id):
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return super().get(job_id)
+
+
+def start_job(jobs, training_steps=10):
+    return jobs.create(model="open-mistral-7b", training_files=["train"],
+                       hyperparameters={"training_steps": training_steps}).id
+
+
+def make_monitor(client, clock, **kwargs):
+    return JobMonitor(client, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_every_checkpoint_is_delivered_once_in_order(clock):
+    jobs = FakeJobs(clock=clock, seconds_per_step=7, checkpoint_every=2, queue_seconds=30)
+    job_id = start_job(jobs, training_steps=21)
+    delivered = []
+    monitor = make_monitor(StubMistral(jobs=jobs), clock,
+                           on_checkpoints=lambda job_id, checkpoints: delivered.extend(c.step_number for c in checkpoints))
+    monitor.watch(job_id)
+
+    results = monitor.run()
+    assert results[job_id].status == "SUCCESS"
+    assert delivered == list(range(2, 21, 2)) + [21]
+
+
+def test_interval_backs_off_while_nothing_changes(clock):
+    jobs = FakeJobs(clock=clock, seconds_per_step=10, queue_seconds=1000)
+    job_id = start_job(jobs, training_steps=3)
+    monitor = make_monitor(StubMistral(jobs=jobs), clock, min_interval=1, max_interval=60)
+    monitor.watch(job_id)
+    monitor.run()
+
+    # Pendant la file d'attente, l'intervalle double jusqu'au maximum
+    assert clock.sleeps[:9] == [1, 2, 4, 8, 16, 32, 60, 60, 60]
+    assert monitor.polls < 30
+
+
+def test_polls_follow_checkpoint_period(clock):
+    jobs = FakeJobs(clock=clock, seconds_per_step=45, checkpoint_every=1)
+    job_id = start_job(jobs, training_steps=20)
+    monitor = make_monitor(StubMistral(jobs=jobs), clock, min_interval=1, max_interval=120)
+    monitor.watch(job_id)
+    monitor.run()
+
+    # Une fois la période estimée, environ une interrogation par checkpoint (900 avec un intervalle d'1 s)
+    assert monitor.polls <= 2 * 20 + 10
+
+
+def test_several_jobs_share_one_monitor(clock):
+    jobs = FakeJobs(clock=clock, seconds_per_step=5)
+    job_ids = [start_job(jobs, training_steps=steps) for steps in (4, 12, 8)]
+    finished = []
+    monitor = make_monitor(StubMistral(jobs=jobs), clock, on_finish=lambda job_id, job: finished.append(job_id))
+    for job_id in job_ids:
+        monitor.watch(job_id)
+
+    results = monitor.run()
+    assert set(results) == set(job_ids)
+    assert finished == [job_ids[0], job_ids[2], job_ids[1]]
+
+
+def test_transient_errors_are_retried(clock):
+    jobs = FlakyJobs(clock=clock, seconds_per_step=5)
+    job_id = start_job(jobs, training_steps=4)
+    jobs.errors = [None, StubAPIError(503), StubAPIError(429), None]
+    monitor = make_monitor(StubMistral(jobs=jobs), clock, max_retries=2)
+    monitor.watch(job_id)
+    assert monitor.run()[job_id].status == "SUCCESS"
+    assert not jobs.errors
+
+
+def test_persistent_or_fatal_errors_are_raised(clock):
+    jobs = FlakyJobs(clock=clock)
+    monitor = make_monitor(StubMistral(jobs=jobs), clock, max_retries=3)
+    monitor.watch(start_job(jobs))
+    jobs.errors = [StubAPIError(503)] * 4
+    with pytest.raises(StubAPIError):
+        monitor.run()
+
+    jobs = FlakyJobs(clock=clock)
+    monitor = make_monitor(StubMistral(jobs=jobs), clock, max_retries=3)
+    monitor.watch(start_job(jobs))
+    jobs.errors = [StubAPIError(401)]
+    with pytest.raises(StubAPIError):
+        monitor.run()
+    assert monitor.polls == 0
+
+
+def test_metrics_logger_merges_rows_per_step(clock):
+    logged = []
+    logger = MetricsLogger(log=logged.append, flush_every=100, prefix_jobs=True, clock=clock)
+    jobs = FakeJobs(clock=clock, seconds_per_step=1)
+    snapshots = [jobs.create(model="m", training_files=["t"], hyperparameters={"training_steps": 3}) for _ in range(2)]
+    clock.now += 10
+    for job in snapshots:
+        logger(job.id, sorted(jobs.get(job.id).checkpoints, key=lambda c: c.step_number))
+    logger.flush()
+
+    assert [row[f"{snapshots[0].id}/step"] for row in logged] == [1, 2, 3]
+    assert all(row[f"{snapshots[1].id}/step"] == row[f"{snapshots[0].id}/step"] for row in logged)
+
+
+def test_buffered_metrics_are_flushed_when_monitoring_fails(clock):
+    jobs = FlakyJobs(clock=clock, seconds_per_step=1)
+    job_id = start_job(jobs, training_steps=50)
+    jobs.errors = [None, None, None, StubAPIError(401)]
+    logged = []
+    logger = MetricsLogger(log=logged.append, flush_every=1000, flush_interval=1e9, clock=clock)
+    with pytest.raises(StubAPIError):
+        monitor_jobs(StubMistral(jobs=jobs), [job_id], logger=logger, clock=clock, sleep=clock.sleep)
+    assert logged and [row["step"] for row in logged] == sorted(row["step"] for row in logged)
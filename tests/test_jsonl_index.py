@@ -0,0 +1,102 @@
+# Tests de l'index des lignes des fichiers JSONL (jsonl_index)
+
+import os
+import json
+import numpy as np
+import pytest
+from jsonl_index import JsonlIndex, build_index, index_path, is_fresh, load_offsets
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def rows(n):
+    return [{"id": i, "text": f"ligne {i} é"} for i in range(n)]
+
+
+def encode(records):
+    return b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in records)
+
+
+def test_random_access(workdir):
+    path = write(workdir / "data.jsonl", encode(rows(100)))
+    with JsonlIndex(path) as index:
+        assert len(index) == 100
+        assert index[0] == rows(1)[0]
+        assert index[-1]["id"] == 99
+        assert [r["id"] for r in index[10:20:3]] == [10, 13, 16, 19]
+        assert [r["id"] for r in index] == list(range(100))
+        assert index.raw(5) == encode(rows(100)[5:6])
+        with pytest.raises(IndexError):
+            index[100]
+
+
+def test_blank_and_whitespace_lines_are_skipped(workdir):
+    # Mêmes lignes que celles retenues par line.strip() dans le découpage et la validation
+    data = b'\n{"id": 0}\n   \n\t\r\n{"id": 1}\r\n\x0c\n  {"id": 2}\n\n{"id": 3}'
+    path = write(workdir / "blanks.jsonl", data)
+    kept = [line for line in data.splitlines() if line.strip()]
+    with JsonlIndex(path) as index:
+        assert [r["id"] for r in index] == [0, 1, 2, 3]
+        assert [index.raw(i).strip() for i in range(len(index))] == [line.strip() for line in kept]
+        # Les blancs écartés restent attachés à la ligne précédente : les plages couvrent le fichier
+        assert index.byte_range(range(len(index))) == (1, len(data))
+
+
+def test_empty_files(workdir):
+    for data in (b"", b"\n\n  \n"):
+        path = write(workdir / "empty.jsonl", data)
+        with JsonlIndex(path) as index:
+            assert len(index) == 0
+            assert list(index) == []
+            assert index.sample(5) == []
+
+
+def test_index_is_rebuilt_when_file_changes(workdir):
+    path = write(workdir / "data.jsonl", encode(rows(10)))
+    assert len(load_offsets(path)) == 11
+    assert is_fresh(path)
+
+    with open(path, "ab") as f:
+        f.write(encode(rows(15)[10:]))
+    assert not is_fresh(path)
+    with JsonlIndex(path) as index:
+        assert len(index) == 15 and index[14]["id"] == 14
+    assert is_fresh(path)
+
+
+def test_small_blocks_give_same_index(workdir):
+    path = write(workdir / "data.jsonl", encode(rows(500)) + b"  \n" + encode(rows(3)))
+    reference = build_index(path)
+    np.testing.assert_array_equal(build_index(path, block_size=7), reference)
+    assert np.load(index_path(path)).dtype == np.uint32
+    assert int(reference[-1]) == os.path.getsize(path)
+
+
+def test_sample_and_shards(workdir):
+    path = write(workdir / "data.jsonl", encode(rows(1000)))
+    with JsonlIndex(path) as index:
+        indices = index.sample_indices(50, seed=1)
+        assert len(set(indices.tolist())) == 50 and list(indices) == sorted(indices)
+        assert list(indices) == list(index.sample_indices(50, seed=1))
+        assert [r["id"] for r in index.sample(50, seed=1)] == indices.tolist()
+        assert len(index.sample(5000)) == 1000
+
+        shards = [index.shard(s, 7) for s in range(7)]
+        assert [i for shard in shards for i in shard] == list(range(1000))
+        assert max(map(len, shards)) - min(map(len, shards)) <= 1
+        with pytest.raises(ValueError):
+            index.shard(7, 7)
+
+        # Les plages d'octets des parts se suivent et couvrent le fichier
+        ranges = [index.byte_range(shard) for shard in shards]
+        assert ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(path)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_missing_file(workdir):
+    with pytest.raises(FileNotFoundError):
+        JsonlIndex("absent.jsonl")
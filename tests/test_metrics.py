@@ -0,0 +1,72 @@
+# Tests des métriques par lots (score_batch) : mêmes valeurs que calculate_metrics ligne par ligne
+
+import random
+import warnings
+import numpy as np
+import pytest
+from conftest import make_examples
+from metrics import METRICS, calculate_metrics, lcs_length, score_batch
+
+
+def reference_lcs(a, b):
+    """Plus longue sous-séquence commune par programmation dynamique classique."""
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            table[i + 1][j + 1] = table[i][j] + 1 if x == y else max(table[i][j + 1], table[i + 1][j])
+    return table[-1][-1]
+
+
+def pairs(n, seed=0):
+    """Couples (référence, réponse) variés : réponses proches, sans rapport, vides ou ponctuées."""
+    rng = random.Random(seed)
+    examples = make_examples(n, seed)
+    references = [example["messages"][1]["content"] for example in examples]
+    candidates = []
+    for i, reference in enumerate(references):
+        words = reference.split()
+        rng.shuffle(words)
+        candidates.append((
+            " ".join(words[:rng.randint(0, len(words))]),
+            reference,
+            examples[-i - 1]["messages"][1]["content"],
+            "",
+            reference.upper() + " ! (n'est-ce pas ?)",
+        )[i % 5])
+    return references + ["", "Bonjour."], candidates + ["Bonjour.", ""]
+
+
+def test_lcs_length_matches_dynamic_programming():
+    rng = random.Random(0)
+    for _ in range(200):
+        a = tuple(rng.choice("abcd") for _ in range(rng.randint(0, 15)))
+        b = tuple(rng.choice("abcd") for _ in range(rng.randint(0, 15)))
+        assert lcs_length(a, b) == reference_lcs(a, b)
+
+
+def test_score_batch_checks_lengths():
+    with pytest.raises(ValueError):
+        score_batch(["a"], ["a", "b"])
+
+
+def test_score_batch_matches_calculate_metrics(punkt):
+    references, candidates = pairs(60)
+    scores = score_batch(references, candidates)
+    assert list(scores) == list(METRICS)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # NLTK avertit pour les BLEU nuls
+        for i, (reference, candidate) in enumerate(zip(references, candidates)):
+            bleu, rouge, f1 = calculate_metrics(reference, candidate)
+            assert scores["bleu"][i] == pytest.approx(bleu, abs=1e-12)
+            assert scores["f1"][i] == pytest.approx(f1, abs=1e-12)
+            for metric in ("rouge1", "rouge2", "rougeL"):
+                assert scores[metric][i] == pytest.approx(rouge[metric].fmeasure, abs=1e-12)
+
+
+def test_score_batch_workers_give_same_scores(punkt):
+    references, candidates = pairs(50, seed=1)
+    serial = score_batch(references, candidates)
+    parallel = score_batch(references, candidates, workers=2, chunk_size=16)
+    for metric in METRICS:
+        np.testing.assert_array_equal(serial[metric], parallel[metric])
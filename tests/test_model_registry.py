@@ -0,0 +1,112 @@
+# Tests du registre local des modèles avec l'API factice FakeJobs
+
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+from mistral_stub import FakeJobs, StubMistral
+from model_registry import ModelRegistry, resolve_model
+
+
+@pytest.fixture
+def api(workdir, clock):
+    """Un job long (A) créé à t=0, puis deux jobs courts (B à t=50, C à t=55)."""
+    jobs = FakeJobs(clock=clock, seconds_per_step=1)
+    client = StubMistral(jobs=jobs)
+    ids = {"A": jobs.create("open-mistral-7b", ["train-a"], hyperparameters={"training_steps": 100}).id}
+    clock.now = 50
+    ids["B"] = jobs.create("open-mistral-7b", ["train-b"], hyperparameters={"training_steps": 1, "learning_rate": 1e-4}).id
+    clock.now = 55
+    ids["C"] = jobs.create("open-mistral-7b", ["train-b"], hyperparameters={"training_steps": 1, "learning_rate": 1e-2}).id
+    jobs.gets = 0
+    return client, jobs, ids
+
+
+def make_registry(clock, ttl=100):
+    with open("manifest.json", "w", encoding="utf-8") as f:
+        json.dump({"abc123": {"file_id": "train-b", "filename": "train.jsonl"}}, f)
+    return ModelRegistry("models.json", ttl=ttl, manifest_path="manifest.json", clock=clock)
+
+
+def test_import_is_light():
+    # Le registre ne lit que le manifeste : ni le SDK Mistral ni les scripts d'upload/validation
+    scripts = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+    code = "import sys, model_registry; print(sorted({'mistral', 'upload_to_mistral', 'validate_jsonl'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=scripts, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_refresh_uses_list_payload(api, clock):
+    client, jobs, ids = api
+    clock.now = 60
+    registry = make_registry(clock)
+    assert registry.refresh(client) == 3
+    assert jobs.gets == 0 and jobs.lists == 1
+
+    a, b = registry.models[ids["A"]], registry.models[ids["B"]]
+    assert a["status"] == "RUNNING" and a["model"] is None
+    assert b["status"] == "SUCCESS" and b["model"].startswith("ft:open-mistral-7b")
+    assert b["metrics"]["step"] == 1 and "valid_loss" in b["metrics"]
+    assert b["dataset_hashes"] == {"train-b": "abc123"} and a["dataset_hashes"] == {}
+    assert b["hyperparameters"]["learning_rate"] == 1e-4
+
+
+def test_refresh_refetches_only_unfinished_jobs(api, clock):
+    client, jobs, ids = api
+    clock.now = 60
+    registry = make_registry(clock)
+    registry.refresh(client)
+
+    # Index encore à jour : aucun appel
+    clock.now = 150
+    assert registry.refresh(client) == 0 and jobs.lists == 1
+
+    # A s'est terminé entre-temps : un seul jobs.get, pour lui
+    clock.now = 200
+    registry.refresh(client)
+    assert jobs.gets == 1
+    assert registry.models[ids["A"]]["status"] == "SUCCESS"
+    assert registry.models[ids["A"]]["metrics"]["step"] == 100
+
+    # Tout est terminé : plus aucun jobs.get
+    registry.refresh(client, force=True)
+    assert jobs.gets == 1
+
+    # L'index est relu depuis le disque
+    assert ModelRegistry("models.json", manifest_path="manifest.json").models == registry.models
+
+
+def test_tags_and_resolve(api, clock):
+    client, jobs, ids = api
+    clock.now = 60
+    registry = make_registry(clock)
+    registry.refresh(client)
+
+    # A n'est pas terminé : le plus récent modèle terminé est C
+    assert registry.resolve()["job_id"] == ids["C"]
+    best = registry.resolve(metric="valid_loss")
+    assert best["metrics"]["valid_loss"] == min(registry.models[ids[k]]["metrics"]["valid_loss"] for k in "BC")
+
+    registry.tag(ids["B"], "production")
+    clock.now = 200
+    registry.refresh(client, force=True)
+    assert registry.models[ids["B"]]["tags"] == ["production"]
+    assert registry.resolve(tag="production")["job_id"] == ids["B"]
+    assert registry.resolve(tag="staging") is None
+    with pytest.raises(ValueError):
+        registry.find("inconnu")
+
+
+def test_resolve_model_refreshes_when_needed(api, clock):
+    client, jobs, ids = api
+    clock.now = 60
+    assert resolve_model(client, path="models.json") == ModelRegistry("models.json").models[ids["C"]]["model"]
+    assert jobs.lists == 1
+
+    # Index à jour et modèle trouvé : pas d'appel à l'API
+    resolve_model(client, path="models.json")
+    assert jobs.lists == 1
+    with pytest.raises(ValueError):
+        resolve_model(client, tag="production", path="models.json")
@@ -0,0 +1,103 @@
+# Tests de l'orchestrateur du pipeline (pipeline) : étapes ignorées quand leurs empreintes n'ont pas changé
+
+import os
+import csv
+import json
+import pytest
+from conftest import make_examples
+from pipeline import Pipeline, load_config
+
+
+def write_csv(path, n, seed=0):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["input", "output"])
+        for example in make_examples(n, seed):
+            writer.writerow([m["content"] for m in example["messages"]])
+
+
+@pytest.fixture
+def project(workdir):
+    """Dataset CSV brut et configuration du pipeline dans le dossier de travail ; configure(**étapes) réécrit la configuration."""
+    os.makedirs("raw")
+    write_csv("raw/dataset.csv", 300)
+
+    def configure(**stages):
+        config = {"convert": {"input": "raw/dataset.csv", "output_dir": "converted"},
+                  "split": {"output_dir": "processed"},
+                  "profile": {"output": "results/profile.json"}}
+        for stage, params in stages.items():
+            config.setdefault(stage, {}).update(params)
+        with open("pipeline.json", "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        return load_config("pipeline.json")
+    return configure
+
+
+def run(config, targets=("profile",), client=None):
+    return Pipeline(config, state_path="state/pipeline_state.json", client=client).run(list(targets))
+
+
+def test_unchanged_stages_are_skipped(project):
+    config = project()
+    assert run(config) == ["convert", "split", "profile"]
+    assert run(config) == []
+
+    # Même contenu, date de modification différente : l'empreinte est recalculée, rien n'est relancé
+    stat = os.stat("raw/dataset.csv")
+    os.utime("raw/dataset.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert run(config) == []
+
+
+def test_changed_input_reruns_dependent_stages(project):
+    config = project()
+    run(config)
+    write_csv("raw/dataset.csv", 301)
+    assert run(config) == ["convert", "split", "profile"]
+
+
+def test_changed_params_rerun_the_stage_and_changed_outputs(project):
+    run(project())
+    assert run(project(split={"seed": 1})) == ["split", "profile"]
+    assert run(project(split={"seed": 1}, profile={"output": "results/profile_seed1.json"})) == ["profile"]
+
+
+def test_unchanged_outputs_stop_the_rebuild(project):
+    config = project()
+    run(config)
+
+    # Sortie supprimée : l'étape est relancée, mais produit le même fichier, donc la suite est ignorée
+    os.remove("processed/dataset_formatted_train.jsonl")
+    assert run(config) == ["split"]
+
+    # Étape forcée au contenu identique
+    pipeline = Pipeline(config, state_path="state/pipeline_state.json")
+    assert pipeline.run(["profile"], force={"convert"}) == ["convert"]
+
+
+def test_targets_select_dependencies(project):
+    config = project(dedup={"enabled": True})
+    pipeline = Pipeline(config, state_path="state/pipeline_state.json")
+    assert pipeline.selected(["split"]) == {"convert", "dedup", "split"}
+    assert pipeline.run(["split"]) == ["convert", "dedup", "split"]
+    with pytest.raises(ValueError):
+        pipeline.selected(["deploy"])
+
+
+def test_upload_is_skipped_when_split_output_is_unchanged(project):
+    pytest.importorskip("mistral")
+    from mistral_stub import StubMistral
+
+    client = StubMistral(latency=0)
+    config = project(upload={"validate": True})
+    assert sorted(run(config, ["upload"], client=client)) == ["convert", "split", "upload"]
+    assert len(client.files.uploaded) == 2
+
+    pipeline = Pipeline(config, state_path="state/pipeline_state.json", client=client)
+    assert pipeline.run(["upload"], force={"split"}) == ["split"]
+    assert len(client.files.uploaded) == 2
+
+
+def test_missing_config(workdir):
+    with pytest.raises(FileNotFoundError):
+        load_config("absent.json")
@@ -0,0 +1,106 @@
+# Tests du balayage d'hyperparamètres (sweep) avec l'API factice FakeJobs
+
+import pytest
+
+pytest.importorskip("mistral")
+pytest.importorskip("wandb")
+
+from mistral_stub import FakeJobs, StubMistral
+from sweep import Sweep, grid_configs, random_configs
+
+
+class CountingJobs(FakeJobs):
+    """FakeJobs qui note le nombre maximal de jobs en cours au moment d'une création."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.max_active = 0
+        self.cancelled = []
+
+    def create(self, *args, **kwargs):
+        with self._lock:
+            for job in self._jobs.values():
+                self._advance(job)
+            active = sum(job["status"] in ("VALIDATED", "QUEUED", "RUNNING") for job in self._jobs.values())
+            self.max_active = max(self.max_active, active + 1)
+        return super().create(*args, **kwargs)
+
+    def cancel(self, job_id):
+        self.cancelled.append(job_id)
+        return super().cancel(job_id)
+
+
+def make_sweep(clock, configs, **kwargs):
+    jobs = CountingJobs(clock=clock, seconds_per_step=10)
+    sweep = Sweep(StubMistral(jobs=jobs), configs, "train", "validation", verbose=False,
+                  clock=clock, sleep=clock.sleep, **kwargs)
+    return sweep, jobs
+
+
+def test_configs():
+    assert len(grid_configs({"learning_rate": [1e-5, 1e-4], "weight_decay": [0.0, 0.1, 0.2]})) == 6
+    with pytest.raises(ValueError):
+        grid_configs({"learning_rate": {"min": 1e-5, "max": 1e-4}})
+
+    space = {"learning_rate": {"min": 1e-5, "max": 1e-3, "log": True}, "training_steps": {"min": 5, "max": 20}}
+    configs = random_configs(space, 20, seed=3)
+    assert configs == random_configs(space, 20, seed=3)
+    assert all(1e-5 <= c["learning_rate"] <= 1e-3 and isinstance(c["training_steps"], int) for c in configs)
+
+
+def test_bad_run_is_stopped_early_and_cancelled(clock):
+    configs = [{"learning_rate": 1e-4, "training_steps": 10}, {"learning_rate": 1e-2, "training_steps": 10}]
+    sweep, jobs = make_sweep(clock, configs, max_concurrent=2, margin=0.1, min_step=2)
+    summary = sweep.run()
+
+    good, bad = sorted(summary["runs"], key=lambda r: r["hyperparameters"]["learning_rate"])
+    assert good["status"] == "SUCCESS" and not good["stopped_early"] and good["steps"] == 10
+    assert bad["stopped_early"] and bad["status"] == "CANCELLED"
+    assert jobs.cancelled == [bad["job_id"]]
+    assert bad["stopped_at"]["step"] == 2 and bad["steps"] < 10
+    assert summary["stopped_early"] == 1
+    assert summary["best"]["job_id"] == good["job_id"]
+
+
+def test_late_run_is_compared_to_earlier_best(clock):
+    # Un seul job à la fois : le mauvais run est comparé aux pertes déjà enregistrées par le premier
+    configs = [{"learning_rate": 1e-4, "training_steps": 6}, {"learning_rate": 1e-2, "training_steps": 6}]
+    sweep, jobs = make_sweep(clock, configs, max_concurrent=1, min_step=2)
+    summary = sweep.run()
+    assert jobs.max_active == 1
+    assert [r["stopped_early"] for r in summary["runs"]] == [False, True]
+
+
+def test_concurrency_limit(clock):
+    configs = grid_configs({"learning_rate": [1e-5, 5e-5, 1e-4], "weight_decay": [0.0, 0.1], "training_steps": [4]})
+    sweep, jobs = make_sweep(clock, configs, max_concurrent=2, margin=10)
+    summary = sweep.run()
+    assert jobs.max_active == 2
+    assert len(summary["runs"]) == 6 and all(r["status"] == "SUCCESS" for r in summary["runs"])
+    losses = [r["final_valid_loss"] for r in summary["runs"]]
+    assert losses == sorted(losses) and summary["best"] == summary["runs"][0]
+
+
+def run_record(job_id, status, loss, stopped_early=False):
+    return {"job_id": job_id, "hyperparameters": {}, "status": status, "stopped_early": stopped_early,
+            "history": [] if loss is None else [{"step": 1, "train_loss": loss, "valid_loss": loss}], "losses": {}}
+
+
+def test_best_run_prefers_completed_runs(clock):
+    sweep, _ = make_sweep(clock, [])
+    sweep.runs = {r["job_id"]: r for r in (
+        run_record("stopped", "CANCELLED", 0.5, stopped_early=True),
+        run_record("failed", "FAILED", 0.4),
+        run_record("done", "SUCCESS", 0.9),
+        run_record("empty", "SUCCESS", None),
+    )}
+    summary = sweep.summary()
+    assert summary["best"]["job_id"] == "done"
+    assert [r["job_id"] for r in summary["runs"]][:2] == ["done", "empty"]
+
+    # Aucun run terminé : le meilleur des runs arrêtés
+    del sweep.runs["done"], sweep.runs["empty"]
+    assert sweep.summary()["best"]["job_id"] == "failed"
+
+    sweep.runs = {"empty": run_record("empty", "SUCCESS", None)}
+    assert sweep.summary()["best"] is None
@@ -0,0 +1,91 @@
+# Tests du découpage train/validation/test (train_test_val)
+
+import json
+from collections import Counter
+import pytest
+from jsonl_index import JsonlIndex
+
+
+def read_lines(path):
+    with open(path, "rb") as f:
+        return [line for line in f if line.strip()]
+
+
+@pytest.fixture
+def split(workdir):
+    """Découpe converted/<nom> dans le dossier de travail ; retourne les lignes de chaque ensemble et leurs chemins."""
+    import train_test_val
+
+    def run(filename="dataset.jsonl", **kw):
+        paths = train_test_val.split_dataset(filename, input_dir="converted", output_dir=".", **kw)
+        return [read_lines(p) for p in paths], paths
+    return run
+
+
+def test_every_line_is_copied_once(chat_file, split):
+    lines = read_lines(chat_file("converted/dataset.jsonl", 1000))
+    outputs, paths = split()
+    assert [p.rsplit("_", 1)[1] for p in paths] == ["train.jsonl", "validation.jsonl", "test.jsonl"]
+    assert Counter(lines) == Counter(line for output in outputs for line in output)
+    # Proportions approximatives en mode par défaut
+    assert 850 <= len(outputs[0]) <= 950
+
+
+def test_split_is_reproducible_and_depends_on_seed(chat_file, split):
+    chat_file("converted/dataset.jsonl", 500)
+    first, _ = split()
+    assert split()[0] == first
+    assert split(seed=1)[0] != first
+
+
+def test_exact_proportions(chat_file, split):
+    chat_file("converted/dataset.jsonl", 1000)
+    outputs, _ = split(train_ratio=0.8, val_ratio=0.1, test_ratio=0.1, exact=True)
+    assert [len(output) for output in outputs] == [800, 100, 100]
+
+
+def test_stratified_proportions_per_stratum(workdir, split):
+    (workdir / "converted").mkdir()
+    sizes = {"a": 700, "b": 250, "c": 50}
+    with open(workdir / "converted" / "labels.jsonl", "w", encoding="utf-8") as f:
+        for i in range(sum(sizes.values())):
+            label = "a" if i % 20 < 14 else ("b" if i % 20 < 19 else "c")
+            f.write(json.dumps({"text": f"exemple {i}", "label": label}) + "\n")
+
+    outputs, _ = split("labels.jsonl", train_ratio=0.5, val_ratio=0.3, test_ratio=0.2, stratify="label")
+    per_split = [Counter(json.loads(line)["label"] for line in output) for output in outputs]
+    for label, size in sizes.items():
+        assert [counts[label] for counts in per_split] == [int(size * 0.5), int(size * 0.3),
+                                                           size - int(size * 0.5) - int(size * 0.3)]
+
+
+def test_key_field_keeps_duplicates_together(workdir, split):
+    (workdir / "converted").mkdir()
+    with open(workdir / "converted" / "dup.jsonl", "w", encoding="utf-8") as f:
+        for i in range(300):
+            f.write(json.dumps({"id": i % 50, "text": f"variante {i}"}) + "\n")
+
+    outputs, _ = split("dup.jsonl", key="id")
+    owner = {}
+    for s, output in enumerate(outputs):
+        for line in output:
+            assert owner.setdefault(json.loads(line)["id"], s) == s
+
+
+def test_written_index_matches_output(chat_file, split):
+    chat_file("converted/dataset.jsonl", 300)
+    outputs, paths = split()
+    for output, p in zip(outputs, paths):
+        with JsonlIndex(p) as index:
+            assert len(index) == len(output)
+            assert [index.raw(i) for i in range(len(index))] == output
+
+
+def test_invalid_arguments(workdir):
+    import train_test_val
+
+    with pytest.raises(FileNotFoundError):
+        train_test_val.split_dataset("absent.jsonl", input_dir=".", output_dir=".")
+    (workdir / "x.jsonl").write_text("{}\n")
+    with pytest.raises(ValueError):
+        train_test_val.split_dataset("x.jsonl", 0.5, 0.2, 0.2, input_dir=".", output_dir=".")
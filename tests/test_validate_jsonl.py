@@ -0,0 +1,126 @@
+# Tests de la validation et de la réparation des fichiers JSONL au format chat (validate_jsonl)
+
+import json
+import hashlib
+from functools import partial
+import pytest
+import validate_jsonl
+from file_chunks import byte_ranges
+from validate_jsonl import check_example, check_line, repair_example, validate_file
+
+
+def chat(*messages):
+    return {"messages": [{"role": role, "content": content} for role, content in messages]}
+
+
+# Lignes invalides insérées dans le fichier de test, et nombre d'erreurs attendu pour chacune
+BAD_LINES = [
+    (b'{"messages": [}\n', 1),                                                           # JSON invalide
+    (b'{"messages": []}\n', 1),                                                          # messages vides
+    (b'{"messages": [{"role": "user", "content": "caf\xe9"}, '
+     b'{"role": "assistant", "content": "oui"}]}\n', 1),                                 # octets non UTF-8
+    (json.dumps(chat(("user", "q"), ("assistant", ""))).encode() + b"\n", 1),            # réponse vide
+    (json.dumps(chat(("assistant", "a"), ("user", "q"))).encode() + b"\n", 2),           # mauvais ordre
+    (json.dumps(chat(("user", "q"), ("user", "q2"), ("assistant", "a"))).encode() + b"\n", 1),
+]
+
+
+def test_check_example():
+    assert check_example(chat(("user", "q"), ("assistant", "a"))) == []
+    assert check_example(chat(("system", "s"), ("user", "q"), ("assistant", "a"), ("user", "q2"), ("assistant", "a2"))) == []
+    assert check_example({"messages": []}) == ["champ 'messages' absent ou vide"]
+    assert check_example([]) == ["champ 'messages' absent ou vide"]
+
+    errors = check_example({"messages": [{"role": "user", "content": float("nan")},
+                                         {"role": "bot", "content": "a"}]})
+    assert any("NaN" in error for error in errors)
+    assert any("rôle invalide 'bot'" in error for error in errors)
+    assert "le dernier message doit être celui de l'assistant" in errors
+
+    tool_call = {"role": "assistant", "content": None, "tool_calls": [{"id": "1"}]}
+    assert check_example({"messages": [{"role": "user", "content": "q"}, tool_call,
+                                       {"role": "tool", "content": "r"}, {"role": "assistant", "content": "a"}]}) == []
+
+
+def test_repair_example():
+    entry = {"id": 3, "messages": [{"role": "assistant", "content": "orpheline"}, {"role": "user", "content": "q1"},
+                                   {"role": "user", "content": "q2"}, {"role": "assistant", "content": ""},
+                                   {"role": "assistant", "content": "a"}, {"role": "user", "content": "relance"}]}
+    assert repair_example(entry) == {"id": 3, **chat(("user", "q1\n\nq2"), ("assistant", "a"))}
+    assert repair_example(chat(("user", "q"), ("user", "q2"))) is None
+    assert repair_example({"messages": "texte"}) is None
+
+
+def test_check_line_repairs_invalid_utf8():
+    line = b'{"messages": [{"role": "user", "content": "caf\xe9"}, {"role": "assistant", "content": "oui"}]}'
+    column = line.index(b"\xe9")
+    errors, entry = check_line(line)
+    assert errors == [f"octets non UTF-8 à la colonne {column}"] and entry is None
+    errors, entry = check_line(line, repair=True)
+    assert len(errors) == 1 and entry["messages"][0]["content"] == "caf�"
+
+
+@pytest.fixture
+def dataset(chat_file):
+    """Fichier de 200 exemples valides, avec les lignes invalides et des lignes vides intercalées."""
+    path = chat_file("dataset.jsonl", 200, seed=3)
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    for position, (line, _) in zip((10, 50, 90, 130, 170, 199), BAD_LINES):
+        lines.insert(position, line)
+    lines.insert(100, b"   \n")
+    with open(path, "wb") as f:
+        f.writelines(lines)
+    return path
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Plages de 4 Ko au lieu de 1 Mo, pour répartir un petit fichier entre plusieurs processus."""
+    monkeypatch.setattr(validate_jsonl, "byte_ranges", partial(byte_ranges, min_chunk_bytes=4096))
+
+
+def test_validate_file_reports_every_error(dataset):
+    report = validate_file(dataset, workers=1)
+    assert report["examples"] == 206
+    assert report["invalid"] == len(BAD_LINES)
+    assert report["valid"] == 200
+    assert len(report["errors"]) == sum(count for _, count in BAD_LINES)
+
+    # Numéros de ligne (à partir de 1) et positions en octets exacts
+    with open(dataset, "rb") as f:
+        lines = f.readlines()
+    for error in report["errors"]:
+        line = lines[error["line"] - 1]
+        assert line in [bad for bad, _ in BAD_LINES]
+        assert sum(map(len, lines[:error["line"] - 1])) == error["offset"]
+
+
+def test_parallel_validation_matches_serial(dataset, small_chunks):
+    assert len(validate_jsonl.byte_ranges(dataset, 3)) == 3
+    assert validate_file(dataset, workers=3) == validate_file(dataset, workers=1)
+
+
+def test_repaired_file_is_valid(dataset, workdir, small_chunks):
+    report = validate_file(dataset, repair_path=str(workdir / "clean" / "dataset_clean.jsonl"), workers=2)
+    assert report["repaired"] + report["dropped"] == report["invalid"]
+    assert report["repaired"] == 2  # octets non UTF-8 et messages user consécutifs
+
+    clean = validate_file(report["output"], workers=1)
+    assert clean["invalid"] == 0
+    assert clean["examples"] == report["valid"] + report["repaired"]
+    assert not list((workdir / "clean").glob("*.part*"))
+
+
+def test_digest_is_computed_in_the_same_pass(dataset, small_chunks):
+    report = validate_file(dataset, workers=4, digest=True)
+    with open(dataset, "rb") as f:
+        assert report["sha256"] == hashlib.sha256(f.read()).hexdigest()
+    assert {k: v for k, v in report.items() if k != "sha256"} == validate_file(dataset, workers=1)
+
+
+def test_invalid_paths(dataset):
+    with pytest.raises(FileNotFoundError):
+        validate_file("absent.jsonl")
+    with pytest.raises(ValueError):
+        validate_file(dataset, repair_path=dataset)